@@ -0,0 +1,121 @@
+"""
+base_scrub_layer module
+The operations every ScrubLayer backend provides, so the cleaning
+workflows can run on either of them.
+Project Developer: Alireza Adli alireza.adli@concordia.ca
+"""
+import os
+from abc import ABC, abstractmethod
+
+BACKENDS = ('qgis', 'geopandas')
+DUPLICATE_METHODS = ('native', 'hash')
+
+
+def scrub_layer_type(backend=None):
+  """
+  The class of one of the BACKENDS: 'qgis' (ScrubLayer) or 'geopandas'
+  (GeoPandasScrubLayer, which runs without QGIS).
+  :param backend: defaults to the CITYGISOO_BACKEND environment variable,
+  or 'qgis'
+  """
+  backend = backend or os.getenv('CITYGISOO_BACKEND', 'qgis')
+  if backend == 'geopandas':
+    from .geopandas_scrub_layer import GeoPandasScrubLayer
+    return GeoPandasScrubLayer
+  if backend == 'qgis':
+    from .scrub_layer_class import ScrubLayer
+    return ScrubLayer
+  raise ValueError(
+    f'Unknown backend {backend!r}; expected one of {BACKENDS}')
+
+
+def open_scrub_layer(layer_path, layer_name, backend=None, qgis_path=None):
+  """
+  Opens a layer with one of the BACKENDS (see scrub_layer_type).
+  :param qgis_path: path to the QGIS installation of the 'qgis' backend,
+  defaults to the QGIS_PREFIX_PATH environment variable
+  """
+  backend = backend or os.getenv('CITYGISOO_BACKEND', 'qgis')
+  layer_type = scrub_layer_type(backend)
+  if backend == 'qgis':
+    return layer_type(
+      qgis_path or os.getenv('QGIS_PREFIX_PATH'), layer_path, layer_name)
+  return layer_type(layer_path, layer_name)
+
+
+class BaseScrubLayer(ABC):
+  """
+  A map layer and the cleaning operations of the workflows.
+  Operations producing a new layer take an optional output path and
+  return the new layer as an object of the same backend; without a path
+  the result stays in memory.
+  """
+  def close(self):
+    """Releases the layer; the QGIS backend removes it from the project."""
+    # Nothing to release by default, as for a GeoDataFrame.
+    return None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+  @abstractmethod
+  def fix_geometries(self, fixed_layer=None):
+    """Repairs invalid geometries."""
+
+  @abstractmethod
+  def clip_layer(self, overlay_layer, clipped_layer=None):
+    """Keeps the parts of the features that are within overlay_layer."""
+
+  @abstractmethod
+  def spatial_join(self, joining_layer_path, joined_layer_path=None):
+    """Joins the attributes of every intersecting feature of the joining
+    layer (one output feature per match, unmatched features are kept)."""
+
+  @abstractmethod
+  def clip_by_multiple(
+          self, number_of_partitions, overlay_layers_dir, clipped_layers_dir,
+          workers=1, retries=0, filter_by_extent=True, layer_format=None):
+    """Clips the layer by every partition split_layer wrote to
+    overlay_layers_dir, workers partitions at a time, clipping a failed
+    partition again up to retries times. Returns the seconds each
+    partition took."""
+
+  @abstractmethod
+  def delete_duplicates(
+          self, deleted_duplicates_layer=None, method='native',
+          grid_size=None):
+    """Keeps the first of every set of equal geometries: topologically
+    equal with the 'native' method, equal once normalized with the 'hash'
+    method (one of DUPLICATE_METHODS), whose optional grid_size snaps the
+    compared geometries to a grid to catch near-duplicates."""
+
+  @abstractmethod
+  def multipart_to_singleparts(self, singleparts_layer_path=None):
+    """Splits multipart features into one feature per part."""
+
+  @abstractmethod
+  def add_field(self, new_field_name):
+    """Adds a double field."""
+
+  @abstractmethod
+  def assign_area(self, field_name):
+    """Writes the area of every feature into field_name."""
+
+  @abstractmethod
+  def assign_area_and_delete_below(self, field_name, minimum_area):
+    """assign_area, then deletes the features under minimum_area."""
+
+  @abstractmethod
+  def conditional_delete_record(self, field_name, operator, condition):
+    """Deletes the features where field_name operator condition holds."""
+
+  @abstractmethod
+  def delete_field(self, field_name):
+    """Removes a field."""
+
+  @abstractmethod
+  def duplicate_layer(self, output_path):
+    """Writes the layer to output_path."""
@@ -7,20 +7,59 @@ Project Developer: Alireza Adli alireza.adli@concordia.ca
 
 import os
 import glob
-import processing
 
-from qgis.core import QgsApplication
-from qgis.analysis import QgsNativeAlgorithms
 
+# Vector formats of the layers citygisoo writes, by file extension, with
+# their OGR driver. GeoPackage and FlatGeobuf are written with a spatial
+# index (an R-tree and a packed Hilbert R-tree) and have no 2 GB limit.
+LAYER_FORMATS = {
+  'shp': 'ESRI Shapefile',
+  'gpkg': 'GPKG',
+  'fgb': 'FlatGeobuf'}
 
-def find_shp_files(root_folder):
-  shp_files = []
+
+def check_layer_format(layer_format=None):
+  """
+  Validates a LAYER_FORMATS name.
+  :param layer_format: defaults to the CITYGISOO_LAYER_FORMAT environment
+  variable, or 'shp'
+  """
+  layer_format = layer_format or os.getenv('CITYGISOO_LAYER_FORMAT', 'shp')
+  if layer_format not in LAYER_FORMATS:
+    raise ValueError(
+      f'Unknown layer format {layer_format!r}; expected one of '
+      f'{tuple(LAYER_FORMATS)}')
+  return layer_format
+
+
+def layer_driver(layer_path):
+  """The OGR driver of a layer path's extension, 'ESRI Shapefile' for
+  an unknown one."""
+  extension = os.path.splitext(layer_path)[1][1:].lower()
+  return LAYER_FORMATS.get(extension, LAYER_FORMATS['shp'])
+
+
+def partition_path(directory, part, layer_format=None):
+  """The layer_<part>/layer_<part> file of a partitions directory"""
+  extension = check_layer_format(layer_format)
+  return f'{directory}/layer_{part}/layer_{part}.{extension}'
+
+
+def find_layer_files(root_folder, layer_format=None):
+  """Layer files of a format (see check_layer_format) under root_folder"""
+  extension = check_layer_format(layer_format)
+  layer_files = []
   # Sort folders alphabetically
   for foldername, _, _ in sorted(os.walk(root_folder)):
-    for filename in sorted(glob.glob(os.path.join(foldername, '*.shp'))):
+    for filename in sorted(glob.glob(
+            os.path.join(foldername, f'*.{extension}'))):
       new_file_name = filename.replace('\\', r'/')
-      shp_files.append(new_file_name)
-  return shp_files
+      layer_files.append(new_file_name)
+  return layer_files
+
+
+def find_shp_files(root_folder):
+  return find_layer_files(root_folder, 'shp')
 
 
 def find_las_files(root_folder):
@@ -54,8 +93,12 @@ def create_folders(directory, num_folders):
 
 
 def merge_las_layers(layers_path, mergeded_layer_path):
+  # Imported here, so the other functions work without QGIS
+  import processing
+  from .qgis_session import register_native_algorithms
+
   merging_layers = find_las_files(layers_path)
-  QgsApplication.processingRegistry().addProvider(QgsNativeAlgorithms())
+  register_native_algorithms()
 
   params = {'LAYERS': merging_layers,
             'CRS': None,
@@ -0,0 +1,381 @@
+"""
+geopandas_scrub_layer module
+The ScrubLayer operations on GeoPandas and Shapely 2, without QGIS.
+Geometries are processed with vectorized Shapely functions and STRtree
+indexes, following the behaviour of the QGIS native algorithms
+ScrubLayer runs.
+Project Developer: Alireza Adli alireza.adli@concordia.ca
+"""
+import json
+import operator as operators
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyogrio
+import shapely
+
+from .base_scrub_layer import BaseScrubLayer, DUPLICATE_METHODS
+from .basic_functions import check_layer_format, create_folders, \
+  find_layer_files, partition_path
+from .spatial_partition import spatial_tiles
+
+_OPERATORS = {
+  '<': operators.lt,
+  '<=': operators.le,
+  '>': operators.gt,
+  '>=': operators.ge,
+  '=': operators.eq,
+  '==': operators.eq,
+  '!=': operators.ne,
+  '<>': operators.ne}
+
+
+def _same_dimension_parts(geometries, dimensions):
+  """
+  Keeps the parts of each geometry with the given dimension (as QGIS
+  does after repairing or clipping), dropping lower-dimensional leftovers
+  such as the lines of a collapsed polygon. Empty results become None.
+  """
+  geometries = np.array(geometries, dtype=object)
+  mixed = np.flatnonzero(
+    (shapely.get_type_id(geometries) == 7) |
+    (shapely.get_dimensions(geometries) != dimensions))
+  for index in mixed:
+    parts = shapely.get_parts(geometries[index])
+    parts = parts[shapely.get_dimensions(parts) == dimensions[index]]
+    geometries[index] = shapely.union_all(parts) if len(parts) else None
+  geometries[shapely.is_empty(geometries)] = None
+  return geometries
+
+
+def _layer_source(layer, crs):
+  """A path, GeoDataFrame or GeoPandasScrubLayer as a GeoDataFrame in crs"""
+  if isinstance(layer, GeoPandasScrubLayer):
+    layer = layer.layer
+  elif not isinstance(layer, gpd.GeoDataFrame):
+    layer = gpd.read_file(layer)
+  if crs is not None and layer.crs is not None and layer.crs != crs:
+    layer = layer.to_crs(crs)
+  return layer
+
+
+class GeoPandasScrubLayer(BaseScrubLayer):
+  def __init__(self, layer_path, layer_name, layer=None):
+    """
+    :param layer_path: path to the layer's file, None for a layer
+    that only exists in memory
+    :param layer_name: name of the layer
+    :param layer: an already loaded GeoDataFrame, used instead of
+    reading layer_path
+    """
+    self.layer_path = layer_path
+    self.layer_name = layer_name
+    self.layer = self.load_layer() if layer is None else layer
+
+  @property
+  def data_count(self):
+    return len(self.layer)
+
+  def load_layer(self):
+    try:
+      return gpd.read_file(self.layer_path)
+    except Exception as error:
+      raise ValueError(
+        f'Failed to load layer {self.layer_name} from {self.layer_path}'
+      ) from error
+
+  def _result_layer(self, layer, output_path, layer_name):
+    layer = layer.reset_index(drop=True)
+    if output_path is not None:
+      layer.to_file(output_path)
+    return GeoPandasScrubLayer(output_path, layer_name, layer=layer)
+
+  def duplicate_layer(self, output_path):
+    self.layer.to_file(output_path)
+    print("Layer successfully duplicated")
+
+  def get_cell(self, fid, field_name):
+    return self.layer.iloc[fid][field_name]
+
+  def select_cells(
+          self,
+          field_name, field_value, required_field,
+          return_one_value=False):
+    """Returns the value of a field
+    based on the value of another field in the same record"""
+    values = self.layer.loc[
+      self.layer[field_name] == field_value, required_field].tolist()
+    if return_one_value and values:
+      return values[0]
+    return values
+
+  def create_spatial_index(self):
+    # GeoPandas builds an STRtree on first use; this builds it now.
+    _ = self.layer.sindex
+    print(f'Creating Spatial index for {self.layer_name} is completed.')
+
+  def fix_geometries(self, fixed_layer=None):
+    """Shapely's make_valid with the linework method, as 'native:fixgeometries'
+    with METHOD 0. Parts that collapse to a lower dimension are dropped, and
+    so are features left without a geometry."""
+    geometries = self.layer.geometry.values
+    missing = shapely.is_missing(geometries)
+    fixed = np.array(geometries, dtype=object)
+    fixed[~missing] = _same_dimension_parts(
+      shapely.make_valid(geometries[~missing]),
+      shapely.get_dimensions(geometries[~missing]))
+    layer = self.layer.set_geometry(
+      gpd.GeoSeries(fixed, index=self.layer.index, crs=self.layer.crs))
+    layer = layer[missing | ~layer.geometry.isna()]
+    return self._result_layer(layer, fixed_layer, f'Fixed {self.layer_name}')
+
+  def clip_layer(self, overlay_layer, clipped_layer=None):
+    """Like 'native:clip': the overlay features are dissolved, features
+    within them are kept as they are and the others are intersected."""
+    overlay = _layer_source(overlay_layer, self.layer.crs)
+    overlay = shapely.union_all(overlay.geometry.values)
+    shapely.prepare(overlay)
+    geometries = self.layer.geometry.values
+    candidates = self.layer.sindex.query(overlay, predicate='intersects')
+    candidates.sort()
+    clipped = geometries[candidates].copy()
+    partial = ~shapely.contains_properly(overlay, clipped)
+    clipped[partial] = _same_dimension_parts(
+      shapely.intersection(clipped[partial], overlay),
+      shapely.get_dimensions(clipped[partial]))
+    layer = self.layer.iloc[candidates].set_geometry(
+      gpd.GeoSeries(clipped, index=self.layer.index[candidates],
+                    crs=self.layer.crs))
+    layer = layer[~layer.geometry.isna()]
+    print(f'Clipping of {self.layer_name} is completed.')
+    return self._result_layer(
+      layer, clipped_layer, f'Clipped {self.layer_name}')
+
+  def spatial_join(self, joining_layer_path, joined_layer_path=None):
+    """Like 'native:joinattributesbylocation' with the intersects
+    predicate, one-to-many and non-matching features kept. Joined fields
+    whose names are taken get a _2 suffix, as in QGIS."""
+    joining = _layer_source(joining_layer_path, self.layer.crs)
+    names = set(self.layer.columns)
+    renames = {}
+    for column in joining.columns:
+      if column == joining.geometry.name:
+        continue
+      new_name, suffix = column, 2
+      while new_name in names:
+        new_name, suffix = f'{column}_{suffix}', suffix + 1
+      names.add(new_name)
+      renames[column] = new_name
+    joining = joining.rename(columns=renames)
+
+    left, right = joining.sindex.query(
+      self.layer.geometry.values, predicate='intersects')
+    matched = np.zeros(len(self.layer), dtype=bool)
+    matched[left] = True
+    unmatched = np.flatnonzero(~matched)
+    rows = np.concatenate([left, unmatched])
+    matches = np.concatenate([right, np.full(len(unmatched), -1)])
+    order = np.lexsort((matches, rows))
+    rows, matches = rows[order], matches[order]
+
+    # Unmatched features (-1, every feature when the joining layer is
+    # empty) get empty attributes.
+    attributes = joining.drop(columns=joining.geometry.name).reset_index(
+      drop=True)
+    joined_attributes = attributes.reindex(matches).reset_index(drop=True)
+    layer = self.layer.iloc[rows].reset_index(drop=True)
+    layer = gpd.GeoDataFrame(
+      pd.concat([layer, joined_attributes], axis=1),
+      geometry=self.layer.geometry.name, crs=self.layer.crs)
+    print(f'Spatial Join with input layer {self.layer_name} is completed.')
+    return self._result_layer(
+      layer, joined_layer_path, f'Joined {self.layer_name}')
+
+  def delete_duplicates(
+          self, deleted_duplicates_layer=None, method='native',
+          grid_size=None):
+    """With the 'native' method, like 'native:deleteduplicategeometries':
+    of the features with topologically equal geometries, the first is
+    kept. The 'hash' method is ScrubLayer's, with Shapely's normalize and
+    set_precision. Features without a geometry are kept."""
+    if method not in DUPLICATE_METHODS:
+      raise ValueError(
+        f'Unknown method {method!r}; expected one of {DUPLICATE_METHODS}')
+    if method == 'hash':
+      return self._delete_duplicates_by_hash(
+        deleted_duplicates_layer, grid_size)
+    if grid_size is not None:
+      raise ValueError('grid_size is only used by the hash method')
+    geometries = self.layer.geometry.values
+    first, second = self.layer.sindex.query(geometries, predicate='covers')
+    later = first < second
+    first, second = first[later], second[later]
+    equal = shapely.equals(geometries[first], geometries[second])
+    keep = np.ones(len(self.layer), dtype=bool)
+    keep[second[equal]] = False
+    return self._result_layer(
+      self.layer[keep], deleted_duplicates_layer,
+      f'Deleted Duplicates {self.layer_name}')
+
+  def _delete_duplicates_by_hash(self, deleted_duplicates_layer, grid_size):
+    start = time.perf_counter()
+    geometries = np.asarray(self.layer.geometry.values)
+    unhashed = shapely.is_empty(geometries)
+    if grid_size is not None:
+      # Vertices are only rounded, as by QgsGeometry.snappedToGrid, which
+      # drops the rings and lines collapsing to a point; the geometries
+      # left without an area (or length) are treated as empty.
+      dimensions = shapely.get_dimensions(geometries)
+      geometries = shapely.set_precision(
+        geometries, grid_size, mode='pointwise')
+      unhashed |= (dimensions == 2) & (shapely.area(geometries) == 0)
+      unhashed |= (dimensions == 1) & (shapely.length(geometries) == 0)
+    # pandas hashes the WKB in one pass; missing geometries have no WKB
+    # and are kept, as are the empty ones, rather than all being taken
+    # for duplicates of each other.
+    wkb = pd.Series(shapely.to_wkb(shapely.normalize(geometries)))
+    wkb[unhashed] = None
+    duplicate = (wkb.duplicated() & wkb.notna()).to_numpy()
+    print(f'{duplicate.sum()} duplicate geometries of {self.layer_name} '
+          f'deleted in {time.perf_counter() - start:.1f}s.')
+    return self._result_layer(
+      self.layer[~duplicate], deleted_duplicates_layer,
+      f'Deleted Duplicates {self.layer_name}')
+
+  def multipart_to_singleparts(self, singleparts_layer_path=None):
+    layer = self.layer.explode(index_parts=False)
+    return self._result_layer(
+      layer, singleparts_layer_path, f'Single Parts {self.layer_name}')
+
+  def add_field(self, new_field_name):
+    if new_field_name not in self.layer.columns:
+      self.layer[new_field_name] = np.nan
+
+  def assign_area(self, field_name):
+    self.layer[field_name] = shapely.area(self.layer.geometry.values)
+
+  def assign_area_and_delete_below(self, field_name, minimum_area):
+    """assign_area followed by
+    conditional_delete_record(field_name, '<', minimum_area)."""
+    areas = shapely.area(self.layer.geometry.values)
+    keep = ~(areas < minimum_area) if minimum_area is not None else \
+        np.ones(len(areas), dtype=bool)
+    self.layer = self.layer[keep].reset_index(drop=True)
+    self.layer[field_name] = areas[keep]
+
+  def conditional_delete_record(self, field_name, operator, condition):
+    # Empty values never match a condition, as NULL in QGIS expressions.
+    values = self.layer[field_name]
+    delete = values.notna() & _OPERATORS[operator](values, condition)
+    self.layer = self.layer[~delete].reset_index(drop=True)
+
+  def delete_field(self, field_name):
+    self.layer = self.layer.drop(columns=field_name)
+
+  def delete_record_by_index(self, record_index):
+    self.layer = self.layer.drop(
+      index=self.layer.index[record_index]).reset_index(drop=True)
+    print(f"Feature with ID {record_index} has been successfully removed.")
+
+  def split_layer(
+          self, number_of_layers, splitted_layers_dir, method='kd',
+          layer_format=None):
+    """
+    Splits the layer into spatial tiles in
+    splitted_layers_dir/layer_<i>/layer_<i>.<layer_format>, as
+    ScrubLayer.split_layer does with the 'kd', 'quadtree' and 'grid'
+    methods.
+    :return: the number of partitions written
+    """
+    layer_format = check_layer_format(layer_format)
+    bounds = self.layer.geometry.bounds
+    has_geometry = ~(self.layer.geometry.isna() | self.layer.geometry.is_empty)
+    tiles = spatial_tiles(
+      ((index, tuple(box)) for index, box in
+       zip(np.flatnonzero(has_geometry), bounds[has_geometry].to_numpy(),
+           strict=True)),
+      number_of_layers, method)
+    for part, tile in enumerate(tiles):
+      os.makedirs(splitted_layers_dir + f'/layer_{part}')
+      self.layer.iloc[sorted(tile.ids)].to_file(
+        partition_path(splitted_layers_dir, part, layer_format))
+    print(f'{self.layer_name} is split into {len(tiles)} {method} tiles.')
+    return len(tiles)
+
+  def features_to_layer(self, output_path, id_field='feature_id'):
+    """As ScrubLayer.features_to_layer: every feature with its position in
+    id_field, in one .gpkg or .fgb file and its JSON id index."""
+    layer = self.layer.assign(**{id_field: np.arange(len(self.layer))})
+    layer.to_file(output_path, SPATIAL_INDEX=True)
+    # The FlatGeobuf spatial index reorders the features, so the fids are
+    # read back from the file.
+    written = pyogrio.read_dataframe(
+      output_path, columns=[id_field], read_geometry=False,
+      fid_as_index=True)
+    with open(f'{output_path}.index.json', 'w', encoding='utf-8') as \
+            index_file:
+      json.dump({str(feature_id): int(fid)
+                 for fid, feature_id in written[id_field].items()},
+                index_file)
+    print(f'{len(layer)} features of {self.layer_name} written to '
+          f'{output_path}.')
+    return len(layer)
+
+  def clip_by_multiple(
+          self, number_of_partitions, overlay_layers_dir, clipped_layers_dir,
+          workers=1, retries=0, filter_by_extent=True, layer_format=None):
+    """Clips the layer by every partition of overlay_layers_dir into
+    clipped_layers_dir/layer_<i>/layer_<i>.<layer_format>, the layout
+    merge_layers reads. overlay_layers_dir can also be a features_to_layer
+    file. As ScrubLayer.clip_by_multiple, but the workers are threads,
+    since Shapely releases the GIL; clip_layer always goes through the
+    spatial index, so filter_by_extent has no effect.
+    :return: dictionary of partition number and seconds its clip took"""
+    layer_format = check_layer_format(layer_format)
+    create_folders(clipped_layers_dir, number_of_partitions)
+    features = gpd.read_file(overlay_layers_dir).set_index(
+      'feature_id', drop=False) \
+        if os.path.isfile(overlay_layers_dir) else None
+    # Built once, before the threads share it.
+    _ = self.layer.sindex
+
+    def clip_partition(layer):
+      start = time.perf_counter()
+      overlay = partition_path(overlay_layers_dir, layer, layer_format) \
+          if features is None else features.loc[[layer]]
+      clipped = partition_path(clipped_layers_dir, layer, layer_format)
+      for attempt in range(retries + 1):
+        try:
+          self.clip_layer(overlay, clipped)
+          break
+        except (shapely.errors.GEOSException, OSError):
+          if attempt == retries:
+            raise
+      return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+      return dict(zip(
+        range(number_of_partitions),
+        pool.map(clip_partition, range(number_of_partitions)),
+        strict=True))
+
+  @staticmethod
+  def merge_layers(layers_path, mergeded_layer_path, layer_format=None):
+    """Like 'native:mergevectorlayers', which adds the layer and path
+    fields of each feature's source."""
+    layers = []
+    for path in find_layer_files(layers_path, layer_format):
+      layer = gpd.read_file(path)
+      layer['layer'] = os.path.splitext(os.path.basename(path))[0]
+      layer['path'] = path
+      layers.append(layer)
+    merged = gpd.GeoDataFrame(
+      pd.concat(layers, ignore_index=True), crs=layers[0].crs)
+    merged.to_file(mergeded_layer_path)
+
+  def __str__(self):
+    return f'The {self.layer_name} has {self.data_count} records.'
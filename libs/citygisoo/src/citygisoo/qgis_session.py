@@ -0,0 +1,115 @@
+"""
+qgis_session module
+One QGIS application with its processing providers for a whole workflow,
+keeping count of the map layers the ScrubLayers add to the project so
+they can be released as soon as they are done with.
+Project Developer: Alireza Adli alireza.adli@concordia.ca
+"""
+import os
+import sys
+import time
+
+from qgis.core import QgsApplication, QgsProject
+from qgis.analysis import QgsNativeAlgorithms
+
+
+def register_native_algorithms():
+  """Adds the native processing provider unless it is registered."""
+  registry = QgsApplication.processingRegistry()
+  if registry.providerById('native') is None:
+    registry.addProvider(QgsNativeAlgorithms())
+
+
+def peak_memory():
+  """Peak resident memory of the process in bytes, None where it cannot
+  be read (Windows without psutil)."""
+  try:
+    import resource
+  except ImportError:
+    try:
+      import psutil
+    except ImportError:
+      return None
+    return psutil.Process().memory_info().peak_wset
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # Linux reports kilobytes, macOS bytes
+  return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class QgisSession:
+  """
+  Starts QGIS and the processing providers once, as a context manager:
+
+    with QgisSession(qgis_path) as session:
+      layer = ScrubLayer(qgis_path, layer_path, 'Layer')
+      ...
+
+  Within a session ScrubLayer skips its own QGIS set up and adds its
+  layers to the project through the session, which counts them; closing
+  a ScrubLayer (or leaving its with block) removes its layer from the
+  project. Leaving the session removes the remaining layers, stops QGIS
+  and prints the report.
+  """
+  _active = None
+
+  def __init__(self, qgis_path=None):
+    """
+    :param qgis_path: path to the QGIS installation, defaults to the
+    QGIS_PREFIX_PATH environment variable
+    """
+    self.qgis_path = qgis_path or os.getenv('QGIS_PREFIX_PATH')
+    self.application = None
+    self.added_layers = 0
+    self.peak_layers = 0
+    self._start = None
+
+  @classmethod
+  def active(cls):
+    """The session entered in this process, None outside of one"""
+    return cls._active
+
+  def start(self):
+    from processing.core.Processing import Processing
+
+    if QgisSession._active is not None:
+      raise RuntimeError('A QgisSession is already active in this process')
+    QgsApplication.setPrefixPath(self.qgis_path, True)
+    self.application = QgsApplication([], False)
+    self.application.initQgis()
+    Processing.initialize()
+    register_native_algorithms()
+    QgisSession._active = self
+    self._start = time.perf_counter()
+    return self
+
+  def stop(self):
+    print(self.report())
+    QgsProject.instance().removeAllMapLayers()
+    QgisSession._active = None
+    self.application.exitQgis()
+    self.application = None
+
+  def __enter__(self):
+    return self.start()
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.stop()
+
+  def add_layer(self, layer):
+    QgsProject.instance().addMapLayer(layer)
+    self.added_layers += 1
+    self.peak_layers = max(self.peak_layers, QgsProject.instance().count())
+
+  @staticmethod
+  def remove_layer(layer):
+    if QgsProject.instance().mapLayer(layer.id()) is not None:
+      QgsProject.instance().removeMapLayer(layer.id())
+
+  def report(self):
+    memory = peak_memory()
+    return (
+      f'QGIS session: {time.perf_counter() - self._start:.1f}s, '
+      f'{self.added_layers} layers added, at most {self.peak_layers} '
+      f'in the project at once, {QgsProject.instance().count()} left, '
+      f'peak memory ' +
+      ('unknown' if memory is None else f'{memory / 1024 ** 2:.0f} MiB'))
@@ -5,33 +5,208 @@ Montreal Buildings dataset project, gathered in one class.
 Project Developer: Alireza Adli alireza.adli@concordia.ca
 """
 import processing
+import glob
+import hashlib
+import json
+import multiprocessing
+import multiprocessing.util
 import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
 
 from qgis.core import QgsApplication, QgsField, QgsProject, \
   QgsProcessingFeedback, QgsVectorLayer, QgsVectorDataProvider, \
-  QgsExpressionContext, QgsExpressionContextUtils, edit, QgsFeatureRequest, \
-  QgsExpression, QgsVectorFileWriter, QgsCoordinateReferenceSystem
+  edit, QgsFeatureRequest, QgsExpression, QgsVectorFileWriter, \
+  QgsCoordinateReferenceSystem, QgsProcessingException, QgsWkbTypes
 from qgis.PyQt.QtCore import QVariant
-from qgis.analysis import QgsNativeAlgorithms
-
-from .basic_functions import create_folders, find_shp_files
-
-
-class ScrubLayer:
-  def __init__(self, qgis_path, layer_path, layer_name):
 
+from .base_scrub_layer import BaseScrubLayer, DUPLICATE_METHODS
+from .basic_functions import LAYER_FORMATS, check_layer_format, \
+  create_folders, find_layer_files, layer_driver, partition_path
+from .qgis_session import QgisSession, register_native_algorithms
+from .spatial_partition import spatial_tiles
+
+# Output value that makes processing algorithms return a memory layer
+TEMPORARY_OUTPUT = 'TEMPORARY_OUTPUT'
+
+# The QgisSession of a worker process
+_worker_session = None
+
+
+def start_qgis_worker(qgis_path):
+  """Starts the QgisSession of a worker process, such as those of
+  clip_by_multiple and of a WorkflowGraph run in processes, for the
+  lifetime of the process; it is stopped as the process exits."""
+  global _worker_session
+  _worker_session = QgisSession(qgis_path).start()
+  multiprocessing.util.Finalize(
+    None, _worker_session.stop, exitpriority=10)
+
+
+def _remove_layer_files(layer_path):
+  """Removes a layer file and its sidecar files (.dbf, .shx, -wal, ...)."""
+  for path in glob.glob(os.path.splitext(layer_path)[0] + '.*'):
+    os.remove(path)
+
+
+def feature_index_path(features_path):
+  """The id index written next to a ScrubLayer.features_to_layer file"""
+  return f'{features_path}.index.json'
+
+
+@lru_cache(maxsize=None)
+def load_feature_index(features_path):
+  """Feature id (as a string) to fid of a features_to_layer file"""
+  with open(feature_index_path(features_path), encoding='utf-8') as index:
+    return json.load(index)
+
+
+@lru_cache(maxsize=8)
+def _features_source(features_path):
+  return QgsVectorLayer(features_path, 'Features', 'ogr')
+
+
+def feature_layer(features_path, feature_id):
+  """
+  One feature of a features_to_layer file as a memory layer, the
+  equivalent of a features_to_layers layer_<feature_id> shapefile.
+  The feature is fetched directly by its fid through the file's index.
+  """
+  source = _features_source(features_path)
+  feature = source.getFeature(
+    load_feature_index(features_path)[str(feature_id)])
+  layer = QgsVectorLayer(
+    f'{QgsWkbTypes.displayString(source.wkbType())}'
+    f'?crs={source.crs().authid()}',
+    f'layer_{feature_id}', 'memory')
+  layer.dataProvider().addAttributes(source.fields().toList())
+  layer.updateFields()
+  layer.dataProvider().addFeatures([feature])
+  return layer
+
+
+def _clip_partition(
+        input_layer, overlay, clipped, retries, filter_by_extent=False):
+  """
+  Clips input_layer by one overlay into clipped and indexes the result,
+  clipping again up to retries times if processing fails.
+  The overlay is a path, or a (features_path, feature_id) pair of
+  a features_to_layer file.
+  With filter_by_extent, the features outside the overlay's extent are
+  dropped first, through the input's spatial index.
+  Returns the number of attempts and the seconds they took.
+  """
+  start = time.perf_counter()
+  if isinstance(overlay, tuple):
+    overlay = feature_layer(*overlay)
+  if filter_by_extent:
+    if isinstance(overlay, QgsVectorLayer):
+      overlay_extent = overlay.extent()
+    else:
+      overlay_extent = QgsVectorLayer(overlay, 'Overlay', 'ogr').extent()
+    input_layer = processing.run("native:extractbyextent", {
+      'INPUT': input_layer,
+      'EXTENT': overlay_extent,
+      'CLIP': False,
+      'OUTPUT': TEMPORARY_OUTPUT
+    })['OUTPUT']
+  for attempt in range(1, retries + 2):
+    try:
+      processing.run("native:clip", {
+        'INPUT': input_layer,
+        'OVERLAY': overlay,
+        'FILTER_EXPRESSION': '',
+        'FILTER_EXTENT': None,
+        'OUTPUT': clipped
+      })
+      processing.run("native:createspatialindex", {
+        'INPUT': clipped,
+        'OUTPUT': 'Output'
+      })
+      return attempt, time.perf_counter() - start
+    except QgsProcessingException:
+      if attempt > retries:
+        raise
+      _remove_layer_files(clipped)
+
+
+def _clip_started_partition(started, partition, *arguments):
+  """_clip_partition in a pool worker, recording first that the partition
+  started, so a crash breaking the pool is only charged to the partitions
+  that were running."""
+  started[partition] = True
+  return _clip_partition(*arguments)
+
+
+class ScrubLayer(BaseScrubLayer):
+  def __init__(self, qgis_path, layer_path, layer_name, layer=None):
+    """
+    :param qgis_path: path to the QGIS installation
+    :param layer_path: path to the layer's file, None for a layer
+    that only exists in memory
+    :param layer_name: name of the layer
+    :param layer: an already loaded QgsVectorLayer, such as the in-memory
+    result of another ScrubLayer operation, used instead of loading
+    layer_path
+    """
     self.qgis_path = qgis_path
-    # Set the path to QGIS installation
-    QgsApplication.setPrefixPath(self.qgis_path, True)
+    # Set the path to QGIS installation, which a QgisSession already did
+    if QgisSession.active() is None:
+      QgsApplication.setPrefixPath(self.qgis_path, True)
 
     self.layer_path = layer_path
     self.layer_name = layer_name
-    self.layer = self.load_layer()
+    if layer is None:
+      self.layer = self.load_layer()
+    else:
+      self.layer = layer
+      self._add_to_project(self.layer)
     self.data_count = self.layer.featureCount()
 
+  @staticmethod
+  def _add_to_project(layer):
+    session = QgisSession.active()
+    if session is None:
+      QgsProject.instance().addMapLayer(layer)
+    else:
+      session.add_layer(layer)
+
+  def close(self):
+    """Removes the layer from the project, which deletes it; the
+    ScrubLayer cannot be used afterwards."""
+    if self.layer is not None:
+      QgisSession.remove_layer(self.layer)
+      self.layer = None
+
+  @staticmethod
+  def _source(layer):
+    """A path, QgsVectorLayer or ScrubLayer as an algorithm input"""
+    return layer.layer if isinstance(layer, ScrubLayer) else layer
+
+  @staticmethod
+  def _output(output):
+    """An output path, or TEMPORARY_OUTPUT when there is none"""
+    return TEMPORARY_OUTPUT if output is None else output
+
+  def _result_layer(self, result, layer_name):
+    """
+    Wraps the OUTPUT of a processing algorithm in a new ScrubLayer.
+    A TEMPORARY_OUTPUT result is already a memory layer and is chained
+    without being written to or reloaded from disk.
+    """
+    output = result['OUTPUT']
+    if isinstance(output, QgsVectorLayer):
+      return ScrubLayer(self.qgis_path, None, layer_name, layer=output)
+    return ScrubLayer(self.qgis_path, output, layer_name)
+
   def duplicate_layer(self, output_path):
+    """Writes the layer in the format of output_path's extension (see
+    basic_functions.LAYER_FORMATS), a shapefile by default."""
     options = QgsVectorFileWriter.SaveVectorOptions()
-    options.driverName = 'ESRI Shapefile'
+    options.driverName = layer_driver(output_path)
 
     duplication = QgsVectorFileWriter.writeAsVectorFormat(
       self.layer,
@@ -40,9 +215,9 @@ class ScrubLayer:
     )
 
     if duplication == QgsVectorFileWriter.NoError:
-      print(f"Shapefile successfully duplicated")
+      print("Layer successfully duplicated")
     else:
-      print(f"Error duplicating shapefile: {duplication}")
+      print(f"Error duplicating layer: {duplication}")
 
   def get_cell(self, fid, field_name):
     return self.layer.getFeature(fid)[field_name]
@@ -69,10 +244,17 @@ class ScrubLayer:
       raise ValueError(
         f'Failed to load layer {self.layer_name} from {self.layer_path}')
     else:
-      QgsProject.instance().addMapLayer(the_layer)
+      self._add_to_project(the_layer)
     return the_layer
 
-  def features_to_layers(self, layers_dir, crs):
+  def features_to_layers(self, layers_dir, crs, layer_format=None):
+    """
+    Writes every feature to its own layers_dir/layer_<fid>/layer_<fid>
+    layer.
+    :param layer_format: one of basic_functions.LAYER_FORMATS, defaults
+    to the CITYGISOO_LAYER_FORMAT environment variable, or 'shp'
+    """
+    layer_format = check_layer_format(layer_format)
     create_folders(layers_dir, self.data_count)
     target_crs = QgsCoordinateReferenceSystem(crs)
     for feature in self.layer.getFeatures():
@@ -84,28 +266,73 @@ class ScrubLayer:
       new_provider.addFeatures([feature])
 
       feature_id = feature.id()
-      output_path = f'{layers_dir}layer_{feature_id}/layer_{feature_id}.shp'
+      output_path = \
+        f'{layers_dir}layer_{feature_id}/layer_{feature_id}.{layer_format}'
 
       QgsVectorFileWriter.writeAsVectorFormat(
         new_layer,
         output_path,
         'utf-8',
         new_layer.crs(),
-        'ESRI Shapefile'
+        LAYER_FORMATS[layer_format]
       )
-    print('Shapefiles created for each feature.')
-
-  def fix_geometries(self, fixed_layer):
-    QgsApplication.processingRegistry().addProvider(QgsNativeAlgorithms())
+    print('Layers created for each feature.')
+
+  def features_to_layer(self, output_path, id_field='feature_id'):
+    """
+    Writes every feature, with its 0-based position in id_field, into
+    a single GeoPackage (.gpkg) or FlatGeobuf (.fgb) file instead of one
+    layer file per feature as features_to_layers does. The position, not
+    the fid (which starts at 1 in a GeoPackage), is the partition number
+    clip_by_multiple looks up, as with GeoPandasScrubLayer. Both formats
+    carry a spatial index. A JSON index of feature id to fid is written
+    next to the file (see feature_index_path), through which
+    feature_layer and clip_by_multiple fetch a single feature directly.
+    :param output_path: path of the .gpkg or .fgb file
+    :param id_field: name of the feature position field
+    :return: the number of features written
+    """
+    register_native_algorithms()
+    params = {'INPUT': self.layer,
+              'FIELD_NAME': id_field,
+              'FIELD_TYPE': 1,
+              'FIELD_LENGTH': 0,
+              'FIELD_PRECISION': 0,
+              'FORMULA': '@row_number - 1',
+              'OUTPUT': output_path}
+    processing.run("native:fieldcalculator", params)
+
+    written = QgsVectorLayer(output_path, 'Features', 'ogr')
+    request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes([id_field], written.fields())
+    index = {
+      str(feature[id_field]): feature.id()
+      for feature in written.getFeatures(request)}
+    with open(feature_index_path(output_path), 'w', encoding='utf-8') as \
+            index_file:
+      json.dump(index, index_file)
+    load_feature_index.cache_clear()
+    _features_source.cache_clear()
+    print(f'{len(index)} features of {self.layer_name} written to '
+          f'{output_path}.')
+    return len(index)
+
+  def fix_geometries(self, fixed_layer=TEMPORARY_OUTPUT):
+    """
+    Returns the fixed layer as a ScrubLayer, in memory unless
+    a fixed_layer path is given.
+    """
+    register_native_algorithms()
     fix_geometries_params = {
       'INPUT': self.layer,
       'METHOD': 0,
-      'OUTPUT': fixed_layer
+      'OUTPUT': self._output(fixed_layer)
     }
-    processing.run("native:fixgeometries", fix_geometries_params)
+    result = processing.run("native:fixgeometries", fix_geometries_params)
+    return self._result_layer(result, f'Fixed {self.layer_name}')
 
   def create_spatial_index(self):
-    QgsApplication.processingRegistry().addProvider(QgsNativeAlgorithms())
+    register_native_algorithms()
     create_spatial_index_params = {
       'INPUT': self.layer,
       'OUTPUT': 'Output'
@@ -113,56 +340,219 @@ class ScrubLayer:
     processing.run("native:createspatialindex", create_spatial_index_params)
     print(f'Creating Spatial index for {self.layer_name} is completed.')
 
-  def spatial_join(self, joining_layer_path, joined_layer_path):
-    """In QGIS, it is called 'Join attributes by Location'"""
+  def spatial_join(
+          self, joining_layer_path, joined_layer_path=TEMPORARY_OUTPUT):
+    """In QGIS, it is called 'Join attributes by Location'.
+    The joining layer can be a path, a layer or a ScrubLayer. Returns
+    the joined layer as a ScrubLayer, in memory unless
+    a joined_layer_path is given."""
     params = {'INPUT': self.layer,
               'PREDICATE': [0],
-              'JOIN': joining_layer_path,
+              'JOIN': self._source(joining_layer_path),
               'JOIN_FIELDS': [],
               'METHOD': 0,
               'DISCARD_NONMATCHING': False,
               'PREFIX': '',
-              'OUTPUT': joined_layer_path}
+              'OUTPUT': self._output(joined_layer_path)}
 
     feedback = QgsProcessingFeedback()
-    processing.run(
+    result = processing.run(
       'native:joinattributesbylocation', params, feedback=feedback)
     print(f'Spatial Join with input layer {self.layer_name} is completed.')
+    return self._result_layer(result, f'Joined {self.layer_name}')
 
-  def clip_layer(self, overlay_layer, clipped_layer):
-    """This must be tested"""
-    QgsApplication.processingRegistry().addProvider(QgsNativeAlgorithms())
+  def clip_layer(self, overlay_layer, clipped_layer=TEMPORARY_OUTPUT):
+    """The overlay can be a path, a layer or a ScrubLayer. Returns
+    the clipped layer as a ScrubLayer, in memory unless
+    a clipped_layer path is given."""
+    register_native_algorithms()
     clip_layer_params = {
-      'INPUT': self.layer_path,
-      'OVERLAY': overlay_layer,
+      'INPUT': self.layer,
+      'OVERLAY': self._source(overlay_layer),
       'FILTER_EXPRESSION': '',
       'FILTER_EXTENT': None,
-      'OUTPUT': clipped_layer
+      'OUTPUT': self._output(clipped_layer)
     }
-    processing.run("native:clip", clip_layer_params)
+    result = processing.run("native:clip", clip_layer_params)
     print(f'Clipping of {self.layer_name} is completed.')
+    return self._result_layer(result, f'Clipped {self.layer_name}')
 
   def clip_by_predefined_zones(self):
     pass
 
   def clip_by_multiple(
-          self, number_of_partitions, overlay_layers_dir, clipped_layers_dir):
+          self, number_of_partitions, overlay_layers_dir, clipped_layers_dir,
+          workers=1, retries=0, filter_by_extent=True, layer_format=None):
+    """
+    Clips the layer by every partition of overlay_layers_dir (as written
+    by split_layer or features_to_layers) into
+    clipped_layers_dir/layer_<i>/layer_<i>.<layer_format>, the layout
+    merge_layers reads. overlay_layers_dir can also be a features_to_layer
+    file, whose feature i is then the overlay of partition i.
+    Partitions are independent, so with workers > 1 they are clipped in
+    parallel by a pool of processes, each running its own QGIS application.
+    Worker processes are spawned, so the calling script must be guarded by
+    if __name__ == '__main__'.
+    :param number_of_partitions: number of overlay layers
+    :param overlay_layers_dir: directory of the overlay layers
+    :param clipped_layers_dir: directory of the clipped layers
+    :param workers: number of processes; 1 clips in this process
+    :param retries: times a failed partition is clipped again, including
+    after its worker process crashed
+    :param filter_by_extent: only clip the features within each overlay's
+    extent, which pays off with spatially compact overlays (see
+    split_layer)
+    :param layer_format: format of the overlay and clipped layers, one of
+    basic_functions.LAYER_FORMATS; defaults to the CITYGISOO_LAYER_FORMAT
+    environment variable, or 'shp'
+    :return: dictionary of partition number and seconds its clip took
+    """
+    layer_format = check_layer_format(layer_format)
     create_folders(clipped_layers_dir, number_of_partitions)
-    for layer in range(number_of_partitions):
-      overlay = overlay_layers_dir + f'/layer_{layer}/layer_{layer}.shp'
-      clipped = clipped_layers_dir + f'/layer_{layer}/layer_{layer}.shp'
-      self.clip_layer(overlay, clipped)
-      clipped_layer = ScrubLayer(self.qgis_path, clipped, 'Temp Layer')
-      clipped_layer.create_spatial_index()
-
-  def split_layer(self, number_of_layers, splitted_layers_dir):
+    features_file = os.path.isfile(overlay_layers_dir)
+    partitions = {
+      layer: (
+        (overlay_layers_dir, layer) if features_file else
+        partition_path(overlay_layers_dir, layer, layer_format),
+        partition_path(clipped_layers_dir, layer, layer_format))
+      for layer in range(number_of_partitions)}
+    start = time.perf_counter()
+    if workers > 1:
+      timings = self._clip_partitions_in_pool(
+        partitions, workers, retries, filter_by_extent)
+    else:
+      register_native_algorithms()
+      timings = {}
+      for layer, (overlay, clipped) in partitions.items():
+        attempts, timings[layer] = _clip_partition(
+          self.layer, overlay, clipped, retries, filter_by_extent)
+        print(f'Partition {layer} of {self.layer_name} clipped in '
+              f'{timings[layer]:.1f}s ({attempts} attempt(s)).')
+    print(f'Clipping of {self.layer_name} by {number_of_partitions} '
+          f'partitions is completed in {time.perf_counter() - start:.1f}s.')
+    return timings
+
+  def _clip_partitions_in_pool(
+          self, partitions, workers, retries, filter_by_extent):
+    # Workers read the layer from disk; a memory layer is saved first.
+    temporary_dir = None
+    input_path = self.layer_path
+    if input_path is None:
+      temporary_dir = tempfile.mkdtemp()
+      input_path = os.path.join(temporary_dir, 'clip_input.fgb')
+      self.duplicate_layer(input_path)
+
+    timings = {}
+    crashes = dict.fromkeys(partitions, 0)
+    pending = dict(partitions)
+    context = multiprocessing.get_context('spawn')
+    try:
+      with context.Manager() as manager:
+        started = manager.dict()
+        while pending:
+          started.clear()
+          # A crashed worker breaks the pool, so each round starts a new
+          # one. The partitions that had not started are submitted to it
+          # again without counting the crash against them.
+          with ProcessPoolExecutor(
+                  max_workers=min(workers, len(pending)),
+                  mp_context=context,
+                  initializer=start_qgis_worker,
+                  initargs=(self.qgis_path,)) as pool:
+            futures = {
+              pool.submit(_clip_started_partition, started, layer,
+                          input_path, overlay, clipped, retries,
+                          filter_by_extent): layer
+              for layer, (overlay, clipped) in pending.items()}
+            for future in as_completed(futures):
+              layer = futures[future]
+              try:
+                attempts, timings[layer] = future.result()
+              except BrokenProcessPool:
+                if layer not in started:
+                  # The pool broke before any partition started, as when
+                  # a worker fails to start QGIS.
+                  if not started:
+                    raise
+                  continue
+                crashes[layer] += 1
+                if crashes[layer] > retries:
+                  raise
+                _remove_layer_files(pending[layer][1])
+                print(f'Worker clipping partition {layer} of '
+                      f'{self.layer_name} crashed; retrying.')
+                continue
+              del pending[layer]
+              print(f'Partition {layer} of {self.layer_name} clipped in '
+                    f'{timings[layer]:.1f}s ({attempts} attempt(s)).')
+    finally:
+      if temporary_dir is not None:
+        _remove_layer_files(input_path)
+        os.rmdir(temporary_dir)
+    return timings
+
+  def split_layer(
+          self, number_of_layers, splitted_layers_dir, method='kd',
+          layer_format=None):
+    """
+    Splits the layer into partitions in
+    splitted_layers_dir/layer_<i>/layer_<i>.<layer_format>.
+    The 'kd', 'quadtree' and 'grid' methods write spatially compact tiles
+    of features (see spatial_partition.spatial_tiles), so an overlay
+    partition only covers its own part of the city. The 'id' method splits
+    by ranges of $id, which scatters each partition over the whole layer.
+    :param number_of_layers: the desired number of partitions
+    :param splitted_layers_dir: directory of the partitions
+    :param method: 'kd', 'quadtree', 'grid' or 'id'
+    :param layer_format: one of basic_functions.LAYER_FORMATS, defaults to
+    the CITYGISOO_LAYER_FORMAT environment variable, or 'shp'
+    :return: the number of partitions written
+    """
+    layer_format = check_layer_format(layer_format)
+    if method == 'id':
+      self._split_layer_by_id(
+        number_of_layers, splitted_layers_dir, layer_format)
+      return number_of_layers
+
+    # Features without a geometry cannot overlay anything.
+    request = QgsFeatureRequest().setNoAttributes()
+    features = []
+    for feature in self.layer.getFeatures(request):
+      geometry = feature.geometry()
+      if geometry.isNull() or geometry.isEmpty():
+        continue
+      box = geometry.boundingBox()
+      features.append((
+        feature.id(),
+        (box.xMinimum(), box.yMinimum(), box.xMaximum(), box.yMaximum())))
+    tiles = spatial_tiles(features, number_of_layers, method)
+
+    register_native_algorithms()
+    for part, tile in enumerate(tiles):
+      os.makedirs(splitted_layers_dir + f'/layer_{part}')
+      output_layer_path = \
+        partition_path(splitted_layers_dir, part, layer_format)
+      self.layer.selectByIds(tile.ids)
+      params = {'INPUT': self.layer,
+                'OUTPUT': output_layer_path}
+      processing.run("native:saveselectedfeatures", params)
+
+      with ScrubLayer(
+              self.qgis_path, output_layer_path, 'Temp Layer') as new_layer:
+        new_layer.create_spatial_index()
+    self.layer.removeSelection()
+    print(f'{self.layer_name} is split into {len(tiles)} {method} tiles.')
+    return len(tiles)
+
+  def _split_layer_by_id(
+          self, number_of_layers, splitted_layers_dir, layer_format):
     number_of_layers -= 1
-    QgsApplication.processingRegistry().addProvider(QgsNativeAlgorithms())
+    register_native_algorithms()
     create_folders(splitted_layers_dir, number_of_layers)
     intervals = self.data_count // number_of_layers
     for part in range(number_of_layers):
       output_layer_path = \
-        splitted_layers_dir + f'/layer_{part}/layer_{part}.shp'
+        partition_path(splitted_layers_dir, part, layer_format)
       params = {'INPUT': self.layer,
                 'EXPRESSION': f'$id >= {part * intervals} '
                               f'AND $id < {(part + 1) * intervals}\r\n',
@@ -170,26 +560,30 @@ class ScrubLayer:
 
       processing.run("native:extractbyexpression", params)
 
-      new_layer = ScrubLayer(self.qgis_path, output_layer_path, 'Temp Layer')
-      new_layer.create_spatial_index()
+      with ScrubLayer(
+              self.qgis_path, output_layer_path, 'Temp Layer') as new_layer:
+        new_layer.create_spatial_index()
 
     # Adding a folder for the remaining features
 
     os.makedirs(splitted_layers_dir + f'/layer_{number_of_layers}')
-    output_layer_path = splitted_layers_dir + \
-        f'/layer_{number_of_layers}/layer_{number_of_layers}.shp'
+    output_layer_path = partition_path(
+      splitted_layers_dir, number_of_layers, layer_format)
     params = {'INPUT': self.layer,
               'EXPRESSION': f'$id >= {number_of_layers * intervals}\r\n',
               'OUTPUT': output_layer_path}
 
     processing.run("native:extractbyexpression", params)
-    new_layer = ScrubLayer(self.qgis_path, output_layer_path, 'Temp Layer')
-    new_layer.create_spatial_index()
+    with ScrubLayer(
+            self.qgis_path, output_layer_path, 'Temp Layer') as new_layer:
+      new_layer.create_spatial_index()
 
   @staticmethod
-  def merge_layers(layers_path, mergeded_layer_path):
-    merging_layers = find_shp_files(layers_path)
-    QgsApplication.processingRegistry().addProvider(QgsNativeAlgorithms())
+  def merge_layers(layers_path, mergeded_layer_path, layer_format=None):
+    """Merges the layers of a format (one of basic_functions.LAYER_FORMATS,
+    see check_layer_format) found under layers_path."""
+    merging_layers = find_layer_files(layers_path, layer_format)
+    register_native_algorithms()
 
     params = {'LAYERS': merging_layers,
               'CRS': None,
@@ -197,20 +591,89 @@ class ScrubLayer:
 
     processing.run("native:mergevectorlayers", params)
 
-  def multipart_to_singleparts(self, singleparts_layer_path):
-    QgsApplication.processingRegistry().addProvider(QgsNativeAlgorithms())
+  def multipart_to_singleparts(
+          self, singleparts_layer_path=TEMPORARY_OUTPUT):
+    """Returns the single parts layer as a ScrubLayer, in memory unless
+    a singleparts_layer_path is given."""
+    register_native_algorithms()
     params = {'INPUT': self.layer,
-              'OUTPUT': singleparts_layer_path}
-    processing.run("native:multiparttosingleparts", params)
-
-  def delete_duplicates(self, deleted_duplicates_layer):
-    QgsApplication.processingRegistry().addProvider(QgsNativeAlgorithms())
-    params = {'INPUT': self.layer_path,
-              'OUTPUT': deleted_duplicates_layer}
-    processing.run("native:deleteduplicategeometries", params)
+              'OUTPUT': self._output(singleparts_layer_path)}
+    result = processing.run("native:multiparttosingleparts", params)
+    return self._result_layer(result, f'Single Parts {self.layer_name}')
+
+  def delete_duplicates(
+          self, deleted_duplicates_layer=TEMPORARY_OUTPUT, method='native',
+          grid_size=None):
+    """
+    Returns the deduplicated layer as a ScrubLayer, in memory unless
+    a deleted_duplicates_layer path is given.
+    The 'native' method runs 'native:deleteduplicategeometries', which
+    compares the geometries within spatial index candidates for
+    topological equality and slows down where many features overlap.
+    The 'hash' method normalizes every geometry (ring orientation, start
+    vertex and part order), hashes its WKB and keeps the first feature of
+    every hash, in one pass over the layer. Geometries that are equal with
+    different vertices, such as an extra vertex on a straight edge, are not
+    duplicates for it.
+    :param method: one of DUPLICATE_METHODS
+    :param grid_size: with the 'hash' method, geometries are compared
+    snapped to a grid of this size, so near-duplicates whose vertices are
+    closer than it are usually found too (vertices on either side of a grid
+    line are not); the kept geometries are not snapped
+    """
+    if method not in DUPLICATE_METHODS:
+      raise ValueError(
+        f'Unknown method {method!r}; expected one of {DUPLICATE_METHODS}')
+    if method == 'hash':
+      return self._delete_duplicates_by_hash(
+        deleted_duplicates_layer, grid_size)
+    if grid_size is not None:
+      raise ValueError('grid_size is only used by the hash method')
+    register_native_algorithms()
+    params = {'INPUT': self.layer,
+              'OUTPUT': self._output(deleted_duplicates_layer)}
+    result = processing.run("native:deleteduplicategeometries", params)
+    return self._result_layer(
+      result, f'Deleted Duplicates {self.layer_name}')
+
+  def _delete_duplicates_by_hash(self, deleted_duplicates_layer, grid_size):
+    start = time.perf_counter()
+    request = QgsFeatureRequest().setNoAttributes()
+    hashes = set()
+    duplicates = []
+    for feature in self.layer.getFeatures(request):
+      geometry = feature.geometry()
+      # Features without a geometry are kept, as by the native algorithm.
+      if geometry.isNull():
+        continue
+      if grid_size is not None:
+        geometry = geometry.snappedToGrid(grid_size, grid_size)
+      # Geometries smaller than the grid snap to nothing; they are kept
+      # rather than all taken for duplicates of each other.
+      if geometry.isNull() or geometry.isEmpty():
+        continue
+      geometry.normalize()
+      geometry_hash = hashlib.blake2b(
+        bytes(geometry.asWkb()), digest_size=16).digest()
+      if geometry_hash in hashes:
+        duplicates.append(feature.id())
+      else:
+        hashes.add(geometry_hash)
+
+    register_native_algorithms()
+    self.layer.selectByIds(duplicates)
+    self.layer.invertSelection()
+    params = {'INPUT': self.layer,
+              'OUTPUT': self._output(deleted_duplicates_layer)}
+    result = processing.run("native:saveselectedfeatures", params)
+    self.layer.removeSelection()
+    print(f'{len(duplicates)} duplicate geometries of {self.layer_name} '
+          f'deleted in {time.perf_counter() - start:.1f}s.')
+    return self._result_layer(
+      result, f'Deleted Duplicates {self.layer_name}')
 
   def delete_field(self, field_name):
-    QgsApplication.processingRegistry().addProvider(QgsNativeAlgorithms())
+    register_native_algorithms()
     with edit(self.layer):
       # Get the index of the column to delete
       idx = self.layer.fields().indexFromName(field_name)
@@ -232,12 +695,17 @@ class ScrubLayer:
     self.layer.commitChanges()
 
   def conditional_delete_record(self, field_name, operator, condition):
+    """Deletes the matching features with one provider call."""
+    start = time.perf_counter()
     request = QgsFeatureRequest().setFilterExpression(
       f'{field_name} {operator} {str(condition)}')
-    with edit(self.layer):
-      for feature in self.layer.getFeatures(request):
-        self.layer.deleteFeature(feature.id())
-    self.layer.commitChanges()
+    request.setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes([field_name], self.layer.fields())
+    deleted = [feature.id() for feature in self.layer.getFeatures(request)]
+    self.layer.dataProvider().deleteFeatures(deleted)
+    self.data_count = self.layer.featureCount()
+    print(f'{len(deleted)} features of {self.layer_name} deleted in '
+          f'{time.perf_counter() - start:.1f}s.')
 
   def add_field(self, new_field_name):
     functionalities = self.layer.dataProvider().capabilities()
@@ -248,23 +716,43 @@ class ScrubLayer:
       self.layer.updateFields()
 
   def assign_area(self, field_name):
-    self.layer.startEditing()
+    """Writes all the areas with one provider call, instead of updating
+    the features one by one in an edit session."""
+    self.assign_area_and_delete_below(field_name, None)
+
+  def assign_area_and_delete_below(self, field_name, minimum_area):
+    """
+    assign_area followed by
+    conditional_delete_record(field_name, '<', minimum_area), in a single
+    pass over the geometries: the features under minimum_area are deleted
+    with one provider call and the areas of the others are written with
+    another.
+    :param minimum_area: None keeps every feature
+    """
+    start = time.perf_counter()
     idx = self.layer.fields().indexFromName(field_name)
-
-    context = QgsExpressionContext()
-    context.appendScopes(
-      QgsExpressionContextUtils.globalProjectLayerScopes(self.layer))
-
-    for feature in self.layer.getFeatures():
+    request = QgsFeatureRequest().setNoAttributes()
+    areas = {}
+    deleted = []
+    for feature in self.layer.getFeatures(request):
       area = feature.geometry().area()
-      feature[idx] = area
-      self.layer.updateFeature(feature)
-
-    self.layer.commitChanges()
+      if minimum_area is not None and area < minimum_area:
+        deleted.append(feature.id())
+      else:
+        areas[feature.id()] = {idx: area}
+    provider = self.layer.dataProvider()
+    if deleted:
+      provider.deleteFeatures(deleted)
+    provider.changeAttributeValues(areas)
+    self.data_count = self.layer.featureCount()
+    print(f'Areas of {len(areas)} features of {self.layer_name} assigned '
+          f'and {len(deleted)} deleted in '
+          f'{time.perf_counter() - start:.1f}s.')
 
   def __str__(self):
     return f'The {self.layer_name} has {self.data_count} records.'
 
   @staticmethod
   def cleanup():
+    """Stops QGIS; QgisSession does it when it is left."""
     QgsApplication.exitQgis()
@@ -0,0 +1,111 @@
+"""
+spatial_partition module
+Splits the features of a layer into compact spatial tiles with balanced
+feature counts, using only their bounding boxes.
+Project Developer: Alireza Adli alireza.adli@concordia.ca
+"""
+import math
+from collections import namedtuple
+
+PARTITION_METHODS = ('kd', 'quadtree', 'grid')
+
+# ids: the tile's feature ids; extent: (xmin, ymin, xmax, ymax) of their
+# bounding boxes
+SpatialTile = namedtuple('SpatialTile', ['ids', 'extent'])
+
+
+def _centre(box):
+  return (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+
+
+def _centres_extent(items):
+  xs = [item[1][0] for item in items]
+  ys = [item[1][1] for item in items]
+  return min(xs), min(ys), max(xs), max(ys)
+
+
+def _kd_split(items, tiles):
+  """Splits at the median along the longer side, tile counts pro rata."""
+  if not items:
+    return []
+  if tiles == 1 or len(items) == 1:
+    return [items]
+  xmin, ymin, xmax, ymax = _centres_extent(items)
+  axis = 0 if xmax - xmin >= ymax - ymin else 1
+  items.sort(key=lambda item: item[1][axis])
+  left_tiles = tiles // 2
+  cut = round(len(items) * left_tiles / tiles)
+  return _kd_split(items[:cut], left_tiles) + \
+      _kd_split(items[cut:], tiles - left_tiles)
+
+
+def _quadtree_split(items, tiles):
+  """Splits the most populated tile into quadrants until there are enough."""
+  leaves = [items]
+  while len(leaves) < tiles:
+    largest = max(range(len(leaves)), key=lambda leaf: len(leaves[leaf]))
+    xmin, ymin, xmax, ymax = _centres_extent(leaves[largest])
+    x_middle, y_middle = (xmin + xmax) / 2, (ymin + ymax) / 2
+    quadrants = [[], [], [], []]
+    for item in leaves[largest]:
+      x, y = item[1]
+      quadrants[(x > x_middle) + 2 * (y > y_middle)].append(item)
+    quadrants = [quadrant for quadrant in quadrants if quadrant]
+    if len(quadrants) == 1:
+      # The remaining features share one centre and cannot be split.
+      break
+    leaves[largest:largest + 1] = quadrants
+  return leaves
+
+
+def _grid_split(items, tiles):
+  """A regular grid of about tiles cells; empty cells are dropped."""
+  xmin, ymin, xmax, ymax = _centres_extent(items)
+  width, height = xmax - xmin or 1, ymax - ymin or 1
+  columns = max(1, round(math.sqrt(tiles * width / height)))
+  rows = max(1, math.ceil(tiles / columns))
+  cells = {}
+  for item in items:
+    x, y = item[1]
+    column = min(int((x - xmin) / width * columns), columns - 1)
+    row = min(int((y - ymin) / height * rows), rows - 1)
+    cells.setdefault((row, column), []).append(item)
+  return [cells[cell] for cell in sorted(cells)]
+
+
+def spatial_tiles(features, number_of_tiles, method='kd'):
+  """
+  Groups features into spatially compact tiles.
+  'kd' splits recursively at the median of the feature centres and returns
+  exactly number_of_tiles tiles of equal feature counts (fewer if there
+  are fewer features); 'quadtree' splits the most populated tile into
+  quadrants until there are at least number_of_tiles; 'grid' lays
+  a regular grid of about number_of_tiles cells over the layer and can
+  leave very unequal tiles in unevenly built areas.
+  :param features: iterable of (feature id, (xmin, ymin, xmax, ymax))
+  :param number_of_tiles: the desired number of tiles
+  :param method: one of PARTITION_METHODS
+  :return: list of SpatialTile
+  """
+  if method not in PARTITION_METHODS:
+    raise ValueError(
+      f'Unknown partition method {method!r}; '
+      f'expected one of {PARTITION_METHODS}')
+  if number_of_tiles < 1:
+    raise ValueError('number_of_tiles must be at least 1')
+  items = [
+    (feature_id, _centre(box), box) for feature_id, box in features]
+  if not items:
+    return []
+  split = {
+    'kd': _kd_split,
+    'quadtree': _quadtree_split,
+    'grid': _grid_split}[method]
+  tiles = []
+  for tile in split(items, number_of_tiles):
+    boxes = [item[2] for item in tile]
+    tiles.append(SpatialTile(
+      [item[0] for item in tile],
+      (min(box[0] for box in boxes), min(box[1] for box in boxes),
+       max(box[2] for box in boxes), max(box[3] for box in boxes))))
+  return tiles
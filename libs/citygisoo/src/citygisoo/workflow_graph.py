@@ -0,0 +1,266 @@
+"""
+workflow_graph module
+A make-style runner for cleaning workflows declared as a graph of steps
+reading and writing layer files. Steps whose outputs are still those made
+from their current inputs and parameters are skipped, so a failed
+workflow resumes at the failed step; independent steps run concurrently.
+Project Developer: Alireza Adli alireza.adli@concordia.ca
+"""
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, \
+  ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+
+FINGERPRINTS = ('mtime', 'content')
+# Parameters changing how a step runs but not what it writes, which are
+# left out of its fingerprint
+EXECUTION_PARAMS = ('workers', 'retries')
+
+
+class Step:
+  def __init__(self, name, function, inputs=None, outputs=None, params=None):
+    """
+    :param name: unique name of the step
+    :param function: called with the inputs, outputs and params as keyword
+    arguments; a module-level function when the graph runs in processes
+    :param inputs: dictionary of argument name and path of a layer file or
+    directory the step reads; the output of another step makes the step
+    depend on it
+    :param outputs: dictionary of argument name and path the step writes
+    :param params: dictionary of the other (JSON serializable) arguments;
+    changing one of EXECUTION_PARAMS does not make the step run again
+    """
+    self.name = name
+    self.function = function
+    self.inputs = inputs or {}
+    self.outputs = outputs or {}
+    self.params = params or {}
+
+  def __str__(self):
+    return f'Step {self.name}'
+
+
+def _layer_files(path):
+  """The files under a directory, or a layer file and its sidecar files"""
+  if os.path.isdir(path):
+    return sorted(
+      os.path.join(folder, name)
+      for folder, _, names in os.walk(path) for name in names)
+  return sorted(glob.glob(glob.escape(os.path.splitext(path)[0]) + '.*'))
+
+
+def fingerprint(path, method='mtime'):
+  """
+  A digest of a layer file (with its sidecar files) or of a directory's
+  files, None when the path does not exist.
+  :param method: 'mtime' digests the sizes and modification times of the
+  files, 'content' their bytes
+  """
+  if not os.path.exists(path):
+    return None
+  digest = hashlib.sha256()
+  for file in _layer_files(path):
+    digest.update(os.path.relpath(file, os.path.dirname(path)).encode())
+    if method == 'content':
+      with open(file, 'rb') as layer_file:
+        for block in iter(lambda: layer_file.read(1024 * 1024), b''):
+          digest.update(block)
+    else:
+      status = os.stat(file)
+      digest.update(f':{status.st_size}:{status.st_mtime_ns};'.encode())
+  return digest.hexdigest()
+
+
+def _params_fingerprint(params):
+  params = {
+    name: value for name, value in params.items()
+    if name not in EXECUTION_PARAMS}
+  return hashlib.sha256(
+    json.dumps(params, sort_keys=True, default=repr).encode()).hexdigest()
+
+
+def _remove_outputs(step):
+  """Clears the outputs of a step before it runs, as the citygisoo
+  operations do not overwrite partition folders."""
+  for path in step.outputs.values():
+    if os.path.isdir(path):
+      shutil.rmtree(path)
+    else:
+      for file in _layer_files(path):
+        os.remove(file)
+    parent = os.path.dirname(path)
+    if parent:
+      os.makedirs(parent, exist_ok=True)
+
+
+def _run_step(function, arguments):
+  start = time.perf_counter()
+  function(**arguments)
+  return time.perf_counter() - start
+
+
+class WorkflowGraph:
+  def __init__(self, steps, state_path, fingerprint_method='mtime'):
+    """
+    :param steps: list of Step
+    :param state_path: JSON file keeping the fingerprints and timings of
+    the steps between runs
+    :param fingerprint_method: one of FINGERPRINTS
+    """
+    if fingerprint_method not in FINGERPRINTS:
+      raise ValueError(
+        f'Unknown fingerprint method {fingerprint_method!r}; '
+        f'expected one of {FINGERPRINTS}')
+    self.steps = {}
+    producers = {}
+    for step in steps:
+      if step.name in self.steps:
+        raise ValueError(f'Duplicate step name {step.name!r}')
+      self.steps[step.name] = step
+      for path in step.outputs.values():
+        path = os.path.normpath(path)
+        if path in producers:
+          raise ValueError(
+            f'{path} is an output of both {producers[path]!r} and '
+            f'{step.name!r}')
+        producers[path] = step.name
+    self.dependencies = {
+      step.name: {
+        producers[os.path.normpath(path)] for path in step.inputs.values()
+        if os.path.normpath(path) in producers}
+      for step in steps}
+    self.order = self._topological_order()
+    self.state_path = state_path
+    self.fingerprint_method = fingerprint_method
+
+  def _topological_order(self):
+    order = []
+    remaining = dict(self.dependencies)
+    while remaining:
+      ready = [
+        name for name, dependencies in remaining.items()
+        if not dependencies - set(order)]
+      if not ready:
+        raise ValueError(
+          f'The steps {sorted(remaining)} depend on each other in a cycle')
+      order.extend(ready)
+      for name in ready:
+        del remaining[name]
+    return order
+
+  def load_state(self):
+    if not os.path.exists(self.state_path):
+      return {'steps': {}}
+    with open(self.state_path, encoding='utf-8') as state_file:
+      return json.load(state_file)
+
+  def _save_state(self, state):
+    # Written to a temporary file first, so an interrupted run leaves the
+    # previous state intact.
+    temporary_path = f'{self.state_path}.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as state_file:
+      json.dump(state, state_file, indent=2)
+    os.replace(temporary_path, self.state_path)
+
+  def _fingerprints(self, paths):
+    return {
+      name: fingerprint(path, self.fingerprint_method)
+      for name, path in paths.items()}
+
+  def is_up_to_date(self, step, state):
+    """
+    A step is up to date when its last run had the current parameters and
+    input fingerprints, and its outputs are still the ones it wrote.
+    """
+    record = state['steps'].get(step.name)
+    if record is None:
+      return False
+    outputs = self._fingerprints(step.outputs)
+    return record['params'] == _params_fingerprint(step.params) and \
+        record['inputs'] == self._fingerprints(step.inputs) and \
+        record['outputs'] == outputs and None not in outputs.values()
+
+  def run(self, workers=1, processes=False, initializer=None, initargs=()):
+    """
+    Runs the steps that are not up to date, each once all the steps it
+    depends on are done. The fingerprints and timing of every step are
+    saved to state_path as soon as it is done. When a step fails, the
+    running steps are finished and the error is raised.
+    :param workers: number of steps run at the same time
+    :param processes: run the steps in spawned processes instead of
+    threads, as needed by QGIS, which is not thread safe
+    :param initializer: called with initargs when a process starts, such
+    as scrub_layer_class.start_qgis_worker
+    :return: dictionary of step name and seconds it took, None for the
+    skipped steps
+    """
+    state = self.load_state()
+    timings = {}
+    done = set()
+    pending = list(self.order)
+    running = {}
+    error = None
+    if processes:
+      executor = ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+        initializer=initializer, initargs=initargs)
+    else:
+      executor = ThreadPoolExecutor(max_workers=workers)
+    start = time.perf_counter()
+    with executor:
+      while pending or running:
+        ready = [
+          name for name in pending
+          if error is None and self.dependencies[name] <= done]
+        for name in ready:
+          pending.remove(name)
+          step = self.steps[name]
+          if self.is_up_to_date(step, state):
+            print(f'{step} is up to date.')
+            timings[name] = None
+            done.add(name)
+            continue
+          print(f'Running {step}.')
+          _remove_outputs(step)
+          arguments = {**step.inputs, **step.outputs, **step.params}
+          running[executor.submit(
+            _run_step, step.function, arguments)] = (
+            name, self._fingerprints(step.inputs))
+        if ready and not running:
+          # Skipped steps may have made others ready.
+          continue
+        if not running:
+          break
+        finished, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in finished:
+          name, inputs = running.pop(future)
+          step = self.steps[name]
+          try:
+            timings[name] = future.result()
+          except Exception as step_error:
+            print(f'{step} failed: {step_error}')
+            state['steps'].pop(name, None)
+            self._save_state(state)
+            error = error or step_error
+            continue
+          state['steps'][name] = {
+            'params': _params_fingerprint(step.params),
+            'inputs': inputs,
+            'outputs': self._fingerprints(step.outputs),
+            'seconds': round(timings[name], 3),
+            'finished': datetime.now(timezone.utc).isoformat()}
+          self._save_state(state)
+          done.add(name)
+          print(f'{step} is completed in {timings[name]:.1f}s.')
+    if error is not None:
+      raise error
+    print(f'Workflow is completed in {time.perf_counter() - start:.1f}s; '
+          f'{sum(seconds is None for seconds in timings.values())} of '
+          f'{len(self.steps)} steps were up to date.')
+    return timings
@@ -0,0 +1,128 @@
+"""
+workflow_steps module
+The operations of the city cleaning workflows as WorkflowGraph step
+functions: each opens its input layers with open_scrub_layer (so with the
+CITYGISOO_BACKEND backend), writes its outputs to the given paths and
+closes the layers it opened, releasing them from the QGIS project.
+Chained operations whose intermediate layers no other step reads run in
+one step, keeping those layers in memory; an intermediate layer is only
+written when its path is given.
+Project Developer: Alireza Adli alireza.adli@concordia.ca
+"""
+import glob
+
+from .base_scrub_layer import open_scrub_layer, scrub_layer_type
+
+
+def fix_geometries(layer, fixed_layer, layer_name):
+  with open_scrub_layer(layer, layer_name) as layer:
+    print(layer)
+    layer.create_spatial_index()
+    with layer.fix_geometries(fixed_layer) as fixed:
+      fixed.create_spatial_index()
+      print(fixed)
+
+
+def clip_layer(layer, overlay_layer, clipped_layer, layer_name):
+  with open_scrub_layer(layer, layer_name) as layer:
+    layer.create_spatial_index()
+    with layer.clip_layer(overlay_layer, clipped_layer) as clipped:
+      clipped.create_spatial_index()
+      print(clipped)
+
+
+def fix_and_clip(
+        layer, overlay_layer, clipped_layer, layer_name, fixed_layer=None):
+  """fix_geometries, then clip_layer of the fixed layer, which is only
+  written when fixed_layer is given."""
+  with open_scrub_layer(layer, layer_name) as layer:
+    layer.create_spatial_index()
+    with layer.fix_geometries(fixed_layer) as fixed:
+      fixed.create_spatial_index()
+      print(fixed)
+      with fixed.clip_layer(overlay_layer, clipped_layer) as clipped:
+        clipped.create_spatial_index()
+        print(clipped)
+
+
+def split_layer(
+        layer, splitted_layers, layer_name, number_of_layers, method='kd',
+        layer_format=None):
+  with open_scrub_layer(layer, layer_name) as layer:
+    layer.split_layer(
+      number_of_layers, splitted_layers, method, layer_format=layer_format)
+
+
+def clip_by_multiple(
+        layer, overlay_layers, clipped_layers, layer_name, workers=1,
+        retries=0, layer_format=None):
+  """Clips the layer by every partition split_layer wrote to
+  overlay_layers."""
+  number_of_partitions = len(glob.glob(overlay_layers + '/layer_*'))
+  with open_scrub_layer(layer, layer_name) as layer:
+    layer.create_spatial_index()
+    layer.clip_by_multiple(
+      number_of_partitions, overlay_layers, clipped_layers,
+      workers=workers, retries=retries, layer_format=layer_format)
+
+
+def merge_layers(layers, merged_layer, layer_format=None):
+  scrub_layer_type().merge_layers(layers, merged_layer, layer_format)
+
+
+def spatial_join(
+        layer, joining_layer, joined_layer, layer_name,
+        next_joining_layer=None):
+  """spatial_join, then, with next_joining_layer, the join of the joined
+  layer (kept in memory) with it."""
+  with open_scrub_layer(layer, layer_name) as layer:
+    layer.create_spatial_index()
+    if next_joining_layer is None:
+      with layer.spatial_join(joining_layer, joined_layer) as joined:
+        joined.create_spatial_index()
+        print(joined)
+      return
+    with layer.spatial_join(joining_layer) as first_joined:
+      first_joined.create_spatial_index()
+      print(first_joined)
+      with first_joined.spatial_join(
+              next_joining_layer, joined_layer) as joined:
+        joined.create_spatial_index()
+        print(joined)
+
+
+def delete_duplicates(
+        layer, deleted_duplicates_layer, layer_name, method='native',
+        grid_size=None):
+  with open_scrub_layer(layer, layer_name) as layer:
+    with layer.delete_duplicates(
+            deleted_duplicates_layer, method, grid_size) as deleted_duplicates:
+      deleted_duplicates.create_spatial_index()
+      print(deleted_duplicates)
+
+
+def single_parts_with_area(
+        layer, single_parts_layer, layer_name, area_field='Area',
+        dismissive_area=None, duplicates_method=None, grid_size=None):
+  """multipart_to_singleparts, then the area of every part in area_field,
+  deleting the parts under dismissive_area. With duplicates_method, the
+  duplicates are deleted first (see delete_duplicates). The parts are
+  edited in memory and written once done."""
+  with open_scrub_layer(layer, layer_name) as layer:
+    if duplicates_method is None:
+      single_parts = layer.multipart_to_singleparts()
+    else:
+      with layer.delete_duplicates(
+              None, duplicates_method, grid_size) as deleted_duplicates:
+        print(deleted_duplicates)
+        single_parts = deleted_duplicates.multipart_to_singleparts()
+  with single_parts:
+    print(single_parts)
+    single_parts.add_field(area_field)
+    single_parts.assign_area_and_delete_below(area_field, dismissive_area)
+    if dismissive_area is not None:
+      print(
+        f'After removing buildings with '
+        f'less than {dismissive_area} squaremeter area:')
+    print(single_parts)
+    single_parts.duplicate_layer(single_parts_layer)
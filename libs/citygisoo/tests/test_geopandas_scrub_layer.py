@@ -0,0 +1,173 @@
+import os
+import tempfile
+from unittest import TestCase, skipIf
+from unittest.mock import patch
+
+try:
+  import geopandas as gpd
+  from shapely.geometry import MultiPolygon, Polygon, box
+except ImportError:  # the geopandas extra is not installed
+  gpd = None
+else:
+  from src.citygisoo import workflow_steps
+  from src.citygisoo.geopandas_scrub_layer import GeoPandasScrubLayer
+
+CRS = 'EPSG:32618'
+
+
+def layer_of(geometries, name='Layer', **fields):
+  return GeoPandasScrubLayer(None, name, layer=gpd.GeoDataFrame(
+    fields, geometry=list(geometries), crs=CRS))
+
+
+@skipIf(gpd is None, 'the geopandas extra is not installed')
+class TestGeoPandasScrubLayer(TestCase):
+  def setUp(self):
+    self._tmpdir = tempfile.TemporaryDirectory()
+
+  def tearDown(self):
+    self._tmpdir.cleanup()
+
+  def path(self, name):
+    return os.path.join(self._tmpdir.name, name)
+
+  def test_fix_geometries(self):
+    bowtie = Polygon([(0, 0), (2, 2), (2, 0), (0, 2)])
+    collapsed = Polygon([(0, 0), (1, 1), (2, 2), (0, 0)])
+    layer = layer_of([bowtie, box(5, 5, 6, 6), collapsed], id=[1, 2, 3])
+
+    fixed = layer.fix_geometries(self.path('fixed.gpkg'))
+
+    self.assertEqual(fixed.layer['id'].tolist(), [1, 2])
+    self.assertTrue(fixed.layer.geometry.is_valid.all())
+    self.assertAlmostEqual(fixed.layer.geometry.area[0], 2)
+    self.assertEqual(len(gpd.read_file(self.path('fixed.gpkg'))), 2)
+
+  def test_clip_layer(self):
+    layer = layer_of(
+      [box(1, 1, 2, 2), box(3, 3, 5, 5), box(8, 8, 9, 9)], id=[1, 2, 3])
+    overlay = layer_of([box(0, 0, 2, 4), box(2, 0, 4, 4)])
+
+    clipped = layer.clip_layer(overlay)
+
+    self.assertEqual(clipped.layer['id'].tolist(), [1, 2])
+    self.assertTrue(clipped.layer.geometry[0].equals(box(1, 1, 2, 2)))
+    self.assertTrue(clipped.layer.geometry[1].equals(box(3, 3, 4, 4)))
+
+  def test_spatial_join(self):
+    layer = layer_of([box(0, 0, 2, 2), box(5, 5, 6, 6)], id=[1, 2])
+    joining = layer_of(
+      [box(1, 1, 3, 3), box(-1, -1, 1, 1)], id=[10, 20], use=['a', 'b'])
+
+    joined = layer.spatial_join(joining).layer
+
+    self.assertEqual(list(joined.columns),
+                     ['id', 'geometry', 'id_2', 'use'])
+    self.assertEqual(joined['id'].tolist(), [1, 1, 2])
+    self.assertEqual(joined['use'].tolist()[:2], ['a', 'b'])
+    self.assertTrue(joined['use'].isna().tolist()[2])
+
+  def test_spatial_join_with_empty_layer(self):
+    layer = layer_of([box(0, 0, 2, 2), box(5, 5, 6, 6)], id=[1, 2])
+    empty = layer_of([], use=[])
+
+    joined = layer.spatial_join(empty).layer
+
+    self.assertEqual(joined['id'].tolist(), [1, 2])
+    self.assertTrue(joined['use'].isna().all())
+
+  def test_hash_duplicates_match_native(self):
+    square = box(0, 0, 1, 1)
+    # The same square starting at another vertex and drawn the other way
+    reordered = Polygon([(1, 1), (1, 0), (0, 0), (0, 1)])
+    geometries = [
+      square, box(2, 2, 3, 3), reordered, MultiPolygon([square]),
+      box(2, 2, 3, 3), None, box(0, 0, 1, 2), None]
+    layer = layer_of(geometries, id=list(range(len(geometries))))
+
+    native = layer.delete_duplicates(method='native').layer['id'].tolist()
+    hashed = layer.delete_duplicates(method='hash').layer['id'].tolist()
+
+    self.assertEqual(hashed, [0, 1, 3, 5, 6, 7])
+    # The native method also takes a multipolygon of one part for its
+    # polygon; otherwise both keep the same features.
+    self.assertEqual(native, [0, 1, 5, 6, 7])
+
+  def test_hash_duplicates_on_a_grid(self):
+    layer = layer_of(
+      [box(0, 0, 1, 1), box(0.0004, 0, 1, 1.0003), box(0, 0, 1, 1.4)],
+      id=[1, 2, 3])
+
+    self.assertEqual(
+      layer.delete_duplicates(method='hash').layer['id'].tolist(),
+      [1, 2, 3])
+    self.assertEqual(
+      layer.delete_duplicates(
+        method='hash', grid_size=0.01).layer['id'].tolist(), [1, 3])
+    # Features smaller than the grid are not duplicates of each other.
+    small = layer_of(
+      [box(0, 0, 0.001, 0.001), box(0.002, 0, 0.003, 0.001)], id=[1, 2])
+    self.assertEqual(
+      small.delete_duplicates(
+        method='hash', grid_size=0.01).layer['id'].tolist(), [1, 2])
+    with self.assertRaises(ValueError):
+      layer.delete_duplicates(method='native', grid_size=0.01)
+    with self.assertRaises(ValueError):
+      layer.delete_duplicates(method='exact')
+
+  def test_single_parts_and_areas(self):
+    layer = layer_of(
+      [MultiPolygon([box(0, 0, 1, 1), box(5, 5, 9, 9)]), box(2, 2, 5, 5)],
+      id=[1, 2])
+
+    single_parts = layer.multipart_to_singleparts()
+    single_parts.add_field('Area')
+    single_parts.assign_area_and_delete_below('Area', 5)
+
+    self.assertEqual(single_parts.layer['id'].tolist(), [1, 2])
+    self.assertEqual(single_parts.layer['Area'].tolist(), [16, 9])
+
+  def test_clip_by_split_partitions_matches_clip(self):
+    buildings = [
+      box(x, y, x + 0.8, y + 0.8) for x in range(0, 20, 2)
+      for y in range(0, 10, 2)]
+    layer = layer_of(buildings, id=list(range(len(buildings))))
+    overlay = layer_of(
+      [box(x, y, x + 2, y + 2) for x in range(0, 20, 2)
+       for y in range(0, 10, 2)])
+    overlays_dir = self.path('overlays')
+    clipped_dir = self.path('clipped')
+
+    partitions = overlay.split_layer(4, overlays_dir, layer_format='gpkg')
+    timings = layer.clip_by_multiple(
+      partitions, overlays_dir, clipped_dir, workers=2, retries=1,
+      layer_format='gpkg')
+    GeoPandasScrubLayer.merge_layers(
+      clipped_dir, self.path('merged.gpkg'), 'gpkg')
+
+    merged = gpd.read_file(self.path('merged.gpkg'))
+    self.assertEqual(partitions, 4)
+    self.assertEqual(sorted(timings), [0, 1, 2, 3])
+    self.assertEqual(sorted(merged['id']), list(range(len(buildings))))
+    self.assertAlmostEqual(
+      merged.geometry.area.sum(),
+      layer.clip_layer(overlay).layer.geometry.area.sum())
+
+  def test_clip_by_multiple_step(self):
+    layer_of([box(0, 0, 1, 1), box(3, 3, 4, 4)], id=[1, 2]).layer.to_file(
+      self.path('layer.gpkg'))
+    overlays_dir = self.path('overlays')
+    layer_of([box(0, 0, 2, 2), box(2, 2, 5, 5)]).split_layer(
+      2, overlays_dir, layer_format='gpkg')
+
+    with patch.dict(os.environ, {'CITYGISOO_BACKEND': 'geopandas'}):
+      workflow_steps.clip_by_multiple(
+        self.path('layer.gpkg'), overlays_dir, self.path('clipped'),
+        'Layer', workers=2, retries=1, layer_format='gpkg')
+
+    clipped = [
+      gpd.read_file(self.path(f'clipped/layer_{part}/layer_{part}.gpkg'))
+      for part in range(2)]
+    self.assertEqual(
+      sorted(identifier for part in clipped for identifier in part['id']),
+      [1, 2])
@@ -0,0 +1,70 @@
+import random
+from unittest import TestCase
+
+from src.citygisoo.spatial_partition import PARTITION_METHODS, spatial_tiles
+
+
+def random_boxes(count, seed=7):
+  generator = random.Random(seed)
+  boxes = []
+  for feature_id in range(count):
+    x, y = generator.uniform(0, 1000), generator.uniform(0, 500)
+    boxes.append((feature_id, (x, y, x + generator.uniform(1, 20),
+                               y + generator.uniform(1, 20))))
+  return boxes
+
+
+class TestSpatialTiles(TestCase):
+  def test_every_feature_is_in_one_tile(self):
+    features = random_boxes(500)
+    for method in PARTITION_METHODS:
+      with self.subTest(method=method):
+        tiles = spatial_tiles(features, 12, method)
+        ids = sorted(
+          feature_id for tile in tiles for feature_id in tile.ids)
+        self.assertEqual(ids, list(range(500)))
+        self.assertTrue(all(tile.ids for tile in tiles))
+
+  def test_kd_tiles_are_balanced(self):
+    tiles = spatial_tiles(random_boxes(1000), 16, 'kd')
+
+    self.assertEqual(len(tiles), 16)
+    sizes = [len(tile.ids) for tile in tiles]
+    self.assertLessEqual(max(sizes) - min(sizes), 1)
+
+  def test_quadtree_makes_enough_tiles(self):
+    tiles = spatial_tiles(random_boxes(1000), 10, 'quadtree')
+
+    self.assertGreaterEqual(len(tiles), 10)
+
+  def test_extent_covers_the_tile_boxes(self):
+    features = dict(random_boxes(300))
+    for method in PARTITION_METHODS:
+      for tile in spatial_tiles(features.items(), 8, method):
+        boxes = [features[feature_id] for feature_id in tile.ids]
+        self.assertEqual(tile.extent, (
+          min(box[0] for box in boxes), min(box[1] for box in boxes),
+          max(box[2] for box in boxes), max(box[3] for box in boxes)))
+
+  def test_kd_tiles_are_compact(self):
+    # The kd tiles of a 10 x 10 grid of points split it into quadrants.
+    features = [
+      (row * 10 + column, (column, row, column, row))
+      for row in range(10) for column in range(10)]
+    extents = sorted(tile.extent for tile in spatial_tiles(features, 4))
+
+    self.assertEqual(extents, [
+      (0, 0, 4, 4), (0, 5, 4, 9), (5, 0, 9, 4), (5, 5, 9, 9)])
+
+  def test_few_or_no_features(self):
+    self.assertEqual(spatial_tiles([], 4), [])
+    self.assertEqual(len(spatial_tiles(random_boxes(3), 8, 'kd')), 3)
+    # Features sharing one centre cannot be split further.
+    same = [(feature_id, (0, 0, 1, 1)) for feature_id in range(5)]
+    self.assertEqual(len(spatial_tiles(same, 4, 'quadtree')), 1)
+
+  def test_invalid_arguments(self):
+    with self.assertRaises(ValueError):
+      spatial_tiles(random_boxes(4), 2, 'hilbert')
+    with self.assertRaises(ValueError):
+      spatial_tiles(random_boxes(4), 0)
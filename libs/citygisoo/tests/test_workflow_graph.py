@@ -0,0 +1,153 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from src.citygisoo.workflow_graph import Step, WorkflowGraph
+
+# Names of the steps the step functions fail, and the calls they made
+FAILING = set()
+CALLS = []
+
+
+def concatenate(
+        first, second=None, output=None, suffix='', name='', workers=1):
+  CALLS.append(name)
+  if name in FAILING:
+    raise RuntimeError(f'{name} failed')
+  text = ''
+  for path in (first, second):
+    if path is not None:
+      with open(path, encoding='utf-8') as input_file:
+        text += input_file.read()
+  with open(output, 'w', encoding='utf-8') as output_file:
+    output_file.write(text + suffix)
+
+
+class TestWorkflowGraph(TestCase):
+  def setUp(self):
+    self._tmpdir = tempfile.TemporaryDirectory()
+    self.source = self.path('source.txt')
+    self.write(self.source, 'a')
+    self.state_path = self.path('state.json')
+    FAILING.clear()
+    CALLS.clear()
+
+  def tearDown(self):
+    self._tmpdir.cleanup()
+
+  def path(self, name):
+    return os.path.join(self._tmpdir.name, name)
+
+  @staticmethod
+  def write(path, text):
+    with open(path, 'w', encoding='utf-8') as text_file:
+      text_file.write(text)
+
+  def read(self, name):
+    with open(self.path(name), encoding='utf-8') as text_file:
+      return text_file.read()
+
+  def steps(self, suffix='b'):
+    # left and right both read the source; joined reads both of them.
+    return [
+      Step('joined', concatenate,
+           inputs={'first': self.path('left.txt'),
+                   'second': self.path('right.txt')},
+           outputs={'output': self.path('joined.txt')},
+           params={'name': 'joined'}),
+      Step('left', concatenate,
+           inputs={'first': self.source},
+           outputs={'output': self.path('left.txt')},
+           params={'suffix': suffix, 'name': 'left'}),
+      Step('right', concatenate,
+           inputs={'first': self.source},
+           outputs={'output': self.path('right.txt')},
+           params={'suffix': 'c', 'name': 'right'})]
+
+  def run_graph(self, steps, **kwargs):
+    return WorkflowGraph(steps, self.state_path, **kwargs).run(workers=2)
+
+  def test_steps_run_after_their_inputs(self):
+    timings = self.run_graph(self.steps())
+
+    self.assertEqual(self.read('joined.txt'), 'abac')
+    self.assertEqual(CALLS[-1], 'joined')
+    self.assertEqual(set(timings), {'left', 'right', 'joined'})
+    with open(self.state_path, encoding='utf-8') as state_file:
+      self.assertEqual(set(json.load(state_file)['steps']), set(timings))
+
+  def test_up_to_date_steps_are_skipped(self):
+    self.run_graph(self.steps())
+    CALLS.clear()
+
+    timings = self.run_graph(self.steps())
+
+    self.assertEqual(CALLS, [])
+    self.assertEqual(set(timings.values()), {None})
+
+  def test_changes_rerun_the_step_and_its_dependents(self):
+    for fingerprint_method in ('mtime', 'content'):
+      with self.subTest(fingerprint_method=fingerprint_method):
+        if os.path.exists(self.state_path):
+          os.remove(self.state_path)
+        self.run_graph(self.steps(), fingerprint_method=fingerprint_method)
+        CALLS.clear()
+
+        self.run_graph(
+          self.steps(suffix='x'), fingerprint_method=fingerprint_method)
+
+        self.assertEqual(sorted(CALLS), ['joined', 'left'])
+        self.assertEqual(self.read('joined.txt'), 'axac')
+
+  def test_removed_output_is_rebuilt(self):
+    self.run_graph(self.steps())
+    os.remove(self.path('right.txt'))
+    CALLS.clear()
+
+    self.run_graph(self.steps())
+
+    # The rewritten right has a new modification time.
+    self.assertEqual(sorted(CALLS), ['joined', 'right'])
+
+  def test_failure_stops_dependents_and_resumes(self):
+    FAILING.add('right')
+    with self.assertRaisesRegex(RuntimeError, 'right failed'):
+      self.run_graph(self.steps())
+    self.assertNotIn('joined', CALLS)
+    with open(self.state_path, encoding='utf-8') as state_file:
+      self.assertEqual(set(json.load(state_file)['steps']), {'left'})
+
+    FAILING.clear()
+    CALLS.clear()
+    timings = self.run_graph(self.steps())
+
+    self.assertEqual(sorted(CALLS), ['joined', 'right'])
+    self.assertIsNone(timings['left'])
+    self.assertEqual(self.read('joined.txt'), 'abac')
+
+  def test_invalid_graphs(self):
+    left, right = self.steps()[1:]
+    with self.assertRaises(ValueError):
+      WorkflowGraph([left, left], self.state_path)
+    with self.assertRaises(ValueError):
+      WorkflowGraph([left, Step(
+        'other', concatenate, outputs={'output': left.outputs['output']})],
+        self.state_path)
+    cycle = Step('cycle', concatenate,
+                 inputs={'first': self.path('right.txt')},
+                 outputs={'output': self.source})
+    with self.assertRaises(ValueError):
+      WorkflowGraph([right, cycle], self.state_path)
+    with self.assertRaises(ValueError):
+      WorkflowGraph([left], self.state_path, fingerprint_method='size')
+
+  def test_execution_params_do_not_rerun(self):
+    self.run_graph(self.steps())
+    CALLS.clear()
+    steps = self.steps()
+    steps[1].params['workers'] = 4
+
+    self.run_graph(steps)
+
+    self.assertEqual(CALLS, [])
@@ -8,186 +8,131 @@ to a municipality (name will be added later)
 In Code comments I refer to this district as CERC.
 Project Developer: Alireza Adli alireza.adli@mail.concordia.ca
 """
-
-from scrub_layer_class import ScrubLayer
-import input_paths_and_layers as paths
-
-# Making folders for the output data layers
-paths.create_output_folders(paths.output_paths, paths.output_paths_dir)
-
-cerc_boundary = \
-  ScrubLayer(
-    paths.qgis_path,
-    paths.input_paths['CERC Boundary'],
-    'CERC Boundary')
-
-# Initialize the input data layers
-nrcan = ScrubLayer(paths.qgis_path, paths.input_paths['NRCan'], 'NRCan')
-
-# Processing the NRCan layer includes fixing its geometries
-print('Processing the NRCan layer')
-print(nrcan)
-nrcan.create_spatial_index()
-nrcan.fix_geometries(paths.output_paths['Fixed NRCan'])
-
-# Defining a new layer for the fixed NRCan
-nrcan_fixed = \
-  ScrubLayer(paths.qgis_path, paths.output_paths['Fixed NRCan'], 'Fixed NRCan')
-nrcan_fixed.create_spatial_index()
-print(nrcan_fixed)
-
-nrcan_fixed.clip_layer(
-  cerc_boundary.layer_path, paths.output_paths['NRCan CERC Fixed'])
-
-nrcan_cerc_fixed = ScrubLayer(
-  paths.qgis_path, paths.output_paths['NRCan CERC Fixed'], 'NRCan CERC Fixed')
-
-nrcan_cerc_fixed.create_spatial_index()
-print(nrcan_cerc_fixed)
-
-# Processing the GeoIndex layer includes fixing its geometries and
-# clipping it based on the CERC boundary data layer
-print('Processing the GeoIndex layer')
-
-geo_index = ScrubLayer(
-  paths.qgis_path, paths.input_paths['GeoIndex'], 'GeoIndex')
-
-print(geo_index)
-geo_index.create_spatial_index()
-geo_index.fix_geometries(paths.output_paths['Fixed GeoIndex'])
-
-# Defining a new layer for the fixed GeoIndex
-geo_index_fixed = ScrubLayer(
-  paths.qgis_path, paths.output_paths['Fixed GeoIndex'], 'Fixed GeoIndex')
-geo_index_fixed.create_spatial_index()
-print(geo_index_fixed)
-geo_index_fixed.clip_layer(cerc_boundary.layer_path,
-                           paths.output_paths['Clipped Fixed GeoIndex'])
-
-geo_index_clipped = ScrubLayer(
-  paths.qgis_path,
-  paths.output_paths['Clipped Fixed GeoIndex'],
-  'Clipped Fixed GeoIndex')
-
-geo_index_clipped.create_spatial_index()
-print(geo_index_clipped)
-
-# Processing the Property Assessment layer includes a pairwise clip, and
-# two spatial join with NRCan and GeoIndex layers, respectively
-
-print('Processing the NRCan layer')
-
-property_assessment = \
-  ScrubLayer(
-    paths.qgis_path,
-    paths.input_paths['Property Assessment'],
-    'Property Assessment')
-
-property_assessment.clip_layer(
-  cerc_boundary.layer_path, paths.output_paths['CERC Property Assessment'])
-
-cerc_property_assessment = ScrubLayer(
-  paths.qgis_path,
-  paths.output_paths['CERC Property Assessment'], 'CERC Property Assessment')
-
-cerc_property_assessment.create_spatial_index()
-print(cerc_property_assessment)
-
-# For the pairwise clip, number of overlaying layers can be chosen
-# (meaning number of splits for NRCan layer). This improves the performance
-# where may increase duplicates. This has been done because using the NRCan
-# layer as a whole causes crashing the clipping process.
-
-number_of_partitions = 1
-
-if number_of_partitions == 1:
-
-  cerc_property_assessment.clip_layer(
-    nrcan_cerc_fixed.layer_path,
-    paths.output_paths['Pairwise Clipped Merged Property Assessment'])
-
-else:
-  # First we split the overlaying layers into our desired number
-  nrcan_cerc_fixed.split_layer(
-    number_of_partitions, paths.output_paths['Splitted CERC NRCans'])
-
-  # Clipping have to be done in
-  # (change the integer to the number_of_partitions' value)
-  clipping_property_assessment = """
-    from input_paths_and_layers import *
-
-    cerc_property_assessment.clip_by_multiple(
-      10, output_paths['Splitted CERC NRCans'],
-      output_paths['Pairwise Clipped Property Assessment Partitions'])"""
-
-  exec(clipping_property_assessment)
-
-  cerc_property_assessment.merge_layers(
-    paths.output_paths['Pairwise Clipped Property Assessment Partitions'],
-    paths.output_paths['Pairwise Clipped Merged Property Assessment'])
-
-
-clipped_property_assessment = ScrubLayer(
-  paths.qgis_path,
-  paths.output_paths['Pairwise Clipped Merged Property Assessment'],
-  'Clipped Property Assessment')
-
-print(clipped_property_assessment)
-clipped_property_assessment.create_spatial_index()
-
-clipped_property_assessment.spatial_join(
-  nrcan_cerc_fixed.layer_path,
-  paths.output_paths['Property Assessment and NRCan'])
-
-property_assessment_nrcan = ScrubLayer(
-  paths.qgis_path,
-  paths.output_paths['Property Assessment and NRCan'],
-  'Property Assessment and NRCan')
-
-print(property_assessment_nrcan)
-property_assessment_nrcan.create_spatial_index()
-
-property_assessment_nrcan.spatial_join(
-  geo_index_clipped.layer_path,
-  paths.output_paths['Property Assessment and NRCan and GeoIndex'])
-
-property_assessment_nrcan_geo = ScrubLayer(
-  paths.qgis_path,
-  paths.output_paths['Property Assessment and NRCan and GeoIndex'],
-  'Property Assessment and NRCan and GeoIndex')
-
-print(property_assessment_nrcan_geo)
-property_assessment_nrcan_geo.create_spatial_index()
-
-property_assessment_nrcan_geo.delete_duplicates(
-  paths.output_paths['Deleted Duplicates Layer'])
-
-deleted_dups_layer = ScrubLayer(
-  paths.qgis_path,
-  paths.output_paths['Deleted Duplicates Layer'],
-  'Deleted Duplicates Layer')
-
-print(deleted_dups_layer)
-deleted_dups_layer.create_spatial_index()
-
-deleted_dups_layer.multipart_to_singleparts(
-  paths.output_paths['Single Parts Layer'])
-
-single_parts_layer = ScrubLayer(
-  paths.qgis_path,
-  paths.output_paths['Single Parts Layer'],
-  'Single Parts Layer')
-
-print(single_parts_layer)
-single_parts_layer.create_spatial_index()
-
-# Add an area field
-single_parts_layer.add_field('Area')
-single_parts_layer.assign_area('Area')
-dismissive_area = 15
-single_parts_layer.conditional_delete_record('Area', '<', dismissive_area)
-
-print(
-  f'After removing buildings with '
-  f'less than {dismissive_area} squaremeter area:')
-print(single_parts_layer)
+import os
+
+from citygisoo import workflow_steps as steps
+from citygisoo.workflow_graph import Step, WorkflowGraph
+from jug_gis_cities.central_mtl_gisoo import input_paths_and_layers as paths
+
+
+def workflow_steps(inputs, outputs, number_of_partitions=1):
+  """
+  The steps of the workflow. A step runs once the steps writing its
+  inputs are done, so the NRCan, GeoIndex and Property Assessment
+  branches run side by side. Only the layers read by other steps, or
+  worth keeping, are written; the others stay in memory within their
+  step.
+  """
+  workflow = [
+    # Processing the NRCan layer includes fixing its geometries and
+    # clipping it based on the CERC boundary data layer
+    Step('Fix and Clip NRCan', steps.fix_and_clip,
+         inputs={'layer': inputs['NRCan'],
+                 'overlay_layer': inputs['CERC Boundary']},
+         outputs={'clipped_layer': outputs['NRCan CERC Fixed']},
+         params={'layer_name': 'NRCan'}),
+
+    # Processing the GeoIndex layer includes fixing its geometries and
+    # clipping it based on the CERC boundary data layer
+    Step('Fix and Clip GeoIndex', steps.fix_and_clip,
+         inputs={'layer': inputs['GeoIndex'],
+                 'overlay_layer': inputs['CERC Boundary']},
+         outputs={'clipped_layer': outputs['Clipped Fixed GeoIndex']},
+         params={'layer_name': 'GeoIndex'}),
+
+    # Processing the Property Assessment layer includes a pairwise clip,
+    # and two spatial join with NRCan and GeoIndex layers, respectively
+    Step('Clip Property Assessment to CERC', steps.clip_layer,
+         inputs={'layer': inputs['Property Assessment'],
+                 'overlay_layer': inputs['CERC Boundary']},
+         outputs={'clipped_layer': outputs['CERC Property Assessment']},
+         params={'layer_name': 'Property Assessment'})]
+
+  # For the pairwise clip, number of overlaying layers can be chosen
+  # (meaning number of splits for NRCan layer). This improves the
+  # performance where may increase duplicates. This has been done because
+  # using the NRCan layer as a whole causes crashing the clipping process.
+  if number_of_partitions == 1:
+    workflow.append(
+      Step('Clip Property Assessment', steps.clip_layer,
+           inputs={'layer': outputs['CERC Property Assessment'],
+                   'overlay_layer': outputs['NRCan CERC Fixed']},
+           outputs={'clipped_layer': outputs[
+             'Pairwise Clipped Merged Property Assessment']},
+           params={'layer_name': 'CERC Property Assessment'}))
+  else:
+    workflow += [
+      Step('Split NRCan', steps.split_layer,
+           inputs={'layer': outputs['NRCan CERC Fixed']},
+           outputs={'splitted_layers': outputs['Splitted CERC NRCans']},
+           params={'layer_name': 'NRCan CERC Fixed',
+                   'number_of_layers': number_of_partitions,
+                   'method': 'kd', 'layer_format': paths.layer_format}),
+      Step('Clip Property Assessment', steps.clip_by_multiple,
+           inputs={'layer': outputs['CERC Property Assessment'],
+                   'overlay_layers': outputs['Splitted CERC NRCans']},
+           outputs={'clipped_layers': outputs[
+             'Pairwise Clipped Property Assessment Partitions']},
+           params={'layer_name': 'CERC Property Assessment',
+                   'layer_format': paths.layer_format}),
+      Step('Merge Property Assessment', steps.merge_layers,
+           inputs={'layers': outputs[
+             'Pairwise Clipped Property Assessment Partitions']},
+           outputs={'merged_layer': outputs[
+             'Pairwise Clipped Merged Property Assessment']},
+           params={'layer_format': paths.layer_format})]
+
+  workflow += [
+    Step('Join NRCan and GeoIndex', steps.spatial_join,
+         inputs={'layer': outputs[
+                   'Pairwise Clipped Merged Property Assessment'],
+                 'joining_layer': outputs['NRCan CERC Fixed'],
+                 'next_joining_layer': outputs['Clipped Fixed GeoIndex']},
+         outputs={'joined_layer': outputs[
+           'Property Assessment and NRCan and GeoIndex']},
+         params={'layer_name': 'Clipped Property Assessment'}),
+
+    # Deleting the duplicates, splitting to single parts, adding an area
+    # field and removing the small buildings. The one-to-many joins repeat
+    # the geometry of a property for each building it meets, so the
+    # duplicates are exact copies, which the hash method finds in one pass
+    Step('Single Parts', steps.single_parts_with_area,
+         inputs={'layer': outputs[
+           'Property Assessment and NRCan and GeoIndex']},
+         outputs={'single_parts_layer': outputs['Single Parts Layer']},
+         params={'layer_name': 'Property Assessment and NRCan and GeoIndex',
+                 'area_field': 'Area', 'dismissive_area': 15,
+                 'duplicates_method': 'hash'})]
+  return workflow
+
+
+# The steps run in spawned worker processes, which import this module; the
+# workflow only runs when the module is executed.
+def main():
+  # Making folders for the output data layers
+  paths.create_output_folders(paths.output_paths, paths.output_paths_dir)
+
+  graph = WorkflowGraph(
+    workflow_steps(paths.input_paths, paths.output_paths),
+    paths.workflow_state_path)
+
+  # QGIS is not thread safe, so the steps run in processes, each starting
+  # its own QGIS application. Steps whose layers are up to date with their
+  # inputs and parameters are skipped, so a failed run resumes where it
+  # stopped.
+  if os.getenv('CITYGISOO_BACKEND', 'qgis') == 'qgis':
+    from citygisoo.scrub_layer_class import start_qgis_worker
+    os.environ.setdefault('QGIS_PREFIX_PATH', paths.qgis_path)
+    timings = graph.run(
+      workers=paths.workflow_workers, processes=True,
+      initializer=start_qgis_worker, initargs=(paths.qgis_path,))
+  else:
+    timings = graph.run(workers=paths.workflow_workers, processes=True)
+
+  for step, seconds in timings.items():
+    print(f'{step}: ' + (
+      'up to date' if seconds is None else f'{seconds:.1f}s'))
+
+
+if __name__ == '__main__':
+  main()
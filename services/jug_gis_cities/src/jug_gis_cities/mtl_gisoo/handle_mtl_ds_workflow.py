@@ -3,151 +3,113 @@ handle_mtl_ds_workflow module
 The workflow of cleaning and updating the Montreal Buildings dataset.
 Project Developer: Alireza Adli alireza.adli@mail.concordia.ca
 """
-
-from scrub_layer_class import ScrubLayer
-import input_paths_and_layers as paths
-
-# Making folders for the output data layers
-paths.create_output_folders(paths.output_paths, paths.output_paths_dir)
-
-# Initialize the input data layers
-nrcan = ScrubLayer(paths.qgis_path, paths.input_paths['NRCan'], 'NRCan')
-geo_index = ScrubLayer(
-  paths.qgis_path, paths.input_paths['GeoIndex'], 'GeoIndex')
-property_assessment = \
-  ScrubLayer(
-    paths.qgis_path,
-    paths.input_paths['Property Assessment'],
-    'Property Assessment')
-
-montreal_boundary = \
-  ScrubLayer(
-    paths.qgis_path,
-    paths.input_paths['Montreal Boundary'],
-    'Montreal Boundary')
-
-# Processing the NRCan layer includes fixing its geometries
-print('Processing the NRCan layer')
-print(nrcan)
-nrcan.create_spatial_index()
-nrcan.fix_geometries(paths.output_paths['Fixed NRCan'])
-
-# Defining a new layer for the fixed NRCan
-nrcan_fixed = \
-  ScrubLayer(paths.qgis_path, paths.output_paths['Fixed NRCan'], 'Fixed NRCan')
-nrcan_fixed.create_spatial_index()
-print(nrcan_fixed)
-
-# Processing the GeoIndex layer includes fixing its geometries and
-# clipping it based on the Montreal boundary data layer
-print('Processing the GeoIndex layer')
-print(geo_index)
-geo_index.create_spatial_index()
-geo_index.fix_geometries(paths.output_paths['Fixed GeoIndex'])
-
-# Defining a new layer for the fixed GeoIndex
-geo_index_fixed = ScrubLayer(
-  paths.qgis_path, paths.output_paths['Fixed GeoIndex'], 'Fixed GeoIndex')
-geo_index_fixed.create_spatial_index()
-print(geo_index_fixed)
-geo_index_fixed.clip_layer(montreal_boundary.layer_path,
-                           paths.output_paths['Clipped Fixed GeoIndex'])
-geo_index_clipped = \
-  ScrubLayer(paths.qgis_path,
-             paths.output_paths['Clipped Fixed GeoIndex'],
-             'Clipped Fixed GeoIndex')
-geo_index_clipped.create_spatial_index()
-print(geo_index_clipped)
-
-# Processing the Property Assessment layer includes a pairwise clip, and
-# two spatial join with NRCan and GeoIndex layers, respectively
-
-print(property_assessment)
-property_assessment.create_spatial_index()
-
-# For the pairwise clip, number of overlaying layers can be chosen
-# (meaning number of splits for NRCan layer). This improves the performance
-# where may increase duplicates. This has been done because using the NRCan
-# layer as a whole causes crashing the clipping process.
-
-# First we split the overlaying layers into our desired number
-nrcan_fixed.split_layer(120, paths.output_paths['Splitted NRCans'])
-
-# Clipping have to be done in
-clipping_property_assessment = """
-from input_paths_and_layers import *
-
-property_assessment.clip_by_multiple(
-  120, output_paths['Splitted NRCans'],
-  output_paths['Pairwise Clipped Property Assessment Partitions'])"""
-
-exec(clipping_property_assessment)
-
-property_assessment.merge_layers(
-  paths.output_paths['Pairwise Clipped Property Assessment Partitions'],
-  paths.output_paths['Pairwise Clipped Merged Property Assessment'])
-
-clipped_property_assessment = ScrubLayer(
-  paths.qgis_path,
-  paths.output_paths['Pairwise Clipped Merged Property Assessment'],
-  'Clipped Property Assessment')
-
-print(clipped_property_assessment)
-clipped_property_assessment.create_spatial_index()
-
-clipped_property_assessment.spatial_join(
-  nrcan_fixed.layer_path,
-  paths.output_paths['Property Assessment and NRCan'])
-
-property_assessment_nrcan = ScrubLayer(
-  paths.qgis_path,
-  paths.output_paths['Property Assessment and NRCan'],
-  'Property Assessment and NRCan')
-
-print(property_assessment_nrcan)
-property_assessment_nrcan.create_spatial_index()
-
-property_assessment_nrcan.spatial_join(
-  geo_index_clipped,
-  paths.output_paths['Property Assessment and NRCan and GeoIndex'])
-
-property_assessment_nrcan_geo = ScrubLayer(
-  paths.qgis_path,
-  paths.output_paths['Property Assessment and NRCan and GeoIndex'],
-  'Property Assessment and NRCan and GeoIndex')
-
-print(property_assessment_nrcan_geo)
-property_assessment_nrcan_geo.create_spatial_index()
-
-property_assessment_nrcan_geo.delete_duplicates(
-  paths.output_paths['Deleted Duplicates Layer'])
-
-deleted_dups_layer = ScrubLayer(
-  paths.qgis_path,
-  paths.output_paths['Deleted Duplicates Layer'],
-  'Deleted Duplicates Layer')
-
-print(deleted_dups_layer)
-deleted_dups_layer.create_spatial_index()
-
-deleted_dups_layer.multipart_to_singleparts(
-  paths.output_paths['Single Parts Layer'])
-
-single_parts_layer = ScrubLayer(
-  paths.qgis_path,
-  paths.output_paths['Single Parts Layer'],
-  'Single Parts Layer')
-
-print(single_parts_layer)
-single_parts_layer.create_spatial_index()
-
-# Add an area field
-single_parts_layer.add_field('Area')
-single_parts_layer.assign_area('Area')
-dismissive_area = 15
-single_parts_layer.conditional_delete_record('Area', '<', dismissive_area)
-
-print(
-  f'After removing buildings with '
-  f'less than {dismissive_area} squaremeter area:')
-print(single_parts_layer)
+import os
+
+from citygisoo import workflow_steps as steps
+from citygisoo.workflow_graph import Step, WorkflowGraph
+from jug_gis_cities.mtl_gisoo import input_paths_and_layers as paths
+
+
+def workflow_steps(inputs, outputs):
+  """
+  The steps of the workflow. A step runs once the steps writing its
+  inputs are done, so the NRCan and GeoIndex branches run side by side.
+  Only the layers read by other steps, or worth keeping, are written;
+  the others stay in memory within their step.
+  """
+  return [
+    # Processing the NRCan layer includes fixing its geometries
+    Step('Fix NRCan', steps.fix_geometries,
+         inputs={'layer': inputs['NRCan']},
+         outputs={'fixed_layer': outputs['Fixed NRCan']},
+         params={'layer_name': 'NRCan'}),
+
+    # Processing the GeoIndex layer includes fixing its geometries and
+    # clipping it based on the Montreal boundary data layer
+    Step('Fix and Clip GeoIndex', steps.fix_and_clip,
+         inputs={'layer': inputs['GeoIndex'],
+                 'overlay_layer': inputs['Montreal Boundary']},
+         outputs={'clipped_layer': outputs['Clipped Fixed GeoIndex']},
+         params={'layer_name': 'GeoIndex'}),
+
+    # Processing the Property Assessment layer includes a pairwise clip,
+    # and two spatial join with NRCan and GeoIndex layers, respectively.
+    # For the pairwise clip, number of overlaying layers can be chosen
+    # (meaning number of splits for NRCan layer). This has been done
+    # because using the NRCan layer as a whole causes crashing the
+    # clipping process. The NRCan layer is split into compact spatial
+    # tiles, which keeps the duplicates few and lets each clip skip the
+    # features outside its tile.
+    Step('Split NRCan', steps.split_layer,
+         inputs={'layer': outputs['Fixed NRCan']},
+         outputs={'splitted_layers': outputs['Splitted NRCans']},
+         params={'layer_name': 'Fixed NRCan', 'number_of_layers': 120,
+                 'method': 'kd', 'layer_format': paths.layer_format}),
+    Step('Clip Property Assessment', steps.clip_by_multiple,
+         inputs={'layer': inputs['Property Assessment'],
+                 'overlay_layers': outputs['Splitted NRCans']},
+         outputs={'clipped_layers': outputs[
+           'Pairwise Clipped Property Assessment Partitions']},
+         params={'layer_name': 'Property Assessment',
+                 'workers': paths.clip_workers,
+                 'retries': paths.clip_retries,
+                 'layer_format': paths.layer_format}),
+    Step('Merge Property Assessment', steps.merge_layers,
+         inputs={'layers': outputs[
+           'Pairwise Clipped Property Assessment Partitions']},
+         outputs={'merged_layer': outputs[
+           'Pairwise Clipped Merged Property Assessment']},
+         params={'layer_format': paths.layer_format}),
+
+    Step('Join NRCan and GeoIndex', steps.spatial_join,
+         inputs={'layer': outputs[
+                   'Pairwise Clipped Merged Property Assessment'],
+                 'joining_layer': outputs['Fixed NRCan'],
+                 'next_joining_layer': outputs['Clipped Fixed GeoIndex']},
+         outputs={'joined_layer': outputs[
+           'Property Assessment and NRCan and GeoIndex']},
+         params={'layer_name': 'Clipped Property Assessment'}),
+
+    # Deleting the duplicates, splitting to single parts, adding an area
+    # field and removing the small buildings. The one-to-many joins repeat
+    # the geometry of a property for each building it meets, so the
+    # duplicates are exact copies, which the hash method finds in one pass
+    Step('Single Parts', steps.single_parts_with_area,
+         inputs={'layer': outputs[
+           'Property Assessment and NRCan and GeoIndex']},
+         outputs={'single_parts_layer': outputs['Single Parts Layer']},
+         params={'layer_name': 'Property Assessment and NRCan and GeoIndex',
+                 'area_field': 'Area', 'dismissive_area': 15,
+                 'duplicates_method': 'hash'})]
+
+
+# The steps run in spawned worker processes, which import this module; the
+# workflow only runs when the module is executed.
+def main():
+  # Making folders for the output data layers
+  paths.create_output_folders(paths.output_paths, paths.output_paths_dir)
+
+  graph = WorkflowGraph(
+    workflow_steps(paths.input_paths, paths.output_paths),
+    paths.workflow_state_path)
+
+  # QGIS is not thread safe, so the steps run in processes, each starting
+  # its own QGIS application. Steps whose layers are up to date with their
+  # inputs and parameters are skipped, so a failed run resumes where it
+  # stopped.
+  if os.getenv('CITYGISOO_BACKEND', 'qgis') == 'qgis':
+    from citygisoo.scrub_layer_class import start_qgis_worker
+    os.environ.setdefault('QGIS_PREFIX_PATH', paths.qgis_path)
+    timings = graph.run(
+      workers=paths.workflow_workers, processes=True,
+      initializer=start_qgis_worker, initargs=(paths.qgis_path,))
+  else:
+    timings = graph.run(workers=paths.workflow_workers, processes=True)
+
+  for step, seconds in timings.items():
+    print(f'{step}: ' + (
+      'up to date' if seconds is None else f'{seconds:.1f}s'))
+
+
+if __name__ == '__main__':
+  main()
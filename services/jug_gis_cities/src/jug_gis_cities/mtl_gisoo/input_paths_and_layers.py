@@ -9,15 +9,26 @@ def create_output_folders(paths_dict, output_dir):
   for path in paths_dict.keys():
     new_folder = path.lower().replace(' ', '_')
     output_path = output_dir + '/' + new_folder
-    os.mkdir(output_path)
+    os.makedirs(output_path, exist_ok=True)
     if path[-1] != 's':
-      paths_dict[path] = output_path + f'/{new_folder}.shp'
+      paths_dict[path] = output_path + f'/{new_folder}.{layer_format}'
     else:
       paths_dict[path] = output_path
 
 
-# Application's path
-qgis_path = 'C:/Program Files/QGIS 3.34.1/apps/qgis'
+# Format of the layers written to disk, for every workflow step: 'shp',
+# 'gpkg' or 'fgb' (see citygisoo's basic_functions.LAYER_FORMATS)
+layer_format = os.getenv('CITYGISOO_LAYER_FORMAT', 'shp')
+
+# Application's path (QGIS_PREFIX_PATH is set in the QGIS container)
+qgis_path = os.getenv(
+  'QGIS_PREFIX_PATH', 'C:/Program Files/QGIS 3.34.1/apps/qgis')
+
+# Processes clipping the Property Assessment partitions in parallel, each
+# running its own QGIS application, and how many times a failed partition
+# is clipped again
+clip_workers = max(1, (os.cpu_count() or 1) - 1)
+clip_retries = 1
 
 # Gathering input data layers paths
 input_paths = {
@@ -40,16 +51,21 @@ output_paths_dir = \
   'C:/Users/a_adli/PycharmProjects/mtl_gis_oo/' \
   'output_data'
 
-# Preparing a bedding for output data layers paths
+# Preparing a bedding for output data layers paths.
+# Every step of the workflow keeps its layers here, so a rerun skips the
+# steps whose layers are up to date.
 output_paths = {
   'Fixed NRCan': '',
-  'Fixed GeoIndex': '',
   'Clipped Fixed GeoIndex': '',
   'Splitted NRCans': '',
   'Pairwise Clipped Property Assessment Partitions': '',
   'Pairwise Clipped Merged Property Assessment': '',
-  'Property Assessment and NRCan': '',
   'Property Assessment and NRCan and GeoIndex': '',
-  'Deleted Duplicates Layer': '',
   'Single Parts Layer': ''
 }
+
+# Steps run at the same time (the NRCan and GeoIndex branches are
+# independent), and the file keeping the fingerprints and timings of
+# the steps between runs
+workflow_workers = 2
+workflow_state_path = output_paths_dir + '/workflow_state.json'
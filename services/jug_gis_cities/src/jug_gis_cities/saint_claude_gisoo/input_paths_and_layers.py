@@ -9,15 +9,20 @@ def create_output_folders(paths_dict, output_dir):
   for path in paths_dict.keys():
     new_folder = path.lower().replace(' ', '_')
     output_path = output_dir + '/' + new_folder
-    os.mkdir(output_path)
+    os.makedirs(output_path, exist_ok=True)
     if path[-1] != 's':
-      paths_dict[path] = output_path + f'/{new_folder}.shp'
+      paths_dict[path] = output_path + f'/{new_folder}.{layer_format}'
     else:
       paths_dict[path] = output_path
 
 
-# Application's path
-qgis_path = 'C:/Program Files/QGIS 3.34.1/apps/qgis'
+# Format of the layers written to disk, for every workflow step: 'shp',
+# 'gpkg' or 'fgb' (see citygisoo's basic_functions.LAYER_FORMATS)
+layer_format = os.getenv('CITYGISOO_LAYER_FORMAT', 'shp')
+
+# Application's path (QGIS_PREFIX_PATH is set in the QGIS container)
+qgis_path = os.getenv(
+  'QGIS_PREFIX_PATH', 'C:/Program Files/QGIS 3.34.1/apps/qgis')
 
 # Gathering input data layers paths
 input_paths = {
@@ -1,7 +1,9 @@
 import logging
+import os
 import secrets
 from time import perf_counter
 
+import click
 from flask import Flask, request, g
 from flask_smorest import Api
 from werkzeug.exceptions import HTTPException
@@ -9,9 +11,11 @@ from werkzeug.exceptions import HTTPException
 try:
     from jug_lca_buildings.resources.emissions \
         import blp as emissions_blueprint
+    from jug_lca_buildings.application import EmissionsApplicationService
 except ModuleNotFoundError:
     from src.jug_lca_buildings.resources.emissions \
         import blp as emissions_blueprint
+    from src.jug_lca_buildings.application import EmissionsApplicationService
 
 from jugs_chassis.logging.config import configure_logging
 from jugs_chassis.logging.context import set_request_id, get_request_id
@@ -34,6 +38,23 @@ api = Api(app)
 api.register_blueprint(emissions_blueprint)
 
 
+# Sweep artifacts cached under an older catalog/code namespace, optionally
+# recomputing the most requested ones first. Run once per deploy, outside
+# the web workers: ``flask --app app refresh-stale-artifacts``.
+@app.cli.command('refresh-stale-artifacts')
+@click.option(
+    '--warm-up-top',
+    type=int,
+    default=lambda: int(os.getenv('JUG_LCA_WARMUP_TOP', '0') or 0),
+    help='Number of the most requested stale results to recompute.',
+)
+def refresh_stale_artifacts(warm_up_top):
+    summary = EmissionsApplicationService.refresh_stale_artifacts(
+        warm_up_top=warm_up_top,
+    )
+    click.echo(summary)
+
+
 # ---- Correlation ID + access logging ----
 @app.before_request
 def _before():
@@ -0,0 +1,15 @@
+"""ASGI entry point: ``uvicorn asgi:app``.
+
+POST /emissions and POST /emissions/upload run on the event loop with the
+LCA workflow in a bounded process pool (JUG_LCA_COMPUTE_WORKERS,
+JUG_LCA_COMPUTE_QUEUE); all other routes are served by the Flask app.
+"""
+
+from app import app as flask_app
+
+try:
+    from jug_lca_buildings.asgi import create_asgi_app
+except ModuleNotFoundError:
+    from src.jug_lca_buildings.asgi import create_asgi_app
+
+app = create_asgi_app(flask_app)
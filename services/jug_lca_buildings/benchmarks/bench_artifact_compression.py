@@ -0,0 +1,85 @@
+"""
+Benchmark artifact compression codecs.
+
+Encodes the emissions JSON and CSV report of a synthetic city with each
+codec and prints the compression ratio and encode/decode CPU time.
+
+Run from services/jug_lca_buildings:
+    python -m benchmarks.bench_artifact_compression --buildings 500
+"""
+import argparse
+import gzip
+import json
+from time import process_time
+
+from src.jug_lca_buildings.reporting import EmissionsReportExporter
+from src.jug_lca_buildings.storage import artifact_codecs
+from benchmarks.bench_artifact_store import (
+    synthetic_city,
+    synthetic_emissions,
+)
+
+
+def gzip_codec(level):
+    return (
+        f'gzip-{level}',
+        lambda data: gzip.compress(data, compresslevel=level, mtime=0),
+        gzip.decompress,
+    )
+
+
+def zstd_codec(level):
+    zstandard = artifact_codecs.zstandard
+    return (
+        f'zstd-{level}',
+        zstandard.ZstdCompressor(level=level).compress,
+        artifact_codecs.decode,
+    )
+
+
+def measure(encode, decode, data, repeat):
+    t0 = process_time()
+    for _ in range(repeat):
+        blob = encode(data)
+    encode_time = (process_time() - t0) / repeat
+    t0 = process_time()
+    for _ in range(repeat):
+        decode(blob)
+    decode_time = (process_time() - t0) / repeat
+    return len(data) / len(blob), encode_time, decode_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--buildings', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    request_city = synthetic_city(0, args.buildings)
+    emissions_data = synthetic_emissions(args.buildings)
+    artifacts = {
+        'emissions': json.dumps(
+            emissions_data, indent=2, sort_keys=True).encode('utf-8'),
+        'csv': EmissionsReportExporter.build_csv_text(
+            request_city, emissions_data).encode('utf-8'),
+    }
+
+    codecs = [gzip_codec(level) for level in (1, 6, 9)]
+    if artifact_codecs.zstandard is not None:
+        codecs += [zstd_codec(level) for level in (1, 3, 9)]
+    else:
+        print('zstandard not installed; skipping zstd')
+
+    print(f'{args.buildings} buildings, {args.repeat} repeats')
+    print(f'{"artifact":<11}{"codec":<9}{"bytes":>10}{"ratio":>8}'
+          f'{"encode":>11}{"decode":>11}')
+    for artifact, data in artifacts.items():
+        for name, encode, decode in codecs:
+            ratio, encode_time, decode_time = measure(
+                encode, decode, data, args.repeat)
+            print(f'{artifact:<11}{name:<9}{len(data):>10}{ratio:>7.1f}x'
+                  f'{encode_time * 1e3:>9.2f}ms{decode_time * 1e3:>9.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
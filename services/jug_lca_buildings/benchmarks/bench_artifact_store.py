@@ -0,0 +1,112 @@
+"""
+Benchmark EmissionsArtifactStore backends.
+
+Saves, reads and records cache hits for synthetic cities on each artifact
+backend and prints wall-clock timings.
+
+Run from services/jug_lca_buildings:
+    python -m benchmarks.bench_artifact_store --cities 200 --buildings 50
+"""
+import argparse
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+from src.jug_lca_buildings.reporting import EmissionsReportExporter
+from src.jug_lca_buildings.storage import EmissionsArtifactStore
+from src.jug_lca_buildings.storage.artifact_backends import ARTIFACT_BACKENDS
+
+
+def synthetic_city(city_index, buildings):
+    features = []
+    for building_index in range(buildings):
+        x = -73.57 + building_index * 1e-4
+        y = 45.5 + city_index * 1e-4
+        features.append({
+            'type': 'Feature',
+            'id': building_index,
+            'geometry': {
+                'type': 'Polygon',
+                'coordinates': [[
+                    [x, y], [x + 5e-5, y], [x + 5e-5, y + 5e-5],
+                    [x, y + 5e-5], [x, y],
+                ]],
+            },
+            'properties': {
+                'name': f'Building {building_index}',
+                'address': f'{building_index} Benchmark St',
+                'function': '1000',
+                'height': 12.5,
+                'year_of_construction': 1995,
+            },
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def synthetic_emissions(buildings):
+    return [
+        {field: float(index + offset)
+         for offset, field in enumerate(EmissionsReportExporter.METRIC_FIELDS)}
+        for index in range(buildings)
+    ]
+
+
+def run_backend(backend_name, base_dir, cities):
+    store = EmissionsArtifactStore(base_dir, backend=backend_name)
+    timings = {}
+
+    t0 = perf_counter()
+    hashes = []
+    for request_city, emissions_data, csv_text in cities:
+        request_hash = store.build_request_hash(request_city)
+        store.save_emissions_data(request_hash, request_city, emissions_data)
+        store.save_csv_report(request_hash, csv_text)
+        hashes.append(request_hash)
+    timings['save'] = perf_counter() - t0
+
+    t0 = perf_counter()
+    for request_hash in hashes:
+        store.load_emissions_data(request_hash)
+        store.load_csv_report(request_hash)
+    timings['load'] = perf_counter() - t0
+
+    t0 = perf_counter()
+    for request_hash in hashes:
+        store.record_cache_hit(request_hash)
+    timings['record_hit'] = perf_counter() - t0
+
+    t0 = perf_counter()
+    store.summarize()
+    timings['summarize'] = perf_counter() - t0
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--cities', type=int, default=200)
+    parser.add_argument('--buildings', type=int, default=50)
+    parser.add_argument(
+        '--backends', nargs='+', default=sorted(ARTIFACT_BACKENDS))
+    args = parser.parse_args()
+
+    cities = []
+    for city_index in range(args.cities):
+        request_city = synthetic_city(city_index, args.buildings)
+        emissions_data = synthetic_emissions(args.buildings)
+        csv_text = EmissionsReportExporter.build_csv_text(
+            request_city, emissions_data)
+        cities.append((request_city, emissions_data, csv_text))
+
+    print(f'{args.cities} cities x {args.buildings} buildings')
+    print(f'{"backend":<12}{"save":>10}{"load":>10}'
+          f'{"record_hit":>12}{"summarize":>11}')
+    for backend_name in args.backends:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            timings = run_backend(backend_name, Path(tmp_dir), cities)
+        print(f'{backend_name:<12}{timings["save"]:>9.3f}s'
+              f'{timings["load"]:>9.3f}s{timings["record_hit"]:>11.3f}s'
+              f'{timings["summarize"]:>10.3f}s')
+
+
+if __name__ == '__main__':
+    main()
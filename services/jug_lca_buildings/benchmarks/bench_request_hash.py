@@ -0,0 +1,57 @@
+"""
+Benchmark request hashing.
+
+Compares hashing a full ``json.dumps(..., sort_keys=True)`` string with the
+streaming canonical hasher and prints wall-clock time and peak traced
+memory for each.
+
+Run from services/jug_lca_buildings:
+    python -m benchmarks.bench_request_hash --buildings 100000
+"""
+import argparse
+import hashlib
+import json
+import tracemalloc
+from time import perf_counter
+
+from benchmarks.bench_artifact_store import synthetic_city
+from src.jug_lca_buildings.storage.canonical_json import canonical_sha256
+
+
+def full_dump_sha256(payload):
+    canonical = json.dumps(
+        payload,
+        sort_keys=True,
+        separators=(',', ':'),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--buildings', type=int, default=100000)
+    args = parser.parse_args()
+
+    payload = {
+        'cache_namespace': 'benchmark',
+        'request_city': synthetic_city(0, args.buildings),
+    }
+    print(f'{args.buildings} buildings')
+    print(f'{"hasher":<10}{"time":>10}{"peak":>12}  digest')
+    for name, hasher in (('dumps', full_dump_sha256),
+                         ('streaming', canonical_sha256)):
+        t0 = perf_counter()
+        hasher(payload)
+        elapsed = perf_counter() - t0
+
+        tracemalloc.start()
+        digest = hasher(payload)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f'{name:<10}{elapsed:>9.3f}s{peak / 2 ** 20:>9.1f} MiB'
+              f'  {digest[:16]}')
+
+
+if __name__ == '__main__':
+    main()
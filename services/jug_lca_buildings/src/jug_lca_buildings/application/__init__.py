@@ -1,5 +1,10 @@
 """Application services for jug_lca_buildings."""
 
 from .jug_lca_buildings import EmissionsApplicationService
+from .upload_limits import UploadLimitExceeded, UploadLimits
 
-__all__ = ['EmissionsApplicationService']
+__all__ = [
+    'EmissionsApplicationService',
+    'UploadLimitExceeded',
+    'UploadLimits',
+]
@@ -1,10 +1,14 @@
 """Application-layer orchestration for emissions computation."""
 
+import logging
 from dataclasses import dataclass
 
 from ..lca_carbon_workflow import LCACarbonWorkflow
+from ..lca_chunked_workflow import DEFAULT_CHUNK_SIZE, ChunkedLCACarbonWorkflow
 from ..reporting import EmissionsReportExporter
-from ..storage import EmissionsArtifactStore
+from ..storage import EmissionsArtifactStore, EmissionsCheckpoint
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass(frozen=True)
@@ -21,21 +25,78 @@ class EmissionsApplicationService:
 
     @classmethod
     def compute_emissions(cls, request_city):
+        request_hash, cached_result = cls.lookup_emissions(request_city)
+        if cached_result is not None:
+            return cached_result
+        return cls.save_emissions(
+            request_hash,
+            request_city,
+            cls.run_workflow(request_city, request_hash),
+        )
+
+    @classmethod
+    def lookup_emissions(cls, request_city):
+        """Return ``(request_hash, cached result or None)``."""
         store = EmissionsArtifactStore()
         request_hash = store.build_request_hash(request_city)
         cached_data = store.load_emissions_data(request_hash)
-        if cached_data is not None:
-            return EmissionsComputationResult(
-                request_hash=request_hash,
-                emissions_data=cached_data,
-                cache_hit=True,
-            )
+        if cached_data is None:
+            return request_hash, None
+        store.record_cache_hit(request_hash)
+        return request_hash, EmissionsComputationResult(
+            request_hash=request_hash,
+            emissions_data=cached_data,
+            cache_hit=True,
+        )
+
+    @staticmethod
+    def run_workflow(request_city, request_hash=None):
+        """Run the CPU-bound LCA workflow; safe to call in a worker process.
 
-        emissions_data = LCACarbonWorkflow(
+        Cities with more than LCA_CHUNK_SIZE features are built and
+        calculated in batches of that size to bound memory. With a request
+        hash, progress is checkpointed in the artifact directory and a
+        restarted computation of the same request resumes from it. A
+        request whose checkpoint is locked by another worker computing it
+        is calculated without one. The checkpoint is discarded once the
+        emissions are complete.
+        """
+        checkpoint = None
+        if request_hash is not None:
+            checkpoint = EmissionsCheckpoint(
+                EmissionsArtifactStore().checkpoint_path(request_hash))
+            if not checkpoint.acquire():
+                checkpoint = None
+        try:
+            emissions_data = EmissionsApplicationService._calculate(
+                request_city, checkpoint)
+            if checkpoint is not None:
+                checkpoint.discard()
+            return emissions_data
+        finally:
+            if checkpoint is not None:
+                checkpoint.release()
+
+    @staticmethod
+    def _calculate(request_city, checkpoint):
+        features = request_city.get('features') or []
+        if DEFAULT_CHUNK_SIZE and len(features) > DEFAULT_CHUNK_SIZE:
+            return ChunkedLCACarbonWorkflow(
+                request_city,
+                'nrcan_archetypes.json',
+                'nrcan_constructions_cap_3.json',
+                checkpoint=checkpoint,
+            ).export_emissions()
+        return LCACarbonWorkflow(
             request_city,
             'nrcan_archetypes.json',
             'nrcan_constructions_cap_3.json',
+            checkpoint=checkpoint,
         ).export_emissions()
+
+    @classmethod
+    def save_emissions(cls, request_hash, request_city, emissions_data):
+        store = EmissionsArtifactStore()
         store.save_emissions_data(request_hash, request_city, emissions_data)
         return EmissionsComputationResult(
             request_hash=request_hash,
@@ -62,3 +123,99 @@ class EmissionsApplicationService:
             ),
             'cache_hit': csv_cache_hit,
         }
+
+    @classmethod
+    def build_csv_report_for_hash(cls, request_hash):
+        """Build the CSV report of a cached result; None if not cached."""
+        store = EmissionsArtifactStore()
+        emissions_data = store.load_emissions_data(request_hash)
+        features = store.iter_request_features(request_hash)
+        if emissions_data is None or features is None:
+            return None
+        try:
+            return cls.build_csv_report(
+                {'features': features},
+                EmissionsComputationResult(
+                    request_hash=request_hash,
+                    emissions_data=emissions_data,
+                    cache_hit=True,
+                ),
+            )
+        except KeyError:
+            logger.warning(
+                'request_features_missing',
+                extra={'request_hash': request_hash[:12]},
+            )
+            return None
+
+    @classmethod
+    def load_encoded_artifact(cls, request_hash, artifact, accept_encoding):
+        """Return the stored artifact body, compressed if the client allows."""
+        return EmissionsArtifactStore().load_encoded_artifact(
+            request_hash,
+            artifact,
+            accept_encoding,
+        )
+
+    @classmethod
+    def artifact_exists(cls, request_hash, artifact):
+        return EmissionsArtifactStore().artifact_exists(
+            request_hash, artifact)
+
+    @staticmethod
+    def build_csv_filename(request_hash):
+        return EmissionsArtifactStore.build_csv_filename(request_hash)
+
+    @classmethod
+    def refresh_stale_artifacts(cls, warm_up_top=0):
+        """Recompute the most requested stale artifacts, then sweep the rest.
+
+        Only one worker per cache namespace performs the refresh; run it
+        outside the web workers with ``flask --app app
+        refresh-stale-artifacts``.
+        """
+        store = EmissionsArtifactStore()
+        if not store.claim_stale_artifact_maintenance():
+            return {'warmed_up': 0, 'swept': 0, 'orphan_blobs': 0}
+
+        stale_artifacts = sorted(
+            store.iter_stale_artifacts(),
+            key=lambda metadata: metadata.get('request_count', 1),
+            reverse=True,
+        )
+        warmed_up = 0
+        for metadata in stale_artifacts[:max(0, warm_up_top)]:
+            if not store.renew_stale_artifact_maintenance():
+                # The claim was taken over; its new worker does the rest.
+                return {'warmed_up': warmed_up, 'swept': 0,
+                        'orphan_blobs': 0}
+            request_city = store.load_request_city(metadata['request_hash'])
+            if request_city is None:
+                continue
+            try:
+                cls.compute_emissions(request_city)
+            except Exception:
+                logger.exception(
+                    'stale_artifact_warm_up_failed',
+                    extra={'request_hash': metadata['request_hash'][:12]},
+                )
+            else:
+                warmed_up += 1
+
+        swept = store.sweep_stale_artifacts()
+        orphan_blobs = store.collect_orphan_blobs() if swept else 0
+        store.complete_stale_artifact_maintenance()
+        logger.info(
+            'stale_artifacts_refreshed',
+            extra={
+                'cache_namespace': store.cache_namespace,
+                'warmed_up': warmed_up,
+                'swept': swept,
+                'orphan_blobs': orphan_blobs,
+            },
+        )
+        return {
+            'warmed_up': warmed_up,
+            'swept': swept,
+            'orphan_blobs': orphan_blobs,
+        }
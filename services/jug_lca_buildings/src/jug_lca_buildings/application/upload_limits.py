@@ -0,0 +1,158 @@
+"""Size limits of emissions requests, enforced while the body is read."""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from http import HTTPStatus
+
+from ..life_cycle_assessment.geojson_feature_stream import (
+    iter_feature_batches,
+)
+
+DEFAULT_MAX_UPLOAD_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_FEATURES = 100_000
+DEFAULT_MAX_VERTICES = 5_000_000
+PARSE_BATCH_SIZE = 100
+PARSE_READ_SIZE = 64 * 1024
+
+
+class UploadLimitExceeded(Exception):
+    """Raised as soon as a request crosses one of the UploadLimits."""
+
+    def __init__(self, limit, maximum, status, async_jobs_url=None):
+        self.limit = limit
+        self.maximum = maximum
+        self.status = status
+        self.async_jobs_url = async_jobs_url
+        super().__init__(
+            f'Request exceeds the limit of {maximum} {limit}'
+            + ('; submit it as an asynchronous job' if async_jobs_url else '')
+        )
+
+    @property
+    def errors(self):
+        errors = {'limit': self.limit, 'maximum': self.maximum}
+        if self.async_jobs_url:
+            errors['async_job_endpoint'] = self.async_jobs_url
+        return errors
+
+    @property
+    def headers(self):
+        if not self.async_jobs_url:
+            return None
+        return {'Link': f'<{self.async_jobs_url}>; rel="async-job"'}
+
+    def to_payload(self):
+        """The flask-smorest error envelope of this error."""
+        return {
+            'code': self.status,
+            'status': HTTPStatus(self.status).phrase,
+            'message': str(self),
+            'errors': self.errors,
+        }
+
+
+def count_positions(coordinates):
+    """Number of positions (vertices) in GeoJSON coordinates."""
+    count = 0
+    pending = [coordinates]
+    while pending:
+        item = pending.pop()
+        if not isinstance(item, list) or not item:
+            continue
+        if isinstance(item[0], (int, float)):
+            count += 1
+        else:
+            pending.extend(item)
+    return count
+
+
+def _feature_positions(feature):
+    geometry = feature.get('geometry') if isinstance(feature, dict) else None
+    if not isinstance(geometry, dict):
+        return 0
+    return count_positions(geometry.get('coordinates'))
+
+
+def _env_limit(name, default):
+    try:
+        return max(0, int(os.getenv(name, str(default))))
+    except ValueError:
+        return default
+
+
+@dataclass(frozen=True)
+class UploadLimits:
+    """Byte, feature and vertex limits of one request; 0 disables a limit.
+
+    Bytes over the limit are answered with 413 before the rest of the body
+    is read. Feature and vertex counts over the limit are answered with
+    422; a JSON body or uploaded file is parsed feature by feature, so they
+    are rejected as soon as the count is crossed. When
+    JUG_LCA_ASYNC_JOBS_URL is set, errors point clients to it.
+    """
+
+    max_bytes: int = DEFAULT_MAX_UPLOAD_BYTES
+    max_features: int = DEFAULT_MAX_FEATURES
+    max_vertices: int = DEFAULT_MAX_VERTICES
+    async_jobs_url: str | None = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_bytes=_env_limit(
+                'JUG_LCA_MAX_UPLOAD_BYTES', DEFAULT_MAX_UPLOAD_BYTES),
+            max_features=_env_limit(
+                'JUG_LCA_MAX_FEATURES', DEFAULT_MAX_FEATURES),
+            max_vertices=_env_limit(
+                'JUG_LCA_MAX_VERTICES', DEFAULT_MAX_VERTICES),
+            async_jobs_url=os.getenv('JUG_LCA_ASYNC_JOBS_URL') or None,
+        )
+
+    def exceeded(self, limit):
+        maximum = {
+            'bytes': self.max_bytes,
+            'features': self.max_features,
+            'vertices': self.max_vertices,
+        }[limit]
+        status = 413 if limit == 'bytes' else 422
+        return UploadLimitExceeded(
+            limit, maximum, status, self.async_jobs_url)
+
+    def check_bytes(self, size):
+        if self.max_bytes and size is not None and size > self.max_bytes:
+            raise self.exceeded('bytes')
+
+    def _check_feature(self, features, vertices):
+        if self.max_features and features > self.max_features:
+            raise self.exceeded('features')
+        if self.max_vertices and vertices > self.max_vertices:
+            raise self.exceeded('vertices')
+
+    def check_request_city(self, request_city):
+        """Check the counts of an already parsed request."""
+        vertices = 0
+        for features, feature in enumerate(
+                request_city.get('features') or [], start=1):
+            vertices += _feature_positions(feature)
+            self._check_feature(features, vertices)
+
+    def read_geojson(self, geojson_file):
+        """Parse a GeoJSON text file, failing once a count is crossed.
+
+        Raises ValueError if the content is not a JSON object.
+        """
+        members = {}
+        features = []
+        vertices = 0
+        for batch in iter_feature_batches(
+                geojson_file, PARSE_BATCH_SIZE, read_size=PARSE_READ_SIZE,
+                members=members):
+            for feature in batch:
+                features.append(feature)
+                vertices += _feature_positions(feature)
+                self._check_feature(len(features), vertices)
+        if 'features' in members:
+            members['features'] = features
+        return members
@@ -0,0 +1,6 @@
+"""ASGI deployment of the emissions API."""
+
+from .app import create_asgi_app
+from .compute_pool import ComputePool, ComputePoolSaturated
+
+__all__ = ['ComputePool', 'ComputePoolSaturated', 'create_asgi_app']
@@ -0,0 +1,48 @@
+"""Starlette application serving the emissions API over ASGI."""
+
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.routing import Mount, Route
+
+from .compute_pool import ComputePool
+from .emissions import EmissionsEndpoints, access_logged
+
+
+def create_asgi_app(flask_app, compute_pool=None):
+    """Wrap ``flask_app`` so the POST emissions endpoints run async.
+
+    POST /emissions and POST /emissions/upload are handled natively with
+    the workflow in ``compute_pool``. Every other route (GET by request
+    hash, the OpenAPI document and Swagger UI) is served by the Flask app,
+    so the published contract is unchanged.
+    """
+    compute_pool = compute_pool or ComputePool.from_env()
+    endpoints = EmissionsEndpoints(compute_pool)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        try:
+            yield
+        finally:
+            compute_pool.shutdown()
+
+    app = Starlette(
+        routes=[
+            Route(
+                '/emissions',
+                access_logged(endpoints.post_emissions),
+                methods=['POST'],
+            ),
+            Route(
+                '/emissions/upload',
+                access_logged(endpoints.post_emissions_upload),
+                methods=['POST'],
+            ),
+            Mount('/', app=WSGIMiddleware(flask_app)),
+        ],
+        lifespan=lifespan,
+    )
+    app.state.compute_pool = compute_pool
+    return app
@@ -0,0 +1,82 @@
+"""Bounded process pool for CPU-bound work under the ASGI app."""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+class ComputePoolSaturated(Exception):
+    """Raised when every worker is busy and the queue is full."""
+
+
+class ComputePool:
+    """Run callables in worker processes with backpressure.
+
+    At most ``max_workers`` jobs run at once and ``max_pending`` more may
+    wait; beyond that ``run`` raises ComputePoolSaturated immediately so the
+    caller can answer 503 instead of queueing without bound. Workers are
+    spawned rather than forked, since the event loop process runs threads.
+    The pool is meant to be used from a single event loop.
+    """
+
+    def __init__(self, max_workers=None, max_pending=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = (
+            2 * self.max_workers if max_pending is None else max_pending
+        )
+        self._executor = None
+        self._in_flight = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_workers=int(os.getenv('JUG_LCA_COMPUTE_WORKERS', '0') or 0)
+            or None,
+            max_pending=(
+                int(os.environ['JUG_LCA_COMPUTE_QUEUE'])
+                if os.getenv('JUG_LCA_COMPUTE_QUEUE') else None
+            ),
+        )
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def _build_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = self._build_executor()
+        return self._executor
+
+    async def run(self, fn, *args):
+        if self._in_flight >= self.max_workers + self.max_pending:
+            raise ComputePoolSaturated(
+                f'{self._in_flight} jobs in flight '
+                f'(max_workers={self.max_workers}, '
+                f'max_pending={self.max_pending})'
+            )
+        self._in_flight += 1
+        try:
+            return await asyncio.wrap_future(
+                self._get_executor().submit(fn, *args)
+            )
+        except BrokenProcessPool:
+            # A crashed worker poisons the executor; start a fresh one.
+            self._executor = None
+            raise
+        finally:
+            self._in_flight -= 1
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
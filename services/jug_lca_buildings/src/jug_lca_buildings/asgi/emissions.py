@@ -0,0 +1,370 @@
+"""Async handlers for the POST emissions endpoints.
+
+They mirror ``resources.emissions`` response for response: request bodies
+are read without blocking the event loop, cache I/O runs in threads and
+the LCA workflow runs in a ComputePool worker process.
+"""
+
+import asyncio
+import io
+import json
+import logging
+import os
+import secrets
+from http import HTTPStatus
+from time import perf_counter
+
+from marshmallow import ValidationError
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from werkzeug.http import parse_accept_header
+
+from jugs_chassis.logging.context import get_request_id, set_request_id
+
+from ..application import (
+    EmissionsApplicationService,
+    UploadLimitExceeded,
+    UploadLimits,
+)
+from ..schemas.schemas import LCAInputDataSchema
+from .compute_pool import ComputePoolSaturated
+
+logger = logging.getLogger(__name__)
+DEV_MODE = os.getenv('LOG_ENV', 'dev') == 'dev'
+RETRY_AFTER_SECONDS = 5
+
+
+class ApiError(Exception):
+    """Error rendered in the flask-smorest error envelope."""
+
+    def __init__(self, status, message=None, errors=None, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.errors = errors
+        self.headers = headers
+
+    def to_response(self):
+        body = {'code': self.status, 'status': HTTPStatus(self.status).phrase}
+        if self.message is not None:
+            body['message'] = self.message
+        if self.errors is not None:
+            body['errors'] = self.errors
+        return JSONResponse(body, status_code=self.status, headers=self.headers)
+
+
+def _limit_error(error):
+    logger.warning(
+        'emissions_request_too_large',
+        extra={'limit': error.limit, 'maximum': error.maximum},
+    )
+    return ApiError(
+        error.status,
+        message=str(error),
+        errors=error.errors,
+        headers=error.headers,
+    )
+
+
+def _limited_request(request, limits):
+    """The request, with its body cut off once it crosses max_bytes."""
+    try:
+        limits.check_bytes(int(request.headers['content-length']))
+    except (KeyError, ValueError):
+        pass
+    except UploadLimitExceeded as e:
+        raise _limit_error(e) from None
+    if not limits.max_bytes:
+        return request
+    received = 0
+
+    async def receive():
+        nonlocal received
+        message = await request.receive()
+        if message['type'] == 'http.request':
+            received += len(message.get('body', b''))
+            try:
+                limits.check_bytes(received)
+            except UploadLimitExceeded as e:
+                raise _limit_error(e) from None
+        return message
+
+    return Request(request.scope, receive)
+
+
+def _read_geojson_file(limits, geojson_file):
+    geojson_file.file.seek(0)
+    text_file = io.TextIOWrapper(geojson_file.file, encoding='utf-8-sig')
+    try:
+        return limits.read_geojson(text_file)
+    finally:
+        # Leave closing the spooled file to the form.
+        text_file.detach()
+
+
+def _load_json_body(limits, body):
+    if not (limits.max_features or limits.max_vertices):
+        return json.loads(body)
+    # Scanned feature by feature, so count limits fail early.
+    return limits.read_geojson(
+        io.TextIOWrapper(io.BytesIO(body), encoding='utf-8-sig'))
+
+
+def _accepts_encoding(request):
+    accepted = parse_accept_header(request.headers.get('accept-encoding'))
+    return lambda encoding: accepted[encoding] > 0
+
+
+def _tag_headers(request_hash):
+    return {
+        # Weak, as the encodings of a result share it.
+        'ETag': f'W/"{request_hash}"',
+        'X-Request-Hash': request_hash,
+        'Vary': 'Accept-Encoding',
+    }
+
+
+def _validate_request_city(payload, location):
+    try:
+        return LCAInputDataSchema().load(payload)
+    except ValidationError as err:
+        if location == 'json':
+            raise ApiError(422, errors={'json': err.messages}) from None
+        raise ApiError(
+            422,
+            message='Invalid GeoJSON payload',
+            errors=err.messages,
+        ) from None
+
+
+class EmissionsEndpoints:
+    """POST /emissions and POST /emissions/upload bound to a ComputePool."""
+
+    def __init__(self, compute_pool):
+        self.compute_pool = compute_pool
+        self._computations = {}
+
+    async def post_emissions(self, request):
+        limits = UploadLimits.from_env()
+        body = await _limited_request(request, limits).body()
+        content_type = request.headers.get('content-type', '')
+        payload = {}
+        if body and 'json' in content_type:
+            try:
+                # Bodies of several MB would block the event loop.
+                payload = await run_in_threadpool(
+                    _load_json_body, limits, body)
+            except UploadLimitExceeded as e:
+                raise _limit_error(e) from None
+            except ValueError:
+                raise ApiError(
+                    400, errors={'json': ['Invalid JSON body.']}) from None
+        request_city = await run_in_threadpool(
+            _validate_request_city, payload, 'json')
+        return await self._run_emissions_workflow(
+            request,
+            request_city,
+            request_received_log='emissions_request_received',
+            request_failed_log='emissions_request_failed',
+        )
+
+    async def post_emissions_upload(self, request):
+        limits = UploadLimits.from_env()
+        form = await _limited_request(request, limits).form()
+        geojson_file = form.get('geojson_file')
+        if geojson_file is None:
+            raise ApiError(422, errors={
+                'files': {
+                    'geojson_file': ['Missing data for required field.'],
+                },
+            })
+        if isinstance(geojson_file, str) or not geojson_file.filename:
+            raise ApiError(400, message='geojson_file is required')
+
+        # Parsed feature by feature, so count limits fail early.
+        try:
+            request_city = await run_in_threadpool(
+                _read_geojson_file, limits, geojson_file)
+        except UploadLimitExceeded as e:
+            raise _limit_error(e) from None
+        except ValueError:
+            raise ApiError(
+                400, message='Invalid JSON content in geojson_file') from None
+        request_city = await run_in_threadpool(
+            _validate_request_city, request_city, 'files')
+        return await self._run_emissions_workflow(
+            request,
+            request_city,
+            request_received_log='emissions_upload_request_received',
+            request_failed_log='emissions_upload_request_failed',
+        )
+
+    async def _compute_and_save(self, request_hash, request_city):
+        emissions_data = await self.compute_pool.run(
+            EmissionsApplicationService.run_workflow,
+            request_city,
+            request_hash,
+        )
+        return await run_in_threadpool(
+            EmissionsApplicationService.save_emissions,
+            request_hash,
+            request_city,
+            emissions_data,
+        )
+
+    async def _compute_emissions(self, request_city):
+        request_hash, cached_result = await run_in_threadpool(
+            EmissionsApplicationService.lookup_emissions,
+            request_city,
+        )
+        if cached_result is not None:
+            return cached_result
+        # Identical requests arriving together share one computation.
+        computation = self._computations.get(request_hash)
+        if computation is None:
+            computation = asyncio.ensure_future(
+                self._compute_and_save(request_hash, request_city))
+            self._computations[request_hash] = computation
+            computation.add_done_callback(
+                lambda _: self._computations.pop(request_hash, None))
+        return await asyncio.shield(computation)
+
+    async def _run_emissions_workflow(
+        self,
+        request,
+        request_city,
+        request_received_log,
+        request_failed_log,
+    ):
+        export_format = (
+            request.query_params.get('export') or '').strip().lower()
+        if export_format and export_format != 'csv':
+            raise ApiError(
+                400,
+                message='Unsupported export format. Supported values: csv',
+            )
+
+        logger.info(request_received_log)
+        try:
+            computation_result = await self._compute_emissions(request_city)
+            request_hash = computation_result.request_hash
+            logger.info(
+                'emissions_request_succeeded',
+                extra={
+                    'buildings': len(computation_result.emissions_data),
+                    'cache_hit': computation_result.cache_hit,
+                    'request_hash': request_hash[:12],
+                },
+            )
+            accepts_encoding = _accepts_encoding(request)
+            headers = _tag_headers(request_hash)
+            if export_format == 'csv':
+                csv_export = await run_in_threadpool(
+                    EmissionsApplicationService.build_csv_report,
+                    request_city,
+                    computation_result,
+                )
+                logger.info(
+                    'emissions_report_export_succeeded',
+                    extra={
+                        'format': 'csv',
+                        'buildings': len(computation_result.emissions_data),
+                        'csv_cache_hit': csv_export['cache_hit'],
+                        'request_hash': request_hash[:12],
+                    },
+                )
+                csv_body, content_encoding = await run_in_threadpool(
+                    EmissionsApplicationService.load_encoded_artifact,
+                    request_hash,
+                    'csv',
+                    accepts_encoding,
+                ) or (csv_export['csv_text'], None)
+                headers['Content-Disposition'] = (
+                    f'attachment; filename={csv_export["filename"]}'
+                )
+                if content_encoding:
+                    headers['Content-Encoding'] = content_encoding
+                return Response(
+                    csv_body,
+                    status_code=200,
+                    media_type='text/csv',
+                    headers=headers,
+                )
+
+            encoded = await run_in_threadpool(
+                EmissionsApplicationService.load_encoded_artifact,
+                request_hash,
+                'emissions',
+                accepts_encoding,
+            )
+            if encoded is None:
+                return JSONResponse(
+                    computation_result.emissions_data,
+                    status_code=201,
+                    headers=headers,
+                )
+            body, content_encoding = encoded
+            if content_encoding:
+                headers['Content-Encoding'] = content_encoding
+            return Response(
+                body,
+                status_code=201,
+                media_type='application/json',
+                headers=headers,
+            )
+
+        except ComputePoolSaturated as e:
+            logger.warning(
+                'emissions_compute_pool_saturated',
+                extra={'error': str(e)},
+            )
+            raise ApiError(
+                503,
+                message='Emissions computation queue is full; retry later',
+                headers={'Retry-After': str(RETRY_AFTER_SECONDS)},
+            ) from None
+
+        except Exception as e:
+            logger.exception(request_failed_log)
+            raise ApiError(
+                500,
+                message=str(e) if DEV_MODE else 'Failed to compute emissions',
+            ) from None
+
+
+def access_logged(endpoint):
+    """Give native routes the request-id and access logging of app.py."""
+
+    async def handler(request):
+        rid = (request.headers.get('X-Request-ID')
+               or request.headers.get('X-Correlation-ID')
+               or secrets.token_hex(8))
+        set_request_id(rid)
+        t0 = perf_counter()
+        try:
+            response = await endpoint(request)
+        except ApiError as e:
+            response = e.to_response()
+        except Exception:
+            logger.exception('unhandled_exception')
+            response = JSONResponse(
+                {'message': 'Internal Server Error'}, status_code=500)
+        client_ip = request.headers.get(
+            'X-Forwarded-For',
+            request.client.host if request.client else None,
+        )
+        logger.info(
+            'http_request',
+            extra={
+                'method': request.method,
+                'path': request.url.path,
+                'status': response.status_code,
+                'latency_ms': int((perf_counter() - t0) * 1000),
+                'client_ip': client_ip,
+            },
+        )
+        response.headers['X-Request-ID'] = get_request_id()
+        return response
+
+    return handler
@@ -2,7 +2,8 @@
 JUGS project
 jug_lca_buildings package
 lca_carbon_workflow module
-Currently calculates Embodied and End-of-Life
+Currently calculates Embodied, End-of-Life and the transport and
+equipment stages (A4, A5 and C2)
 Returns the summarize of envelope and energy systems
 SPDX - License - Identifier: LGPL - 3.0 - or -later
 Copyright © 2024 Concordia CERC group
@@ -13,6 +14,7 @@ www.demianadli.com
 """
 import logging
 import os
+from itertools import islice
 from pathlib import Path
 from time import perf_counter
 
@@ -24,7 +26,9 @@ from .life_cycle_assessment.input_geojson_content import InputGeoJsonContent
 from .life_cycle_assessment.access_nrcan_catalogue import AccessNrcanCatalog
 from .life_cycle_assessment.opening_emission import OpeningEmission
 from .life_cycle_assessment.envelope_emission import EnvelopeEmission
-from .life_cycle_assessment.lca_end_of_life_carbon import EndOfLifeEmission
+from .life_cycle_assessment.fleet_emission import FleetEmission, \
+  configured_fleet_catalog
+from .storage.city_model_cache import CityModelCache
 
 
 logger = logging.getLogger(__name__)
@@ -38,6 +42,20 @@ def _env_int(name, default, minimum=1):
   return max(minimum, value)
 
 
+# Per-building results kept in a checkpoint, in the order they are restored.
+_CHECKPOINT_ATTRIBUTES = (
+  'building_envelope_emission',
+  'building_opening_emission',
+  'building_component_emission',
+  'building_envelope_end_of_life_emission',
+  'building_opening_end_of_life_emission',
+  'building_component_end_of_life_emission',
+  'building_material_workload')
+
+_city_model_cache = CityModelCache(
+  _env_int('LCA_CITY_CACHE_MAX_BYTES', 256 * 1024 * 1024, minimum=0))
+
+
 class LCACarbonWorkflow:
   def __init__(
           self,
@@ -45,7 +63,11 @@ class LCACarbonWorkflow:
           archetypes_catalog_file_name,
           constructions_catalog_file,
           catalog='nrcan',
-          building_parameters=('height', 'year_of_construction', 'function')):
+          building_parameters=('height', 'year_of_construction', 'function'),
+          city_cache=None,
+          end_of_life_machines=None,
+          fleet_catalog_file=None,
+          checkpoint=None):
     """
       LCACarbonWorkflow takes a number of buildings and enrich the city object
       using cerc-hub GeometryFactory and ConstructionFactory. Then it
@@ -59,6 +81,10 @@ class LCACarbonWorkflow:
         building_envelope_end_of_life_emission: float
         building_opening_end_of_life_emission:  float
         building_component_end_of_life_emission: float
+        building_material_workload: float
+        building_stage_emissions: dictionary of stage name (e.g.
+        'transport_to_site') to a list of floats, empty without a fleet
+        catalog
 
       The above attributes will be computed when the calculate_emission()
       method of a LCACarbonWorkflow object is called.
@@ -73,6 +99,21 @@ class LCACarbonWorkflow:
        argument)
       :param building_parameters: Parameters used for using the catalog (in
       this case three default arguments)
+      :param city_cache: CityModelCache holding enriched city snapshots
+      (defaults to the process-wide cache sized by LCA_CITY_CACHE_MAX_BYTES)
+      :param end_of_life_machines: Optional dictionary of Machine objects
+      keyed by end of life process ('demolition', 'onsite_recycling',
+      'companies_recycling', 'landfilling') replacing the default machine
+      emissions
+      :param fleet_catalog_file: Path to the machine and vehicle fleets
+      (JSON) of the transport and equipment stages, relative to the data
+      folder unless absolute (defaults to LCA_FLEET_CATALOG). Without a
+      fleet catalog the stages are not calculated; the package only ships
+      data/fleet_catalog.example.json, whose rates are placeholders.
+      :param checkpoint: Optional EmissionsCheckpoint. The results of the
+      calculated buildings are committed to it every LCA_PROGRESS_LOG_EVERY
+      buildings, and a calculation restarted with the same checkpoint
+      continues after the committed buildings.
     """
     city_input = InputGeoJsonContent(city_path)
     city_candidate = city_input.content
@@ -106,17 +147,79 @@ class LCACarbonWorkflow:
       self.catalogs_path,
       archetypes=self.archetypes_catalog_file_name,
       constructions=self.constructions_catalog_file)
+    if end_of_life_machines:
+      self.nrcan_catalogs.set_end_of_life_machines(**end_of_life_machines)
+    fleet_catalog_path = configured_fleet_catalog(
+      self.catalogs_path, fleet_catalog_file)
+    self.fleet_emission = None if fleet_catalog_path is None else \
+        FleetEmission.from_catalog(fleet_catalog_path)
     self.out_path = (Path(__file__).parent / 'out_files')
     self.handler = catalog
     self.height, self.year_of_construction, self.function = \
         building_parameters
     self.progress_log_every = _env_int('LCA_PROGRESS_LOG_EVERY', 100)
+    self.checkpoint = checkpoint
+
+    self.city_cache = _city_model_cache if city_cache is None else city_cache
 
     logger.info('Calculation started...')
 
+    self.city = self._load_city(building_parameters)
+
+    logger.info(f'There are {len(self.city.buildings)} buildings in the city.')
+    logger.debug('City was enriched with construction data.')
+
+    self.building_envelope_emission = []
+    self.building_opening_emission = []
+    self.building_component_emission = []
+    self.building_envelope_end_of_life_emission = []
+    self.building_opening_end_of_life_emission = []
+    self.building_component_end_of_life_emission = []
+    self.building_material_workload = []
+    self.building_stage_emissions = {}
+    self.archetype_codes = {}
+
+  def _load_city(self, building_parameters):
+    """
+      Returns the enriched city from the city model cache when the same
+      input was already parsed and enriched with the same construction
+      catalog; otherwise builds it and stores a snapshot in the cache.
+      :param building_parameters: tuple
+      :return: hub.city_model_structure.city.City
+    """
+    city_key = None
+    if self.city_cache.enabled:
+      try:
+        city_key = self.city_cache.build_key(
+          self.file_path, self.handler, building_parameters)
+      except OSError:
+        logger.debug('City model cache key could not be built.')
+      else:
+        cached_city = self.city_cache.get(city_key)
+        if cached_city is not None:
+          logger.info('City model cache hit; geometry parsing skipped.')
+          return cached_city
+
+    city = self._build_city()
+    if city_key is not None:
+      store_t0 = perf_counter()
+      if self.city_cache.put(city_key, city):
+        logger.info(
+          f'City model snapshot cached in {perf_counter() - store_t0:.3f}s '
+          f'({self.city_cache.size_bytes} bytes in cache)')
+      else:
+        logger.info('City model snapshot exceeds the cache size limit.')
+    return city
+
+  def _build_city(self):
+    """
+      Parses the input GeoJSON with GeometryFactory and enriches the
+      resulting city with ConstructionFactory.
+      :return: hub.city_model_structure.city.City
+    """
     try:
       city_t0 = perf_counter()
-      self.city = GeometryFactory(
+      city = GeometryFactory(
                 'geojson',
                 path=self.file_path,
                 height_field=self.height,
@@ -136,19 +239,10 @@ class LCACarbonWorkflow:
             ) from e
 
     enrich_t0 = perf_counter()
-    ConstructionFactory(self.handler, self.city).enrich()
+    ConstructionFactory(self.handler, city).enrich()
     logger.info(
       f'Construction enrichment took {perf_counter() - enrich_t0:.3f}s')
-
-    logger.info(f'There are {len(self.city.buildings)} buildings in the city.')
-    logger.debug('City was enriched with construction data.')
-
-    self.building_envelope_emission = []
-    self.building_opening_emission = []
-    self.building_component_emission = []
-    self.building_envelope_end_of_life_emission = []
-    self.building_opening_end_of_life_emission = []
-    self.building_component_end_of_life_emission = []
+    return city
 
   def calculate_building_component_emission(self, building):
     """
@@ -164,8 +258,11 @@ class LCACarbonWorkflow:
       envelope of the building. It is being carried out by utilizing to
       hidden methods of the current class (methods contain description.)
       At the end, a tuple will be returned, containing the emissions
-      attributes. The tuple will be unpacked in the calculate_emission()
-      method. The attributes and their types are explained in the constructor.
+      attributes and the material workload (the mass (kg) of the envelope
+      layers and openings, which the machines and vehicles of the transport
+      and equipment stages handle). The tuple will be unpacked in the
+      calculate_emission() method. The attributes and their types are
+      explained in the constructor.
       The building parameter comes from the calculate_emission() method
       which iterates through the city object buildings.
       :param building: hub.city_model_structure.building.Building
@@ -175,11 +272,8 @@ class LCACarbonWorkflow:
     surface_opening_emission = []
     surface_envelope_end_of_life_emission = []
     surface_opening_end_of_life_emission = []
-    opaque_surface_code = self.nrcan_catalogs.find_opaque_surface(
-      self.nrcan_catalogs.hub_to_nrcan_function(building.function),
-      self.nrcan_catalogs.year_to_period_of_construction(
-        building.year_of_construction),
-      '6')
+    opaque_surface_code = self._archetype_code(building)
+    building_material_workload = 0.0
 
     for surface in building.surfaces:
       boundary_envelope_emission = []
@@ -190,15 +284,17 @@ class LCACarbonWorkflow:
       for boundary in surface.associated_thermal_boundaries:
         opening_emission = None
         opening_end_of_life_emission = None
-        layer_emission, layer_end_of_life_emission = \
+        layer_emission, layer_end_of_life_emission, layer_workload = \
             self._calculate_envelope_emission(boundary)
+        building_material_workload += layer_workload
         boundary_envelope_emission += layer_emission
         boundary_envelope_end_of_life_emission += layer_end_of_life_emission
 
         if boundary.window_ratio:
-          opening_emission, opening_end_of_life_emission = \
-            self._calculate_opening_emission(
-              building, surface, boundary, opaque_surface_code)
+          opening_emission, opening_end_of_life_emission, \
+              opening_workload = self._calculate_opening_emission(
+                building, surface, boundary, opaque_surface_code)
+          building_material_workload += opening_workload
         if opening_emission:
           boundary_opening_emission += opening_emission
           boundary_opening_end_of_life_emission += opening_end_of_life_emission
@@ -209,17 +305,62 @@ class LCACarbonWorkflow:
       surface_envelope_emission += boundary_envelope_emission
       surface_envelope_end_of_life_emission += \
           boundary_envelope_end_of_life_emission
-    building_envelope_emission = sum(surface_envelope_emission)
-    building_envelope_workload = sum(surface_envelope_end_of_life_emission)
-    building_opening_emission = sum(surface_opening_emission)
-    building_opening_workload = sum(surface_opening_end_of_life_emission)
+    # Float sums, so buildings without openings report 0.0 rather than 0.
+    building_envelope_emission = sum(surface_envelope_emission, 0.0)
+    building_envelope_workload = sum(
+      surface_envelope_end_of_life_emission, 0.0)
+    building_opening_emission = sum(surface_opening_emission, 0.0)
+    building_opening_workload = sum(
+      surface_opening_end_of_life_emission, 0.0)
     building_component_emission = \
         building_envelope_emission + building_opening_emission
     building_component_workload = \
         building_envelope_workload + building_opening_workload
     return building_envelope_emission, building_opening_emission, \
         building_component_emission, building_envelope_workload, \
-        building_opening_workload, building_component_workload
+        building_opening_workload, building_component_workload, \
+        building_material_workload
+
+  def _resolve_archetype_code(self, function, year_of_construction):
+    """
+      Finds the opaque surface code of the NRCan archetype of a hub
+      function and year of construction (climate zone 6).
+      :param function: str
+      :param year_of_construction: int
+      :return: str
+    """
+    return self.nrcan_catalogs.find_opaque_surface(
+      self.nrcan_catalogs.hub_to_nrcan_function(function),
+      self.nrcan_catalogs.year_to_period_of_construction(
+        year_of_construction),
+      '6')
+
+  def _archetype_code(self, building):
+    key = (building.function, building.year_of_construction)
+    code = self.archetype_codes.get(key)
+    if code is None:
+      code = self.archetype_codes[key] = self._resolve_archetype_code(*key)
+    return code
+
+  def resolve_archetypes(self, buildings):
+    """
+      Groups the buildings by their distinct (function, year of
+      construction) pairs and resolves the archetype's opaque surface code
+      of each pair once, storing them in archetype_codes for the
+      calculation loop. A city usually has only a few dozen such pairs.
+      :param buildings: list of hub.city_model_structure.building.Building
+      :return: number of distinct archetype keys
+    """
+    resolve_t0 = perf_counter()
+    keys = {
+      (building.function, building.year_of_construction)
+      for building in buildings}
+    for key in keys - self.archetype_codes.keys():
+      self.archetype_codes[key] = self._resolve_archetype_code(*key)
+    logger.info(
+      f'Resolved {len(keys)} distinct archetypes for {len(buildings)} '
+      f'buildings in {perf_counter() - resolve_t0:.3f}s')
+    return len(keys)
 
   def _calculate_envelope_emission(self, boundary):
     """
@@ -229,14 +370,18 @@ class LCACarbonWorkflow:
       calculate_building_component_emission() method. The output also is used
       in the calculate_building_component_emission() method. So the current
       method is hidden to the user.
-      The method utilizes the EnvelopeEmission and EndOfLifeEmission classes of
-      (currently named) life_cycle_assessment series of class.
+      The method utilizes the EnvelopeEmission class of (currently named)
+      life_cycle_assessment series of class and the end of life coefficients
+      the NRCan catalog precomputes per material (coefficient * workload
+      equals the EndOfLifeEmission result). The layers' workload is also
+      returned, for the transport and equipment stages.
       :param boundary:
       hub.city_model_structure.building_demand.thermal_boundary.ThermalBoundary
       :return: tuple
     """
     layer_emission = []
     layer_end_of_life_emission = []
+    workload = 0.0
     for layer in boundary.layers:
       if not layer.no_mass:
         layer_material = \
@@ -247,17 +392,26 @@ class LCACarbonWorkflow:
           boundary.opaque_area,
           layer.density).calculate_envelope_emission())
 
-        boundary_workload = \
-            boundary.opaque_area * \
-            layer.thickness * \
-            layer.density
-        layer_end_of_life_emission.append(EndOfLifeEmission(
-          layer_material['recycling_ratio'],
-          layer_material['onsite_recycling_ratio'],
-          layer_material['company_recycling_ratio'],
-          layer_material['landfilling_ratio'],
-          boundary_workload).calculate_end_of_life_emission())
-    return layer_emission, layer_end_of_life_emission
+        layer_workload = self._layer_workload(boundary, layer)
+        workload += layer_workload
+        layer_end_of_life_emission.append(
+          self.nrcan_catalogs.material_end_of_life_coefficient(
+            layer.material_name) * layer_workload)
+    return layer_emission, layer_end_of_life_emission, workload
+
+  @staticmethod
+  def _layer_workload(boundary, layer):
+    """
+      Mass (kg) of a boundary's layer.
+    """
+    return boundary.opaque_area * layer.thickness * layer.density
+
+  @staticmethod
+  def _opening_workload(boundary, opening, density=2579):
+    """
+      Mass (kg) of an opening, assuming the window is as thick as the wall.
+    """
+    return opening.area * boundary.thickness * density
 
   def _calculate_opening_emission(
           self,
@@ -274,8 +428,10 @@ class LCACarbonWorkflow:
       Window's thickness assumed the same as wall's thickness
       These two values are being used to calculate window's workload for
       the End of Life emission evaluation.
-      The method utilizes the OpeningEmission and EndOfLifeEmission classes of
-      (currently named) life_cycle_assessment series of class.
+      The method utilizes the OpeningEmission class of (currently named)
+      life_cycle_assessment series of class and the end of life coefficients
+      the NRCan catalog precomputes per transparent surface. The openings'
+      workload is also returned, for the transport and equipment stages.
       :param building: hub.city_model_structure.building.Building
       :param surface:
       hub.city_model_structure.building_demand.surface.Surface
@@ -287,6 +443,7 @@ class LCACarbonWorkflow:
     """
     opening_emission = []
     opening_end_of_life_emission = []
+    workload = 0.0
     for opening in boundary.thermal_openings:
       transparent_surface_type = 'Window'
       if building.year_of_construction >= 2020 and \
@@ -298,27 +455,34 @@ class LCACarbonWorkflow:
         OpeningEmission(opening_material['embodied_carbon'],
                         opening.area).calculate_opening_emission())
 
-      window_workload = opening.area * boundary.thickness * density
-      opening_end_of_life_emission.append(EndOfLifeEmission(
-          opening_material['recycling_ratio'],
-          opening_material['onsite_recycling_ratio'],
-          opening_material['company_recycling_ratio'],
-          opening_material['landfilling_ratio'],
-          window_workload).calculate_end_of_life_emission())
-    return opening_emission, opening_end_of_life_emission
+      opening_workload = self._opening_workload(boundary, opening, density)
+      workload += opening_workload
+      opening_end_of_life_emission.append(
+        self.nrcan_catalogs.transparent_surface_end_of_life_coefficient(
+          transparent_surface_type, opaque_surface_code) * opening_workload)
+    return opening_emission, opening_end_of_life_emission, workload
 
   def calculate_emission(self):
     """
       It iterates through the city object and gives each building to the
       calculate_building_component_emission() method. Then it unpack
-      the results of the mentioned method to the (currently six) attributes
+      the results of the mentioned method to the (currently seven) attributes
       which hold the final results. These attributes are mentioned in the
       constructor method description.
+      The material workload of each building is collected on the way and,
+      with a fleet catalog, the transport and equipment stages of all
+      buildings are calculated at the end, in one pass.
+      With a checkpoint, the buildings it holds are restored instead of
+      calculated, and new results are committed at each progress step.
     """
-    building_count = 1
     total_buildings = len(self.city.buildings)
     calc_t0 = perf_counter()
-    for building in self.city.buildings:
+    restored = self._restore_checkpoint(total_buildings)
+    distinct_archetypes = self.resolve_archetypes(
+      self.city.buildings[restored:])
+    building_count = restored + 1
+    pending = []
+    for building in islice(self.city.buildings, restored, None):
       if (
           building_count == 1
           or building_count == total_buildings
@@ -330,7 +494,7 @@ class LCACarbonWorkflow:
       envelope_emission, opening_emission, component_emission, \
           envelope_end_of_life_emission, \
           opening_end_of_life_emission, \
-          component_end_of_life_emission = \
+          component_end_of_life_emission, material_workload = \
           self.calculate_building_component_emission(building)
       self.building_envelope_emission.append(envelope_emission)
       self.building_opening_emission.append(opening_emission)
@@ -341,7 +505,21 @@ class LCACarbonWorkflow:
         opening_end_of_life_emission)
       self.building_component_end_of_life_emission.append(
         component_end_of_life_emission)
+      self.building_material_workload.append(material_workload)
+      if self.checkpoint is not None:
+        pending.append({
+          attribute: getattr(self, attribute)[-1]
+          for attribute in _CHECKPOINT_ATTRIBUTES})
+        if (building_count == total_buildings
+                or building_count % self.progress_log_every == 0):
+          self.checkpoint.commit(pending, building_count)
+          pending = []
       building_count += 1
+    if self.fleet_emission is not None:
+      self.building_stage_emissions = {
+        stage: emissions.tolist() for stage, emissions in
+        self.fleet_emission.calculate_emissions(
+          self.building_material_workload).items()}
     elapsed_s = perf_counter() - calc_t0
     if total_buildings:
       logger.info(
@@ -349,9 +527,31 @@ class LCACarbonWorkflow:
         f'{total_buildings} buildings in {elapsed_s:.3f}s '
         f'({(elapsed_s / total_buildings) * 1000:.2f} ms/building, '
         f'{(total_buildings / elapsed_s) if elapsed_s else 0:.2f} '
-        'buildings/s)')
+        f'buildings/s, {distinct_archetypes} distinct archetypes)')
     else:
       logger.info('Building emissions calculation completed: 0 buildings')
+    if self.checkpoint is not None:
+      self.checkpoint.close()
+
+  def _restore_checkpoint(self, total_buildings):
+    """
+      Opens the checkpoint, if any, and appends the results it holds to
+      the result attributes.
+      :param total_buildings: int
+      :return: number of restored buildings
+    """
+    if self.checkpoint is None:
+      return 0
+    restored = self.checkpoint.open(
+      fingerprint=f'buildings={total_buildings}')
+    for row in self.checkpoint.iter_rows():
+      for attribute in _CHECKPOINT_ATTRIBUTES:
+        getattr(self, attribute).append(row[attribute])
+    if restored:
+      logger.info(
+        f'Resumed from checkpoint: {restored}/{total_buildings} buildings '
+        'already calculated')
+    return restored
       
   def export_emissions(self):
     """
@@ -386,6 +586,8 @@ class LCACarbonWorkflow:
             'envelope_end_of_life_emissions': emissions[4][i],
             'component_end_of_life_emissions': emissions[5][i]
         }
+        for stage, stage_emissions in self.building_stage_emissions.items():
+            feature_emissions[f'{stage}_emissions'] = stage_emissions[i]
         emissions_data.append(feature_emissions)
 
     logger.info(
@@ -0,0 +1,166 @@
+"""
+JUGS project
+jug_lca_buildings package
+lca_chunked_workflow module
+Runs LCACarbonWorkflow over a city in bounded batches of buildings
+Project developer: Alireza Adli alireza.adli4@gmail.com
+"""
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+from .lca_carbon_workflow import LCACarbonWorkflow, _env_int
+from .life_cycle_assessment.geojson_feature_stream import \
+  iter_feature_batches
+from .life_cycle_assessment.input_geojson_content import InputGeoJsonContent
+from .storage.city_model_cache import CityModelCache
+from .storage.columnar_emissions import iter_columnar_emissions
+from .storage.emissions_checkpoint import EmissionsCheckpoint
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = _env_int('LCA_CHUNK_SIZE', 5000, minimum=0)
+
+
+class ChunkedLCACarbonWorkflow:
+  def __init__(
+          self,
+          city_path,
+          archetypes_catalog_file_name,
+          constructions_catalog_file,
+          output_path=None,
+          chunk_size=None,
+          checkpoint=None,
+          **workflow_options):
+    """
+      ChunkedLCACarbonWorkflow computes the same emissions as
+      LCACarbonWorkflow for cities too large to be held in memory at once.
+      The input features are read in batches of chunk_size; each batch is
+      built and enriched as a sub-city, its emissions are calculated and
+      appended to a columnar file (see storage.columnar_emissions), and
+      the sub-city is released before the next batch is read. Buildings
+      are independent of each other in the calculation, so the rows of
+      the file, in order, equal the export_emissions() output of a single
+      LCACarbonWorkflow over the whole city.
+      :param city_path: Either a path to the buildings (GeoJson) file or
+      the content of such a file. A path is read incrementally.
+      :param archetypes_catalog_file_name: Path to the buildings'
+      archetypes (JSON).
+      :param constructions_catalog_file: Path to the construction materials
+      data.
+      :param output_path: Path of the columnar emissions file. A temporary
+      file, removed by export_emissions(), is used if neither it nor a
+      checkpoint is given.
+      :param chunk_size: Number of buildings per batch (defaults to
+      LCA_CHUNK_SIZE, 5000)
+      :param checkpoint: Optional EmissionsCheckpoint used as the output
+      file. Every chunk is committed to it, and a calculation restarted
+      with the same checkpoint and chunk size skips the committed chunks.
+      :param workflow_options: Other LCACarbonWorkflow keyword arguments
+    """
+    self.city_source = self._resolve_city_source(city_path)
+    self.archetypes_catalog_file_name = archetypes_catalog_file_name
+    self.constructions_catalog_file = constructions_catalog_file
+    self.chunk_size = chunk_size or DEFAULT_CHUNK_SIZE or 5000
+    self.workflow_options = dict(workflow_options)
+    # Sub-cities are never requested twice; caching them only costs memory.
+    self.workflow_options.setdefault('city_cache', CityModelCache(0))
+    self._resume = checkpoint is not None
+    self._owns_output = checkpoint is None and output_path is None
+    if checkpoint is None:
+      if output_path is None:
+        output_file, output_path = tempfile.mkstemp(suffix='.lcaem')
+        os.close(output_file)
+      checkpoint = EmissionsCheckpoint(output_path)
+    self.checkpoint = checkpoint
+    self.output_path = checkpoint.path
+    self.buildings = 0
+    self.chunks = 0
+
+  @staticmethod
+  def _resolve_city_source(city_path):
+    if isinstance(city_path, dict):
+      return city_path
+    if isinstance(city_path, str) and city_path.lstrip()[:1] in ('{', '['):
+      try:
+        return json.loads(city_path)
+      except json.JSONDecodeError:
+        pass
+    path = Path(city_path)
+    if not path.is_absolute() and not path.exists():
+      path = Path(__file__).parent / 'data' / path
+    if not path.exists():
+      raise FileNotFoundError(f'City input file not found: {path}')
+    return path
+
+  def _calculate_chunk(self, features):
+    chunk_input = InputGeoJsonContent(
+      {'type': 'FeatureCollection', 'features': features})
+    try:
+      return LCACarbonWorkflow(
+        chunk_input.content,
+        self.archetypes_catalog_file_name,
+        self.constructions_catalog_file,
+        **self.workflow_options).export_emissions()
+    finally:
+      os.unlink(chunk_input.content)
+
+  def calculate_emission(self):
+    """
+      Calculates every batch of buildings and writes the results to the
+      columnar output file.
+      :return: pathlib.Path of the output file
+    """
+    calc_t0 = perf_counter()
+    features_done = self.checkpoint.open(
+      fingerprint=f'chunk_size={self.chunk_size}', resume=self._resume)
+    if features_done:
+      logger.info(
+        f'Resumed from checkpoint: {features_done} features '
+        f'({self.checkpoint.rows} buildings) already calculated')
+    features_read = 0
+    self.chunks = 0
+    with self.checkpoint:
+      for features in iter_feature_batches(self.city_source, self.chunk_size):
+        features_read += len(features)
+        self.chunks += 1
+        if features_read <= features_done:
+          continue
+        chunk_t0 = perf_counter()
+        self.checkpoint.commit(self._calculate_chunk(features), features_read)
+        logger.info(
+          f'Chunk {self.chunks} ({len(features)} features) calculated in '
+          f'{perf_counter() - chunk_t0:.3f}s; '
+          f'{self.checkpoint.rows} buildings written so far')
+    self.buildings = self.checkpoint.rows
+    logger.info(
+      f'Chunked emissions calculation completed: {self.buildings} '
+      f'buildings in {self.chunks} chunks in '
+      f'{perf_counter() - calc_t0:.3f}s')
+    return self.output_path
+
+  def iter_emissions(self):
+    """
+      Yields the emissions of each building from the output file, in the
+      order of the input; only the committed rows once calculate_emission
+      has run.
+    """
+    if self.checkpoint.rows:
+      return self.checkpoint.iter_rows()
+    return iter_columnar_emissions(self.output_path)
+
+  def export_emissions(self):
+    """
+      Calculates the emissions and returns them as LCACarbonWorkflow's
+      export_emissions() does: a list of dictionaries, one per building.
+    """
+    self.calculate_emission()
+    try:
+      return list(self.iter_emissions())
+    finally:
+      if self._owns_output:
+        self.checkpoint.discard()
@@ -0,0 +1,3 @@
+# Bump whenever an emission formula or a default emission coefficient in
+# this package changes, so cached emissions results are recomputed.
+EMISSION_CODE_VERSION = '3'
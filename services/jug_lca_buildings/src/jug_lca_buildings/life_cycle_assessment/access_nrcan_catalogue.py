@@ -7,11 +7,34 @@ Project developer: Alireza Adli alireza.adli4@gmail.com
 """
 
 import json
+from bisect import bisect_left
 from pathlib import Path
 
 from hub.helpers.data.hub_function_to_nrcan_construction_function \
   import HubFunctionToNrcanConstructionFunction
 
+from .lca_end_of_life_carbon import (
+  COMPANIES_RECYCLING_MACHINE_EMISSION,
+  DEMOLITION_MACHINE_EMISSION,
+  LANDFILLING_MACHINE_EMISSION,
+  ONSITE_MACHINE_EMISSION,
+  end_of_life_coefficient)
+
+END_OF_LIFE_RATIOS = (
+  'recycling_ratio',
+  'onsite_recycling_ratio',
+  'company_recycling_ratio',
+  'landfilling_ratio')
+
+# NRCan periods of construction, sorted, with the last year of each.
+PERIODS_OF_CONSTRUCTION = (
+  '1000_1900', '1901_1910', '1911_1920', '1921_1930', '1931_1940',
+  '1941_1950', '1951_1960', '1961_1970', '1971_1980', '1981_1990',
+  '1991_2000', '2001_2010', '2011_2016', '2017_2019', '2020_3000')
+PERIOD_LAST_YEARS = tuple(
+  int(period.split('_')[1]) for period in PERIODS_OF_CONSTRUCTION)
+FIRST_YEAR_OF_CONSTRUCTION = 1000
+
 
 class AccessNrcanCatalog:
   def __init__(
@@ -25,6 +48,10 @@ class AccessNrcanCatalog:
       - It converts year of construction to the period of construction.
       - It searches a specific material or transparent surface.
       - The class finds the opaque surface code based on three parameters.
+      - It precomputes the end of life coefficient (emission per unit of
+      workload) of every material and transparent surface. The machine
+      emissions behind the coefficients can be replaced with Machine
+      objects through set_end_of_life_machines().
       :param path: path to the below files
       :param archetypes: a json file (a list of dictionaries) with building
       archetypes' data
@@ -36,6 +63,11 @@ class AccessNrcanCatalog:
       dictionaries) with windows and skylights data.
     """
     self._path = Path(path)
+    self._end_of_life_machine_emissions = {
+      'demolition': DEMOLITION_MACHINE_EMISSION,
+      'onsite_recycling': ONSITE_MACHINE_EMISSION,
+      'companies_recycling': COMPANIES_RECYCLING_MACHINE_EMISSION,
+      'landfilling': LANDFILLING_MACHINE_EMISSION}
     self.archetypes = archetypes
     self.constructions = constructions
     self.materials = materials
@@ -51,6 +83,13 @@ class AccessNrcanCatalog:
   def archetypes(self, archetypes):
     archetypes_path = (self._path / archetypes).resolve()
     self._archetypes = json.loads(archetypes_path.read_text())
+    self._opaque_surface_names = {}
+    for archetype in self._archetypes['archetypes']:
+      self._opaque_surface_names.setdefault(
+        (archetype['function'],
+         archetype['period_of_construction'],
+         archetype['climate_zone']),
+        archetype['constructions']['OutdoorsWall']['opaque_surface_name'])
 
   @property
   def constructions(self):
@@ -69,6 +108,8 @@ class AccessNrcanCatalog:
   def materials(self, materials):
     materials_path = (self._path / materials).resolve()
     self._materials = json.loads(materials_path.read_text())
+    self._material_end_of_life_coefficients = \
+        self._end_of_life_coefficients(self._materials)
 
   @property
   def transparent_surfaces(self):
@@ -79,6 +120,60 @@ class AccessNrcanCatalog:
     transparent_surfaces_path = (self._path / transparent_surfaces).resolve()
     self._transparent_surfaces = json.loads(
       transparent_surfaces_path.read_text())
+    self._transparent_surface_end_of_life_coefficients = \
+        self._end_of_life_coefficients(self._transparent_surfaces)
+
+  @property
+  def end_of_life_machine_emissions(self):
+    return dict(self._end_of_life_machine_emissions)
+
+  def set_end_of_life_machines(
+          self, demolition=None, onsite_recycling=None,
+          companies_recycling=None, landfilling=None):
+    """
+      Replaces the default machine emission of each given end of life
+      process with the total emission of a Machine object and recomputes
+      the end of life coefficients.
+      :param demolition: Machine
+      :param onsite_recycling: Machine
+      :param companies_recycling: Machine
+      :param landfilling: Machine
+    """
+    machines = {
+      'demolition': demolition,
+      'onsite_recycling': onsite_recycling,
+      'companies_recycling': companies_recycling,
+      'landfilling': landfilling}
+    for process, machine in machines.items():
+      if machine is not None:
+        self._end_of_life_machine_emissions[process] = \
+            machine.total_machine_emssion()
+    self._material_end_of_life_coefficients = \
+        self._end_of_life_coefficients(self._materials)
+    self._transparent_surface_end_of_life_coefficients = \
+        self._end_of_life_coefficients(self._transparent_surfaces)
+
+  def _end_of_life_coefficients(self, catalog_entries):
+    """
+      Maps each entry having recycling and landfilling ratios (no-mass
+      materials have none) to its end of life coefficient.
+      :param catalog_entries: dict
+      :return: dict
+    """
+    machine_emissions = self._end_of_life_machine_emissions
+    coefficients = {}
+    for name, entry in catalog_entries.items():
+      ratios = [entry.get(ratio) for ratio in END_OF_LIFE_RATIOS]
+      if None in ratios:
+        continue
+      coefficients[name] = end_of_life_coefficient(
+        *ratios,
+        demolition_machine_emission=machine_emissions['demolition'],
+        onsite_machine_emission=machine_emissions['onsite_recycling'],
+        companies_recycling_machine_emission=machine_emissions[
+          'companies_recycling'],
+        landfilling_machine_emission=machine_emissions['landfilling'])
+    return coefficients
 
   def hub_to_nrcan_function(self, hub_function):
     return self.hub_to_nrcan_dictionary[hub_function]
@@ -86,42 +181,16 @@ class AccessNrcanCatalog:
   @staticmethod
   def year_to_period_of_construction(year_of_construction):
     """
-      Converts year of construction to the period of construction.
+      Converts year of construction to the period of construction by
+      bisecting the sorted last years of the periods.
       :param year_of_construction: int
       :return: str
     """
-    period_of_construction = None
-    if 1000 <= year_of_construction <= 1900:
-      period_of_construction = '1000_1900'
-    elif 1901 <= year_of_construction <= 1910:
-      period_of_construction = '1901_1910'
-    elif 1911 <= year_of_construction <= 1920:
-      period_of_construction = '1911_1920'
-    elif 1921 <= year_of_construction <= 1930:
-      period_of_construction = '1921_1930'
-    elif 1931 <= year_of_construction <= 1940:
-      period_of_construction = '1931_1940'
-    elif 1941 <= year_of_construction <= 1950:
-      period_of_construction = '1941_1950'
-    elif 1951 <= year_of_construction <= 1960:
-      period_of_construction = '1951_1960'
-    elif 1961 <= year_of_construction <= 1970:
-      period_of_construction = '1961_1970'
-    elif 1971 <= year_of_construction <= 1980:
-      period_of_construction = '1971_1980'
-    elif 1981 <= year_of_construction <= 1990:
-      period_of_construction = '1981_1990'
-    elif 1991 <= year_of_construction <= 2000:
-      period_of_construction = '1991_2000'
-    elif 2001 <= year_of_construction <= 2010:
-      period_of_construction = '2001_2010'
-    elif 2011 <= year_of_construction <= 2016:
-      period_of_construction = '2011_2016'
-    elif 2017 <= year_of_construction <= 2019:
-      period_of_construction = '2017_2019'
-    elif 2020 <= year_of_construction <= 3000:
-      period_of_construction = '2020_3000'
-    return period_of_construction
+    if not FIRST_YEAR_OF_CONSTRUCTION <= year_of_construction <= \
+            PERIOD_LAST_YEARS[-1]:
+      return None
+    return PERIODS_OF_CONSTRUCTION[
+      bisect_left(PERIOD_LAST_YEARS, year_of_construction)]
 
   def layers(self, opaque_surface_code, component_type):
     """
@@ -147,6 +216,25 @@ class AccessNrcanCatalog:
     """
     return self.materials[f'{material_name}']
 
+  def material_end_of_life_coefficient(self, material_name):
+    """
+      End of life emission per unit of workload of a material
+      :param material_name: str
+      :return: float
+    """
+    return self._material_end_of_life_coefficients[f'{material_name}']
+
+  def transparent_surface_end_of_life_coefficient(
+          self, surface_type, opaque_surface_code):
+    """
+      End of life emission per unit of workload of a transparent surface
+      :param surface_type: str
+      :param opaque_surface_code: str
+      :return: float
+    """
+    return self._transparent_surface_end_of_life_coefficients[
+      f'{surface_type}_{opaque_surface_code}']
+
   def search_transparent_surfaces(
           self, surface_type, opaque_surface_code):
     """
@@ -168,13 +256,5 @@ class AccessNrcanCatalog:
       :param climate_zone: str
       :return: str
     """
-    for archetype in self.archetypes['archetypes']:
-      if archetype['function'] != function:
-        continue
-      elif archetype['period_of_construction'] != period_of_construction:
-        continue
-      elif archetype['climate_zone'] != climate_zone:
-        continue
-      else:
-        return \
-          archetype['constructions']['OutdoorsWall']['opaque_surface_name']
+    return self._opaque_surface_names.get(
+      (function, period_of_construction, climate_zone))
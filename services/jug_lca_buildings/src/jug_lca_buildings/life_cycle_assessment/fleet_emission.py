@@ -0,0 +1,133 @@
+"""
+JUGS project
+jug_lca_buildings package
+fleet_emission module
+Project developer: Alireza Adli alireza.adli4@gmail.com
+"""
+
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from .machine import Machine
+from .vehicle import Vehicle
+
+KILOGRAMS_PER_TONNE = 1000
+FLEET_CATALOG_ENV = 'LCA_FLEET_CATALOG'
+
+
+def configured_fleet_catalog(catalogs_path, catalog_file=None):
+  """
+    Returns the path of the fleet catalog given, or set in
+    LCA_FLEET_CATALOG, resolved against catalogs_path unless absolute.
+    :param catalogs_path: the package data folder
+    :param catalog_file: optional path overriding LCA_FLEET_CATALOG
+    :return: Path, or None without a fleet catalog
+  """
+  catalog_file = catalog_file or os.getenv(FLEET_CATALOG_ENV)
+  if not catalog_file:
+    return None
+  return Path(catalogs_path) / catalog_file
+
+
+class FleetEmission:
+  def __init__(self, machines, vehicles, stages):
+    """
+      FleetEmission calculates the transport and equipment emissions of
+      buildings (A4 transport to site, A5 construction and installation
+      and C2 end of life transport style stages) from fleets of machines
+      and vehicles.
+      - Each stage assigns a share of the material workload to machines
+      and, with a hauling distance, to vehicles.
+      - The fleets are reduced once to one emission factor per stage
+      (kgCO2e per tonne of material), so the emissions of any number of
+      buildings are computed in a single vectorized pass.
+      :param machines: a list of Machine objects
+      :param vehicles: a list of Vehicle objects
+      :param stages: a dictionary keyed by stage name, each value holding
+      'machines' ({machine_id, share}) and 'vehicles' ({vehicle_id, share,
+      distance_km}) lists
+    """
+    self.machines = {machine.id: machine for machine in machines}
+    self.vehicles = {vehicle.id: vehicle for vehicle in vehicles}
+    self.stages = tuple(stages)
+    self.stage_factors = self._calculate_stage_factors(stages)
+
+  @classmethod
+  def from_catalog(cls, catalog_path):
+    """
+      Returns the FleetEmission of a fleet catalog (JSON). The catalog is
+      read and its fleets reduced once per path and process.
+      :param catalog_path: path to the fleet catalog
+      :return: FleetEmission
+    """
+    return _load_fleet_catalog(str(Path(catalog_path).resolve()))
+
+  @classmethod
+  def from_dict(cls, catalog):
+    machines = [Machine(**machine) for machine in catalog.get('machines', [])]
+    vehicles = [Vehicle(**vehicle) for vehicle in catalog.get('vehicles', [])]
+    return cls(machines, vehicles, catalog['stages'])
+
+  def _calculate_stage_factors(self, stages):
+    """
+      Builds stage-by-machine and stage-by-vehicle matrices of shares
+      (tonne-kilometres per tonne for vehicles) and multiplies them by
+      the fleets' emissions. The result holds one kgCO2e per tonne factor
+      per stage, in the order of self.stages.
+      :param stages: dictionary
+      :return: numpy.ndarray
+    """
+    machine_ids = list(self.machines)
+    vehicle_ids = list(self.vehicles)
+    machine_index = {machine_id: i for i, machine_id in enumerate(machine_ids)}
+    vehicle_index = {vehicle_id: i for i, vehicle_id in enumerate(vehicle_ids)}
+    machine_shares = np.zeros((len(self.stages), len(machine_ids)))
+    vehicle_tonne_kilometres = np.zeros((len(self.stages), len(vehicle_ids)))
+    for row, stage in enumerate(self.stages):
+      for assignment in stages[stage].get('machines', []):
+        try:
+          column = machine_index[assignment['machine_id']]
+        except KeyError:
+          raise ValueError(
+            f'Stage {stage} uses unknown machine '
+            f'{assignment["machine_id"]}') from None
+        machine_shares[row, column] += assignment.get('share', 1.0)
+      for assignment in stages[stage].get('vehicles', []):
+        try:
+          column = vehicle_index[assignment['vehicle_id']]
+        except KeyError:
+          raise ValueError(
+            f'Stage {stage} uses unknown vehicle '
+            f'{assignment["vehicle_id"]}') from None
+        vehicle_tonne_kilometres[row, column] += \
+            assignment.get('share', 1.0) * assignment['distance_km']
+
+    machine_emissions = np.array(
+      [self.machines[machine_id].total_machine_emssion()
+       for machine_id in machine_ids], dtype=float)
+    vehicle_emissions = np.array(
+      [self.vehicles[vehicle_id].total_vehicle_emission()
+       for vehicle_id in vehicle_ids], dtype=float)
+    return machine_shares @ machine_emissions + \
+        vehicle_tonne_kilometres @ vehicle_emissions
+
+  def calculate_emissions(self, workloads):
+    """
+      Calculates the emission of every stage for every building.
+      :param workloads: a sequence of building material workloads (kg)
+      :return: a dictionary of stage name to a numpy array of emissions
+      (kgCO2e), one per building
+    """
+    tonnes = np.asarray(workloads, dtype=float) / KILOGRAMS_PER_TONNE
+    emissions = np.outer(self.stage_factors, tonnes)
+    return dict(zip(self.stages, emissions, strict=True))
+
+
+@lru_cache(maxsize=None)
+def _load_fleet_catalog(catalog_path):
+  catalog = json.loads(Path(catalog_path).read_text())
+  return FleetEmission.from_dict(catalog)
@@ -0,0 +1,203 @@
+"""
+JUGS project
+jug_lca_buildings package
+geojson_feature_stream module
+Reads the features of a GeoJSON FeatureCollection in bounded batches
+Project developer: Alireza Adli alireza.adli4@gmail.com
+"""
+import json
+import re
+
+READ_SIZE = 1024 * 1024
+_WHITESPACE = ' \t\n\r'
+_DECODER = json.JSONDecoder()
+# The characters that change the nesting of a JSON text, outside and
+# inside strings.
+_STRUCTURE = re.compile(r'["\[\]{}]')
+_STRING_STRUCTURE = re.compile(r'["\\]')
+
+
+class _JsonStream:
+  """
+    A growing window over a JSON text file. Decoded text is dropped from
+    the window, so memory is bounded by the largest single value read.
+  """
+  def __init__(self, json_file, read_size):
+    self._file = json_file
+    self._read_size = read_size
+    self._buffer = ''
+    self._position = 0
+    self._eof = False
+
+  def _fill(self, read_size=None):
+    chunk = self._file.read(read_size or self._read_size)
+    if not chunk:
+      self._eof = True
+      return False
+    self._buffer = self._buffer[self._position:] + chunk
+    self._position = 0
+    return True
+
+  def next_char(self):
+    """
+      Skips whitespace and returns the next character without consuming it
+      ('' at the end of the file).
+    """
+    while True:
+      while self._position < len(self._buffer):
+        if self._buffer[self._position] not in _WHITESPACE:
+          return self._buffer[self._position]
+        self._position += 1
+      if not self._fill():
+        return ''
+
+  def expect(self, characters):
+    char = self.next_char()
+    if not char or char not in characters:
+      raise ValueError(
+        f'Invalid GeoJSON: expected one of {characters!r}, found {char!r}')
+    self._position += 1
+    return char
+
+  def _container_end(self):
+    """
+      Returns the index just past the object, array or string starting at
+      the position, reading the file as needed. Each refill only scans the
+      new text, and doubles the read size, so a value spanning many
+      refills is scanned and copied a bounded number of times.
+    """
+    depth = 0
+    in_string = False
+    index = self._position
+    read_size = self._read_size
+    while True:
+      pattern = _STRING_STRUCTURE if in_string else _STRUCTURE
+      match = pattern.search(self._buffer, index)
+      # An escape at the end of the window needs the character after it.
+      if match is None or (
+              match.group() == '\\' and match.end() == len(self._buffer)):
+        index = (len(self._buffer) if match is None else match.start()) - \
+          self._position
+        if self._eof or not self._fill(read_size):
+          raise ValueError('Invalid GeoJSON: could not decode a value')
+        read_size *= 2
+        continue
+      char = match.group()
+      index = match.end()
+      if char == '\\':
+        index += 1
+      elif in_string:
+        in_string = False
+      elif char == '"':
+        in_string = True
+      elif char in '[{':
+        depth += 1
+      else:
+        depth -= 1
+      if not in_string and depth <= 0 and char != '\\':
+        return index
+
+  def decode(self, decoder=_DECODER):
+    char = self.next_char()
+    if char and char in '{["':
+      # Only decoded once the whole value is in the window.
+      self._container_end()
+      try:
+        value, end = decoder.raw_decode(self._buffer, self._position)
+      except json.JSONDecodeError:
+        raise ValueError(
+          'Invalid GeoJSON: could not decode a value') from None
+      self._position = end
+      return value
+    while True:
+      try:
+        value, end = decoder.raw_decode(self._buffer, self._position)
+      except json.JSONDecodeError:
+        if self._eof or not self._fill():
+          raise ValueError(
+            'Invalid GeoJSON: could not decode a value') from None
+        continue
+      # A number at the end of the window may still continue in the file.
+      if end < len(self._buffer) or self._eof or not self._fill():
+        self._position = end
+        return value
+
+
+def iter_feature_batches(
+        source, batch_size, read_size=READ_SIZE, members=None):
+  """
+    Yields lists of at most batch_size features, in the order of the
+    source. A path or text file is read incrementally, so only one batch
+    of features is held in memory at a time; a dictionary (already parsed
+    GeoJSON) is sliced.
+    :param source: path to a GeoJSON FeatureCollection, a text file
+    object with its content or its dictionary
+    :param batch_size: int
+    :param read_size: number of characters read from the file at a time
+    :param members: optional dictionary receiving the other members of the
+    FeatureCollection (type, crs, ...), with 'features' set to None when
+    the collection has it; complete once the batches are exhausted
+  """
+  if batch_size < 1:
+    raise ValueError('batch_size must be at least 1')
+  if members is None:
+    members = {}
+  if isinstance(source, dict):
+    members.update(source)
+    if 'features' in members:
+      members['features'] = None
+    features = source.get('features') or []
+    for start in range(0, len(features), batch_size):
+      yield features[start:start + batch_size]
+    return
+  if hasattr(source, 'read'):
+    yield from _iter_object_batches(
+      _JsonStream(source, read_size), batch_size, members)
+    return
+  with open(source, encoding='utf-8') as json_file:
+    yield from _iter_object_batches(
+      _JsonStream(json_file, read_size), batch_size, members)
+
+
+def _iter_object_batches(stream, batch_size, members):
+  yield from _iter_member_batches(stream, batch_size, members)
+  # As json.loads, nothing but whitespace may follow the object.
+  if stream.next_char():
+    raise ValueError('Invalid GeoJSON: extra data after the object')
+
+
+def _iter_member_batches(stream, batch_size, members):
+  stream.expect('{')
+  if stream.next_char() == '}':
+    stream.expect('}')
+    return
+  while True:
+    key = stream.decode()
+    if not isinstance(key, str):
+      raise ValueError('Invalid GeoJSON: member names must be strings')
+    stream.expect(':')
+    if key == 'features':
+      members['features'] = None
+      yield from _iter_array_batches(stream, batch_size)
+    else:
+      # Other members (type, crs, name, ...) are small.
+      members[key] = stream.decode()
+    if stream.expect(',}') == '}':
+      return
+
+
+def _iter_array_batches(stream, batch_size):
+  stream.expect('[')
+  if stream.next_char() == ']':
+    stream.expect(']')
+    return
+  batch = []
+  while True:
+    batch.append(stream.decode())
+    if len(batch) == batch_size:
+      yield batch
+      batch = []
+    if stream.expect(',]') == ']':
+      break
+  if batch:
+    yield batch
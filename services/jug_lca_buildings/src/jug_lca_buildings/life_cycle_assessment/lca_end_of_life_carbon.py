@@ -11,20 +11,50 @@ a conditional will decide to use which value. The conditional will be defined
 in the setters.
 For next phases, we can use a Machine object to find the corresponding
 emission.
+Since every term is proportional to the material workload, the end of life
+emission of a material reduces to a single coefficient times its workload.
+end_of_life_coefficient() computes that coefficient once per material.
 Project developer: Alireza Adli alireza.adli4@gmail.com
 Theoritical Support for LCA emissions: Mohammad Reza Seyedabadi
 """
 
+DEMOLITION_MACHINE_EMISSION = 4.3577325
+ONSITE_MACHINE_EMISSION = 2.0576313
+COMPANIES_RECYCLING_MACHINE_EMISSION = 0.6189555
+LANDFILLING_MACHINE_EMISSION = 15.7364044
+
+
+def end_of_life_coefficient(
+        recycling_ratio, onsite_recycling_ratio,
+        company_recycling_ratio, landfilling_ratio,
+        demolition_machine_emission=DEMOLITION_MACHINE_EMISSION,
+        onsite_machine_emission=ONSITE_MACHINE_EMISSION,
+        companies_recycling_machine_emission=(
+          COMPANIES_RECYCLING_MACHINE_EMISSION),
+        landfilling_machine_emission=LANDFILLING_MACHINE_EMISSION):
+  """
+    Returns the end of life emission per unit of material workload, so that
+    coefficient * material_workload equals
+    EndOfLifeEmission(...).calculate_end_of_life_emission().
+    :return: float
+  """
+  return demolition_machine_emission + \
+      recycling_ratio * onsite_recycling_ratio * onsite_machine_emission + \
+      recycling_ratio * company_recycling_ratio * \
+      companies_recycling_machine_emission + \
+      landfilling_ratio * landfilling_machine_emission
+
 
 class EndOfLifeEmission:
   def __init__(
           self, recycling_ratio, onsite_recycling_ratio,
           company_recycling_ratio, landfilling_ratio,
           material_workload,
-          demolition_machine_emission=4.3577325,
-          onsite_machine_emission=2.0576313,
-          companies_recycling_machine_emission=0.6189555,
-          landfilling_machine_emission=15.7364044):
+          demolition_machine_emission=DEMOLITION_MACHINE_EMISSION,
+          onsite_machine_emission=ONSITE_MACHINE_EMISSION,
+          companies_recycling_machine_emission=(
+            COMPANIES_RECYCLING_MACHINE_EMISSION),
+          landfilling_machine_emission=LANDFILLING_MACHINE_EMISSION):
     self.recycling_ratio = recycling_ratio
     self.onsite_recycling_ratio = onsite_recycling_ratio
     self.company_recycling_ratio = company_recycling_ratio
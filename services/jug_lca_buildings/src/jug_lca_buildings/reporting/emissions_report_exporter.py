@@ -21,7 +21,7 @@ class EmissionsReportExporter:
         'component_end_of_life_emissions',
     ]
 
-    CSV_COLUMNS = [
+    PROPERTY_COLUMNS = [
         'building_index',
         'feature_id',
         'name',
@@ -29,12 +29,26 @@ class EmissionsReportExporter:
         'function',
         'height',
         'year_of_construction',
-        *METRIC_FIELDS,
+    ]
+
+    TOTAL_FIELDS = [
         'total_embodied_emissions',
         'total_end_of_life_emissions',
         'total_lca_emissions',
     ]
 
+    CSV_COLUMNS = [*PROPERTY_COLUMNS, *METRIC_FIELDS, *TOTAL_FIELDS]
+
+    @classmethod
+    def stage_fields(cls, emissions_data):
+        """The ``<stage>_emissions`` keys of the transport and equipment
+        stages, present when the workflow had a fleet catalog."""
+        first_result = next(iter(emissions_data or []), None) or {}
+        return [
+            key for key in first_result
+            if key.endswith('_emissions') and key not in cls.METRIC_FIELDS
+        ]
+
     @classmethod
     def _safe_number(cls, value):
         try:
@@ -43,7 +57,13 @@ class EmissionsReportExporter:
             return 0.0
 
     @classmethod
-    def _row_from_feature_and_result(cls, index, feature, result):
+    def _row_from_feature_and_result(
+        cls,
+        index,
+        feature,
+        result,
+        stage_fields=(),
+    ):
         props = (feature or {}).get('properties') or {}
 
         opening_embodied = cls._safe_number(
@@ -69,6 +89,10 @@ class EmissionsReportExporter:
             opening_embodied + envelope_embodied + component_embodied
         )
         total_eol = opening_eol + envelope_eol + component_eol
+        stages = {
+            field: cls._safe_number(result.get(field))
+            for field in stage_fields
+        }
 
         return {
             'building_index': index + 1,
@@ -84,33 +108,45 @@ class EmissionsReportExporter:
             'opening_end_of_life_emissions': opening_eol,
             'envelope_end_of_life_emissions': envelope_eol,
             'component_end_of_life_emissions': component_eol,
+            **stages,
             'total_embodied_emissions': total_embodied,
             'total_end_of_life_emissions': total_eol,
-            'total_lca_emissions': total_embodied + total_eol,
+            'total_lca_emissions': (
+                total_embodied + total_eol + sum(stages.values())
+            ),
         }
 
     @classmethod
     def build_csv_text(cls, request_city, emissions_data):
         features = (request_city or {}).get('features') or []
 
+        stage_fields = cls.stage_fields(emissions_data)
+
         out = io.StringIO(newline='')
-        writer = csv.DictWriter(out, fieldnames=cls.CSV_COLUMNS)
+        writer = csv.DictWriter(
+            out,
+            fieldnames=[
+                *cls.PROPERTY_COLUMNS,
+                *cls.METRIC_FIELDS,
+                *stage_fields,
+                *cls.TOTAL_FIELDS,
+            ],
+        )
         writer.writeheader()
 
-        totals = {field: 0.0 for field in cls.METRIC_FIELDS}
-        totals.update(
-            {
-                'total_embodied_emissions': 0.0,
-                'total_end_of_life_emissions': 0.0,
-                'total_lca_emissions': 0.0,
-            }
-        )
+        totals = {
+            field: 0.0
+            for field in [*cls.METRIC_FIELDS, *stage_fields, *cls.TOTAL_FIELDS]
+        }
 
+        # Features may be a lazy iterator (e.g. read through a manifest).
+        features = iter(features)
         for idx, result in enumerate(emissions_data or []):
             row = cls._row_from_feature_and_result(
                 idx,
-                features[idx] if idx < len(features) else {},
+                next(features, {}),
                 result or {},
+                stage_fields,
             )
             writer.writerow(row)
             for key in totals:
@@ -140,13 +176,22 @@ class EmissionsReportExporter:
         return cls.to_csv_download_response_with_filename(csv_text, filename)
 
     @classmethod
-    def to_csv_download_response_with_filename(cls, csv_text, filename):
+    def to_csv_download_response_with_filename(
+        cls,
+        csv_text,
+        filename,
+        content_encoding=None,
+    ):
+        headers = {
+            'Content-Disposition': (
+                f'attachment; filename={filename}'
+            ),
+            'Vary': 'Accept-Encoding',
+        }
+        if content_encoding:
+            headers['Content-Encoding'] = content_encoding
         return Response(
             csv_text,
             mimetype='text/csv',
-            headers={
-                'Content-Disposition': (
-                    f'attachment; filename={filename}'
-                )
-            },
+            headers=headers,
         )
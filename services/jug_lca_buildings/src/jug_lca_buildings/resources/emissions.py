@@ -1,14 +1,21 @@
-import json
+import io
 import logging
 import os
+import re
 
-from flask import current_app, jsonify, request
+from flask import Response, current_app, jsonify, request
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
 from marshmallow import ValidationError
-from werkzeug.exceptions import HTTPException
+from webargs import core
+from webargs.flaskparser import FlaskParser, is_json_request
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
 
-from ..application import EmissionsApplicationService
+from ..application import (
+    EmissionsApplicationService,
+    UploadLimitExceeded,
+    UploadLimits,
+)
 from ..schemas.schemas import (
     GeoJSONUploadSchema,
     LCAInputDataSchema,
@@ -17,6 +24,31 @@ from ..reporting import EmissionsReportExporter
 
 logger = logging.getLogger(__name__)
 DEV_MODE = os.getenv('LOG_ENV', 'dev') == 'dev'
+REQUEST_HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+class _GeoJSONBodyParser(FlaskParser):
+    """Parse JSON bodies feature by feature while counts are limited.
+
+    A body with more features or vertices than allowed is then rejected
+    as soon as the count is crossed, as for an uploaded file, instead of
+    once the whole document is in memory.
+    """
+
+    def _raw_load_json(self, req):
+        limits = UploadLimits.from_env()
+        if not (limits.max_features or limits.max_vertices):
+            return super()._raw_load_json(req)
+        if not is_json_request(req) or req.content_length == 0:
+            return core.missing
+        try:
+            return limits.read_geojson(
+                io.TextIOWrapper(req.stream, encoding='utf-8-sig'))
+        except UploadLimitExceeded as e:
+            _abort_upload_limit(e)
+        except ValueError as e:
+            self._handle_invalid_json_error(e, req)
+
 
 blp = Blueprint(
     'Emissions',
@@ -25,6 +57,120 @@ blp = Blueprint(
         'Exporting embodied and end-of-life emissions data for buildings'
     ),
 )
+blp.ARGUMENTS_PARSER = _GeoJSONBodyParser()
+
+
+@blp.before_request
+def _limit_request_body():
+    """Reject oversized bodies before, or while, they are read."""
+    limits = UploadLimits.from_env()
+    # Werkzeug cuts off bodies streamed without Content-Length at the limit.
+    request.max_content_length = limits.max_bytes or None
+    try:
+        limits.check_bytes(request.content_length)
+    except UploadLimitExceeded as e:
+        _abort_upload_limit(e)
+
+
+@blp.errorhandler(RequestEntityTooLarge)
+def _request_entity_too_large(error):
+    return _upload_limit_response(UploadLimits.from_env().exceeded('bytes'))
+
+
+def _log_upload_limit(error):
+    logger.warning(
+        "emissions_request_too_large",
+        extra={'limit': error.limit, 'maximum': error.maximum},
+    )
+
+
+def _upload_limit_response(error):
+    _log_upload_limit(error)
+    response = jsonify(error.to_payload())
+    response.status_code = error.status
+    response.headers.extend(error.headers or {})
+    return response
+
+
+def _abort_upload_limit(error):
+    _log_upload_limit(error)
+    abort(
+        error.status,
+        message=str(error),
+        errors=error.errors,
+        headers=error.headers or {},
+    )
+
+
+def _accepts_encoding(encoding):
+    return request.accept_encodings[encoding] > 0
+
+
+def _tag_response(response, request_hash):
+    """Expose the request hash so clients can re-fetch by GET.
+
+    The ETag is weak since the gzip, zstd and identity bodies of a result
+    share it.
+    """
+    response.set_etag(request_hash, weak=True)
+    response.headers['X-Request-Hash'] = request_hash
+    return response
+
+
+def _encoded_json_response(request_hash, status):
+    encoded = EmissionsApplicationService.load_encoded_artifact(
+        request_hash,
+        'emissions',
+        _accepts_encoding,
+    )
+    if encoded is None:
+        return None
+    body, content_encoding = encoded
+    response = Response(body, status=status, mimetype='application/json')
+    response.headers['Vary'] = 'Accept-Encoding'
+    if content_encoding:
+        response.headers['Content-Encoding'] = content_encoding
+    return _tag_response(response, request_hash)
+
+
+def _encoded_csv_response(request_hash, csv_text=None):
+    csv_body, content_encoding = (
+        EmissionsApplicationService.load_encoded_artifact(
+            request_hash,
+            'csv',
+            _accepts_encoding,
+        )
+        or (csv_text, None)
+    )
+    if csv_body is None:
+        return None
+    response = EmissionsReportExporter.to_csv_download_response_with_filename(
+        csv_body,
+        EmissionsApplicationService.build_csv_filename(request_hash),
+        content_encoding=content_encoding,
+    )
+    return _tag_response(response, request_hash)
+
+
+def _validated_request_hash(request_hash):
+    if not REQUEST_HASH_PATTERN.match(request_hash):
+        abort(404, message="Unknown request hash")
+    return request_hash
+
+
+def _not_modified(request_hash, artifact):
+    """Return a 304 response if the client already holds this result.
+
+    A request hash identifies immutable content, so only the existence of
+    the artifact is checked.
+    """
+    if not request.if_none_match.contains_weak(request_hash):
+        return None
+    if not EmissionsApplicationService.artifact_exists(request_hash, artifact):
+        return None
+    response = Response(status=304)
+    response.headers['Vary'] = 'Accept-Encoding'
+    return _tag_response(response, request_hash)
 
 
 def _run_emissions_workflow(
@@ -67,13 +213,19 @@ def _run_emissions_workflow(
                 },
             )
             return (
-                EmissionsReportExporter.to_csv_download_response_with_filename(
+                _encoded_csv_response(
+                    computation_result.request_hash,
                     csv_export['csv_text'],
-                    csv_export['filename'],
                 ),
                 200,
             )
-        return jsonify(emissions_data), 201
+        response = _encoded_json_response(
+            computation_result.request_hash, 201)
+        if response is None:
+            response = _tag_response(
+                jsonify(emissions_data), computation_result.request_hash)
+            response.status_code = 201
+        return response
 
     except HTTPException:
         # If something upstream already called abort(...), preserve response.
@@ -99,6 +251,49 @@ class Emissions(MethodView):
         )
 
 
+@blp.route('/emissions/<string:request_hash>')
+class EmissionsResult(MethodView):
+    def get(self, request_hash):
+        request_hash = _validated_request_hash(request_hash)
+        response = _not_modified(request_hash, 'emissions')
+        if response is not None:
+            return response
+
+        response = _encoded_json_response(request_hash, 200)
+        if response is None:
+            abort(404, message="Unknown request hash")
+        logger.info(
+            "emissions_result_fetched",
+            extra={'request_hash': request_hash[:12]},
+        )
+        return response
+
+
+@blp.route('/emissions/<string:request_hash>/report.csv')
+class EmissionsResultReport(MethodView):
+    def get(self, request_hash):
+        request_hash = _validated_request_hash(request_hash)
+        response = _not_modified(request_hash, 'csv')
+        if response is not None:
+            return response
+
+        response = _encoded_csv_response(request_hash)
+        if response is None:
+            # Emissions may be cached before their CSV report was requested.
+            csv_export = EmissionsApplicationService.build_csv_report_for_hash(
+                request_hash
+            )
+            if csv_export is None:
+                abort(404, message="Unknown request hash")
+            response = _encoded_csv_response(
+                request_hash, csv_export['csv_text'])
+        logger.info(
+            "emissions_report_fetched",
+            extra={'format': 'csv', 'request_hash': request_hash[:12]},
+        )
+        return response
+
+
 @blp.route('/emissions/upload')
 class EmissionsUpload(MethodView):
     @blp.arguments(GeoJSONUploadSchema, location='files')
@@ -108,9 +303,14 @@ class EmissionsUpload(MethodView):
         if not geojson_file or not getattr(geojson_file, "filename", ""):
             abort(400, message="geojson_file is required")
 
+        # Parsed feature by feature, so count limits fail early.
         try:
-            request_city = json.load(geojson_file.stream)
-        except json.JSONDecodeError:
+            request_city = UploadLimits.from_env().read_geojson(
+                io.TextIOWrapper(geojson_file.stream, encoding='utf-8-sig')
+            )
+        except UploadLimitExceeded as e:
+            _abort_upload_limit(e)
+        except ValueError:
             abort(400, message="Invalid JSON content in geojson_file")
         else:
             try:
@@ -1,5 +1,25 @@
 """Storage helpers for jug_lca_buildings."""
 
+from .artifact_backends import (
+    ArtifactBackend,
+    FilesystemArtifactBackend,
+    SqliteArtifactBackend,
+)
+from .city_model_cache import CityModelCache
 from .emissions_artifact_store import EmissionsArtifactStore
+from .emissions_checkpoint import EmissionsCheckpoint
+from .redis_artifact_backend import (
+    RedisArtifactBackend,
+    TieredArtifactBackend,
+)
 
-__all__ = ['EmissionsArtifactStore']
+__all__ = [
+    'ArtifactBackend',
+    'CityModelCache',
+    'EmissionsArtifactStore',
+    'EmissionsCheckpoint',
+    'FilesystemArtifactBackend',
+    'RedisArtifactBackend',
+    'SqliteArtifactBackend',
+    'TieredArtifactBackend',
+]
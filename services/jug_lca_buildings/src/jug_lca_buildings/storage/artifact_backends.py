@@ -0,0 +1,590 @@
+"""Pluggable persistence backends for EmissionsArtifactStore."""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+class ArtifactBackend(ABC):
+    """Interface for persisting artifacts keyed by request hash.
+
+    Artifacts are named byte blobs (``request``, ``emissions``, ``csv``)
+    plus one metadata mapping per request hash. Backends also hold
+    content-addressed blobs shared between request hashes (the features of
+    request payloads). Blobs are stored exactly as given, whatever their
+    compression.
+    """
+
+    ARTIFACT_NAMES = ('request', 'emissions', 'csv')
+
+    @abstractmethod
+    def read(self, request_hash, artifact):
+        """Return the stored blob, or None."""
+
+    def exists(self, request_hash, artifact):
+        return self.read(request_hash, artifact) is not None
+
+    def read_many(self, request_hashes, artifact):
+        """Return ``{request_hash: blob or None}`` for a batch lookup."""
+        return {
+            request_hash: self.read(request_hash, artifact)
+            for request_hash in request_hashes
+        }
+
+    @abstractmethod
+    def write(self, request_hash, artifacts, metadata, defaults=None):
+        """Store ``artifacts`` and merge ``metadata`` into stored metadata.
+
+        ``defaults`` are only set where the stored metadata lacks them, so
+        callers need not read the metadata first.
+        """
+
+    @abstractmethod
+    def read_metadata(self, request_hash):
+        """Return the metadata mapping, or None."""
+
+    @abstractmethod
+    def increment_request_count(self, request_hash, requested_at_utc):
+        """Count one more request of a stored result."""
+
+    @abstractmethod
+    def iter_metadata(self):
+        """Yield the metadata of every stored request hash."""
+
+    def iter_stale_metadata(self, cache_namespace):
+        for metadata in self.iter_metadata():
+            if metadata.get('cache_namespace') != cache_namespace:
+                yield metadata
+
+    @abstractmethod
+    def summarize(self):
+        """Return artifact count and creation-time bounds."""
+
+    @abstractmethod
+    def delete(self, request_hash):
+        """Remove the artifacts and metadata of a request hash."""
+
+    # Content-addressed blobs shared between request hashes, keyed by the
+    # SHA-256 digest of their uncompressed content. Every blob carries the
+    # time it was last stored or reused, which orphan collection compares
+    # to its grace period.
+
+    @abstractmethod
+    def missing_blobs(self, digests):
+        """Return the subset of ``digests`` that is not stored.
+
+        The stored ones are stamped as reused, so orphan collection keeps
+        them until the manifest about to reference them is written.
+        """
+
+    @abstractmethod
+    def write_blobs(self, blobs):
+        """Store ``{digest: blob}``; blobs already stored are kept as is."""
+
+    @abstractmethod
+    def read_blobs(self, digests):
+        """Return ``{digest: blob or None}`` for a batch lookup."""
+
+    @abstractmethod
+    def iter_blob_digests(self, created_before=None):
+        """Yield stored digests, optionally only those stamped before a
+        time."""
+
+    @abstractmethod
+    def delete_blobs(self, digests, created_before=None):
+        """Remove the given blobs; unknown digests are ignored.
+
+        With ``created_before``, blobs stamped since then (reused by a save
+        meanwhile) are kept. Return how many were removed.
+        """
+
+
+class FilesystemArtifactBackend(ArtifactBackend):
+    """One directory per request hash with one file per artifact."""
+
+    FILE_NAMES = {
+        'request': 'request.json',
+        'emissions': 'emissions.json',
+        'csv': 'emissions_report.csv',
+    }
+    METADATA_FILE_NAME = 'metadata.json'
+    BLOBS_DIR_NAME = '.blobs'
+
+    def __init__(self, base_dir):
+        self.base_dir = Path(base_dir)
+
+    def _artifact_dir(self, request_hash):
+        return self.base_dir / request_hash
+
+    def _path(self, request_hash, artifact):
+        return self._artifact_dir(request_hash) / self.FILE_NAMES[artifact]
+
+    def _metadata_path(self, request_hash):
+        return self._artifact_dir(request_hash) / self.METADATA_FILE_NAME
+
+    @staticmethod
+    def _write_bytes_atomic(path, blob):
+        tmp_path = path.with_suffix(path.suffix + '.tmp')
+        tmp_path.write_bytes(blob)
+        tmp_path.replace(path)
+
+    def _write_metadata(self, request_hash, metadata):
+        self._write_bytes_atomic(
+            self._metadata_path(request_hash),
+            json.dumps(
+                metadata, indent=2, ensure_ascii=False, sort_keys=True
+            ).encode('utf-8'),
+        )
+
+    def read(self, request_hash, artifact):
+        path = self._path(request_hash, artifact)
+        if not path.exists():
+            return None
+        return path.read_bytes()
+
+    def exists(self, request_hash, artifact):
+        return self._path(request_hash, artifact).exists()
+
+    def write(self, request_hash, artifacts, metadata, defaults=None):
+        self._artifact_dir(request_hash).mkdir(parents=True, exist_ok=True)
+        for artifact, blob in artifacts.items():
+            self._write_bytes_atomic(self._path(request_hash, artifact), blob)
+        merged = dict(defaults or {})
+        merged.update(self.read_metadata(request_hash) or {})
+        merged.update(metadata)
+        self._write_metadata(request_hash, merged)
+
+    def read_metadata(self, request_hash):
+        try:
+            return json.loads(
+                self._metadata_path(request_hash).read_text(encoding='utf-8')
+            )
+        except (OSError, ValueError):
+            return None
+
+    def increment_request_count(self, request_hash, requested_at_utc):
+        metadata = self.read_metadata(request_hash)
+        if metadata is None:
+            return
+        metadata['request_count'] = metadata.get('request_count', 1) + 1
+        metadata['last_requested_at_utc'] = requested_at_utc
+        self._write_metadata(request_hash, metadata)
+
+    def iter_metadata(self):
+        """Yield metadata of every artifact directory.
+
+        Directories without metadata may still be mid-save and are skipped.
+        """
+        if not self.base_dir.is_dir():
+            return
+        for artifact_dir in self.base_dir.iterdir():
+            if not artifact_dir.is_dir() or artifact_dir.name.startswith('.'):
+                continue
+            metadata = self.read_metadata(artifact_dir.name)
+            if metadata is None:
+                continue
+            metadata.setdefault('request_hash', artifact_dir.name)
+            yield metadata
+
+    def summarize(self):
+        created = sorted(
+            metadata.get('created_at_utc') or ''
+            for metadata in self.iter_metadata()
+        )
+        return {
+            'artifacts': len(created),
+            'oldest_created_at_utc': created[0] if created else None,
+            'newest_created_at_utc': created[-1] if created else None,
+        }
+
+    def delete(self, request_hash):
+        shutil.rmtree(self._artifact_dir(request_hash), ignore_errors=True)
+
+    def _blob_path(self, digest):
+        return self.base_dir / self.BLOBS_DIR_NAME / digest[:2] / digest
+
+    def missing_blobs(self, digests):
+        missing = []
+        now = time.time()
+        for digest in digests:
+            try:
+                os.utime(self._blob_path(digest), (now, now))
+            except FileNotFoundError:
+                missing.append(digest)
+        return missing
+
+    def write_blobs(self, blobs):
+        for digest, blob in blobs.items():
+            path = self._blob_path(digest)
+            if path.exists():
+                continue
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Workers may store the same blob concurrently.
+            tmp_path = path.with_name(
+                f'{digest}.{os.getpid()}.{threading.get_ident()}.tmp')
+            tmp_path.write_bytes(blob)
+            tmp_path.replace(path)
+
+    def read_blobs(self, digests):
+        blobs = {}
+        for digest in digests:
+            try:
+                blobs[digest] = self._blob_path(digest).read_bytes()
+            except FileNotFoundError:
+                blobs[digest] = None
+        return blobs
+
+    def iter_blob_digests(self, created_before=None):
+        blobs_dir = self.base_dir / self.BLOBS_DIR_NAME
+        if not blobs_dir.is_dir():
+            return
+        for path in blobs_dir.glob('*/*'):
+            if path.suffix == '.tmp':
+                continue
+            if created_before is not None:
+                try:
+                    if path.stat().st_mtime >= created_before:
+                        continue
+                except FileNotFoundError:
+                    continue
+            yield path.name
+
+    def delete_blobs(self, digests, created_before=None):
+        removed = 0
+        for digest in digests:
+            path = self._blob_path(digest)
+            try:
+                if (created_before is not None
+                        and path.stat().st_mtime >= created_before):
+                    continue
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            removed += 1
+        return removed
+
+
+class SqliteArtifactBackend(ArtifactBackend):
+    """All artifacts and metadata in a single SQLite database (WAL mode).
+
+    Each process and thread opens its own connection, so gunicorn workers
+    read concurrently while writes are serialized by SQLite.
+    """
+
+    DATABASE_FILE_NAME = 'artifacts.sqlite3'
+    BUSY_TIMEOUT_MS = 30000
+
+    ARTIFACT_COLUMNS = {
+        'request': 'request_json',
+        'emissions': 'emissions_json',
+        'csv': 'csv_report',
+    }
+    METADATA_COLUMNS = (
+        'cache_namespace',
+        'created_at_utc',
+        'records',
+        'request_count',
+        'has_csv_report',
+        'csv_updated_at_utc',
+        'last_requested_at_utc',
+    )
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS artifacts ('
+        ' request_hash TEXT PRIMARY KEY,'
+        ' cache_namespace TEXT,'
+        ' created_at_utc TEXT,'
+        ' records INTEGER,'
+        ' request_count INTEGER NOT NULL DEFAULT 1,'
+        ' has_csv_report INTEGER NOT NULL DEFAULT 0,'
+        ' csv_updated_at_utc TEXT,'
+        ' last_requested_at_utc TEXT,'
+        ' extra_metadata TEXT,'
+        ' request_json BLOB,'
+        ' emissions_json BLOB,'
+        ' csv_report BLOB'
+        ')',
+        'CREATE INDEX IF NOT EXISTS artifacts_cache_namespace'
+        ' ON artifacts (cache_namespace)',
+        'CREATE INDEX IF NOT EXISTS artifacts_created_at_utc'
+        ' ON artifacts (created_at_utc)',
+        'CREATE TABLE IF NOT EXISTS blobs ('
+        ' digest TEXT PRIMARY KEY,'
+        ' created_at REAL NOT NULL,'
+        ' data BLOB NOT NULL'
+        ')',
+    )
+    # Stay below SQLite's default limit on bound parameters.
+    MAX_QUERY_PARAMETERS = 500
+
+    def __init__(self, base_dir, database_path=None):
+        self.base_dir = Path(base_dir)
+        self.database_path = Path(
+            database_path or self.base_dir / self.DATABASE_FILE_NAME
+        )
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+        self.database_path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(
+            self.database_path,
+            timeout=self.BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,
+        )
+        connection.row_factory = sqlite3.Row
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(f'PRAGMA busy_timeout={self.BUSY_TIMEOUT_MS}')
+        for statement in self.SCHEMA:
+            connection.execute(statement)
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def read(self, request_hash, artifact):
+        column = self.ARTIFACT_COLUMNS[artifact]
+        row = self._connection().execute(
+            f'SELECT {column} FROM artifacts WHERE request_hash = ?',
+            (request_hash,),
+        ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        blob = row[0]
+        return blob.encode('utf-8') if isinstance(blob, str) else blob
+
+    def exists(self, request_hash, artifact):
+        column = self.ARTIFACT_COLUMNS[artifact]
+        row = self._connection().execute(
+            f'SELECT {column} IS NOT NULL FROM artifacts'
+            ' WHERE request_hash = ?',
+            (request_hash,),
+        ).fetchone()
+        return bool(row and row[0])
+
+    def write(self, request_hash, artifacts, metadata, defaults=None):
+        values = {'request_hash': request_hash}
+        for artifact, blob in artifacts.items():
+            values[self.ARTIFACT_COLUMNS[artifact]] = blob
+        default_columns = set()
+        extra = {}
+        extra_defaults = {}
+        for key, value in (defaults or {}).items():
+            if key in self.METADATA_COLUMNS:
+                values[key] = value
+                default_columns.add(key)
+            elif key != 'request_hash':
+                extra_defaults[key] = value
+        for key, value in metadata.items():
+            if key in self.METADATA_COLUMNS:
+                values[key] = value
+                default_columns.discard(key)
+            elif key != 'request_hash':
+                extra[key] = value
+
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            if extra or extra_defaults:
+                row = connection.execute(
+                    'SELECT extra_metadata FROM artifacts'
+                    ' WHERE request_hash = ?',
+                    (request_hash,),
+                ).fetchone()
+                merged = dict(extra_defaults)
+                merged.update(json.loads(row[0]) if row and row[0] else {})
+                merged.update(extra)
+                values['extra_metadata'] = json.dumps(merged, sort_keys=True)
+            columns = list(values)
+            updates = ', '.join(
+                f'{column} = COALESCE(artifacts.{column}, excluded.{column})'
+                if column in default_columns
+                else f'{column} = excluded.{column}'
+                for column in columns if column != 'request_hash'
+            )
+            connection.execute(
+                f'INSERT INTO artifacts ({", ".join(columns)})'
+                f' VALUES ({", ".join("?" for _ in columns)})'
+                f' ON CONFLICT (request_hash) DO UPDATE SET {updates}',
+                [values[column] for column in columns],
+            )
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _metadata_from_row(self, row):
+        metadata = {'request_hash': row['request_hash']}
+        for column in self.METADATA_COLUMNS:
+            if row[column] is not None:
+                metadata[column] = row[column]
+        metadata['has_csv_report'] = bool(row['has_csv_report'])
+        if row['extra_metadata']:
+            metadata.update(json.loads(row['extra_metadata']))
+        return metadata
+
+    def _metadata_select(self):
+        return (
+            'SELECT request_hash, extra_metadata, '
+            + ', '.join(self.METADATA_COLUMNS)
+            + ' FROM artifacts'
+        )
+
+    def read_metadata(self, request_hash):
+        row = self._connection().execute(
+            self._metadata_select() + ' WHERE request_hash = ?',
+            (request_hash,),
+        ).fetchone()
+        return None if row is None else self._metadata_from_row(row)
+
+    def increment_request_count(self, request_hash, requested_at_utc):
+        self._connection().execute(
+            'UPDATE artifacts SET request_count = request_count + 1,'
+            ' last_requested_at_utc = ? WHERE request_hash = ?',
+            (requested_at_utc, request_hash),
+        )
+
+    def iter_metadata(self):
+        rows = self._connection().execute(self._metadata_select()).fetchall()
+        for row in rows:
+            yield self._metadata_from_row(row)
+
+    def iter_stale_metadata(self, cache_namespace):
+        rows = self._connection().execute(
+            self._metadata_select()
+            + ' WHERE cache_namespace IS NOT ?',
+            (cache_namespace,),
+        ).fetchall()
+        for row in rows:
+            yield self._metadata_from_row(row)
+
+    def summarize(self):
+        row = self._connection().execute(
+            'SELECT COUNT(*), MIN(created_at_utc), MAX(created_at_utc)'
+            ' FROM artifacts'
+        ).fetchone()
+        return {
+            'artifacts': row[0],
+            'oldest_created_at_utc': row[1],
+            'newest_created_at_utc': row[2],
+        }
+
+    def delete(self, request_hash):
+        self._connection().execute(
+            'DELETE FROM artifacts WHERE request_hash = ?', (request_hash,)
+        )
+
+    def _select_blobs(self, column, digests):
+        digests = list(digests)
+        for start in range(0, len(digests), self.MAX_QUERY_PARAMETERS):
+            batch = digests[start:start + self.MAX_QUERY_PARAMETERS]
+            yield from self._connection().execute(
+                f'SELECT digest, {column} FROM blobs'
+                f' WHERE digest IN ({", ".join("?" for _ in batch)})',
+                batch,
+            )
+
+    def missing_blobs(self, digests):
+        digests = list(digests)
+        # Stamped before they are looked up, so orphan collection cannot
+        # remove a blob reported as stored.
+        now = time.time()
+        for start in range(0, len(digests), self.MAX_QUERY_PARAMETERS):
+            batch = digests[start:start + self.MAX_QUERY_PARAMETERS]
+            self._connection().execute(
+                f'UPDATE blobs SET created_at = ?'
+                f' WHERE digest IN ({", ".join("?" for _ in batch)})',
+                [now, *batch],
+            )
+        stored = {row[0] for row in self._select_blobs('NULL', digests)}
+        return [digest for digest in digests if digest not in stored]
+
+    def write_blobs(self, blobs):
+        if not blobs:
+            return
+        now = time.time()
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(
+                'INSERT OR IGNORE INTO blobs (digest, created_at, data)'
+                ' VALUES (?, ?, ?)',
+                [(digest, now, blob) for digest, blob in blobs.items()],
+            )
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def read_blobs(self, digests):
+        blobs = dict.fromkeys(digests)
+        for digest, blob in self._select_blobs('data', digests):
+            blobs[digest] = blob
+        return blobs
+
+    def iter_blob_digests(self, created_before=None):
+        if created_before is None:
+            rows = self._connection().execute('SELECT digest FROM blobs')
+        else:
+            rows = self._connection().execute(
+                'SELECT digest FROM blobs WHERE created_at < ?',
+                (created_before,),
+            )
+        for row in rows.fetchall():
+            yield row[0]
+
+    def delete_blobs(self, digests, created_before=None):
+        digests = list(digests)
+        removed = 0
+        for start in range(0, len(digests), self.MAX_QUERY_PARAMETERS):
+            batch = digests[start:start + self.MAX_QUERY_PARAMETERS]
+            query = (
+                f'DELETE FROM blobs'
+                f' WHERE digest IN ({", ".join("?" for _ in batch)})'
+            )
+            if created_before is not None:
+                query += ' AND created_at < ?'
+                batch = [*batch, created_before]
+            removed += self._connection().execute(query, batch).rowcount
+        return removed
+
+
+ARTIFACT_BACKENDS = {
+    'filesystem': FilesystemArtifactBackend,
+    'sqlite': SqliteArtifactBackend,
+}
+
+
+def build_artifact_backend(name, base_dir):
+    """Return the shared backend instance for ``name`` and ``base_dir``."""
+    try:
+        backend_cls = ARTIFACT_BACKENDS[name]
+    except KeyError:
+        raise ValueError(
+            f'Unknown artifact backend {name!r}; '
+            f'expected one of {", ".join(sorted(ARTIFACT_BACKENDS))}'
+        ) from None
+    key = (name, str(Path(base_dir).resolve()))
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is None:
+            backend = _backends[key] = backend_cls(base_dir)
+    return backend
@@ -0,0 +1,78 @@
+"""Compression codecs for stored artifacts.
+
+Encoded blobs are recognised by their magic bytes, so artifacts written
+before compression was enabled (plain UTF-8 JSON/CSV) stay readable and
+the stored encoding never has to be looked up in metadata.
+"""
+
+from __future__ import annotations
+
+import gzip
+
+try:
+    import zstandard
+except ModuleNotFoundError:
+    zstandard = None
+
+IDENTITY = 'identity'
+GZIP = 'gzip'
+ZSTD = 'zstd'
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+COMPRESSION_ALIASES = {
+    'none': IDENTITY,
+    IDENTITY: IDENTITY,
+    GZIP: GZIP,
+    ZSTD: ZSTD,
+}
+
+
+def resolve_encoding(name):
+    """Map a configured compression name to a content encoding."""
+    try:
+        encoding = COMPRESSION_ALIASES[(name or IDENTITY).strip().lower()]
+    except KeyError:
+        raise ValueError(
+            f'Unknown artifact compression {name!r}; '
+            f'expected one of {", ".join(sorted(COMPRESSION_ALIASES))}'
+        ) from None
+    if encoding == ZSTD and zstandard is None:
+        raise ValueError(
+            'zstd artifact compression requires the zstandard package'
+        )
+    return encoding
+
+
+def detect_encoding(blob):
+    if blob[:2] == GZIP_MAGIC:
+        return GZIP
+    if blob[:4] == ZSTD_MAGIC:
+        return ZSTD
+    return IDENTITY
+
+
+def encode(data, encoding):
+    if encoding == GZIP:
+        # mtime=0 keeps identical content byte-identical across writes.
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding == ZSTD:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return data
+
+
+def decode(blob):
+    encoding = detect_encoding(blob)
+    if encoding == GZIP:
+        return gzip.decompress(blob)
+    if encoding == ZSTD:
+        if zstandard is None:
+            raise ValueError(
+                'Artifact is zstd-compressed but zstandard is not installed'
+            )
+        return zstandard.ZstdDecompressor().decompressobj().decompress(blob)
+    return blob
@@ -0,0 +1,106 @@
+"""Incremental canonical JSON encoding for request hashing.
+
+The output is byte-identical to::
+
+    json.dumps(obj, sort_keys=True, separators=(',', ':'),
+               ensure_ascii=False)
+
+but is produced as a stream of chunks, so a large city can be hashed
+without building one string holding the whole payload. The top levels of
+the structure (the payload envelope, the FeatureCollection and its
+``features`` list) are walked in Python; anything deeper is encoded by
+the C encoder, a batch of features per call.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+
+DEFAULT_CHUNK_DEPTH = 3
+DIGEST_BUFFER_BYTES = 1024 * 1024
+LIST_BATCH_SIZE = 256
+
+_encode_leaf = json.JSONEncoder(
+    sort_keys=True,
+    separators=(',', ':'),
+    ensure_ascii=False,
+).encode
+_encode_key = json.JSONEncoder(ensure_ascii=False).encode
+
+
+def _key_to_str(key):
+    # Mirror the json module's coercion of non-string dict keys.
+    if isinstance(key, str):
+        return key
+    if key is True:
+        return 'true'
+    if key is False:
+        return 'false'
+    if key is None:
+        return 'null'
+    if isinstance(key, (int, float)):
+        return _encode_leaf(key)
+    raise TypeError(
+        f'keys must be str, int, float, bool or None, '
+        f'not {key.__class__.__name__}'
+    )
+
+
+def canonical_dumps(obj):
+    """Return the canonical JSON text of ``obj`` in one string."""
+    return _encode_leaf(obj)
+
+
+def iter_canonical_json(obj, chunk_depth=DEFAULT_CHUNK_DEPTH):
+    """Yield canonical JSON text for ``obj`` in chunks."""
+    if chunk_depth <= 0 or not isinstance(obj, (dict, list, tuple)):
+        yield _encode_leaf(obj)
+        return
+
+    if isinstance(obj, dict):
+        if not obj:
+            yield '{}'
+            return
+        separator = '{'
+        for key, value in sorted(obj.items()):
+            yield f'{separator}{_encode_key(_key_to_str(key))}:'
+            yield from iter_canonical_json(value, chunk_depth - 1)
+            separator = ','
+        yield '}'
+        return
+
+    if not obj:
+        yield '[]'
+        return
+    if chunk_depth == 1:
+        # Encode leaf elements in batches to amortise per-call overhead.
+        separator = '['
+        for start in range(0, len(obj), LIST_BATCH_SIZE):
+            batch = _encode_leaf(list(obj[start:start + LIST_BATCH_SIZE]))
+            yield separator + batch[1:-1]
+            separator = ','
+        yield ']'
+        return
+    separator = '['
+    for value in obj:
+        yield separator
+        yield from iter_canonical_json(value, chunk_depth - 1)
+        separator = ','
+    yield ']'
+
+
+def canonical_sha256(obj, chunk_depth=DEFAULT_CHUNK_DEPTH):
+    """Return the SHA-256 hex digest of the canonical JSON of ``obj``."""
+    digest = hashlib.sha256()
+    pending = []
+    pending_size = 0
+    for chunk in iter_canonical_json(obj, chunk_depth):
+        pending.append(chunk)
+        pending_size += len(chunk)
+        if pending_size >= DIGEST_BUFFER_BYTES:
+            digest.update(''.join(pending).encode('utf-8'))
+            pending.clear()
+            pending_size = 0
+    digest.update(''.join(pending).encode('utf-8'))
+    return digest.hexdigest()
@@ -0,0 +1,107 @@
+"""In-process cache of parsed and construction-enriched city models."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import pickle
+import threading
+import zlib
+from collections import OrderedDict
+from importlib import metadata
+
+
+class CityModelCache:
+    """Keep compressed snapshots of enriched cerc-hub cities in memory.
+
+    Snapshots are keyed by the input GeoJSON content hash plus a fingerprint
+    of the construction catalog used for enrichment. Least recently used
+    snapshots are evicted once the total snapshot size exceeds ``max_bytes``.
+    A ``max_bytes`` of zero disables the cache.
+    """
+
+    HASH_CHUNK_BYTES = 1024 * 1024
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    @property
+    def size_bytes(self):
+        return self._size_bytes
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @staticmethod
+    def _hub_version():
+        try:
+            return metadata.version('cerc-hub')
+        except metadata.PackageNotFoundError:
+            return 'unknown'
+
+    @classmethod
+    def build_catalog_fingerprint(cls, catalog, building_parameters):
+        canonical = json.dumps(
+            {
+                'catalog': catalog,
+                'building_parameters': list(building_parameters),
+                'hub_version': cls._hub_version(),
+            },
+            sort_keys=True,
+            separators=(',', ':'),
+        )
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def build_key(cls, city_path, catalog, building_parameters):
+        digest = hashlib.sha256()
+        with open(city_path, 'rb') as city_file:
+            for chunk in iter(
+                    lambda: city_file.read(cls.HASH_CHUNK_BYTES), b''):
+                digest.update(chunk)
+        fingerprint = cls.build_catalog_fingerprint(
+            catalog, building_parameters)
+        return f'{digest.hexdigest()}:{fingerprint}'
+
+    def get(self, key):
+        with self._lock:
+            snapshot = self._entries.get(key)
+            if snapshot is None:
+                return None
+            self._entries.move_to_end(key)
+        return pickle.loads(zlib.decompress(snapshot))
+
+    def put(self, key, city):
+        """Store a snapshot of ``city``; return False if it does not fit."""
+        if not self.enabled:
+            return False
+        snapshot = zlib.compress(
+            pickle.dumps(city, protocol=pickle.HIGHEST_PROTOCOL), 1)
+        if len(snapshot) > self.max_bytes:
+            return False
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size_bytes -= len(previous)
+            while self._entries and \
+                    self._size_bytes + len(snapshot) > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size_bytes -= len(evicted)
+            self._entries[key] = snapshot
+            self._size_bytes += len(snapshot)
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
@@ -0,0 +1,134 @@
+"""Append-only columnar file of per-building emissions.
+
+The file starts with a header naming the columns and is followed by one
+block per appended batch of buildings. A block holds its row count and
+then, column after column, the values as little-endian float64, so each
+batch can be written as soon as it is computed and read back one block at
+a time without loading the whole file.
+"""
+
+from __future__ import annotations
+
+import json
+import struct
+
+import numpy as np
+
+MAGIC = b'JLCAEM1\n'
+_HEADER_LENGTH = struct.Struct('<I')
+_ROW_COUNT = struct.Struct('<Q')
+_DTYPE = np.dtype('<f8')
+
+
+class ColumnarEmissionsWriter:
+    """Write emission rows (dicts with the same keys) to a columnar file."""
+
+    def __init__(self, path, columns=None):
+        self.path = path
+        self.columns = list(columns) if columns is not None else None
+        self.rows_written = 0
+        self._file = open(path, 'wb')
+        self._header_written = False
+
+    @classmethod
+    def resume(cls, path, size):
+        """Reopen ``path`` for appending after its first ``size`` bytes.
+
+        Anything past ``size`` (a block from an interrupted write) is cut.
+        """
+        if not size:
+            return cls(path)
+        writer = cls.__new__(cls)
+        writer.path = path
+        writer._file = open(path, 'r+b')
+        writer._file.truncate(size)
+        writer.columns = _read_header(writer._file)['columns']
+        writer._file.seek(size)
+        writer._header_written = True
+        writer.rows_written = 0
+        return writer
+
+    @property
+    def size(self):
+        """Bytes written so far."""
+        return self._file.tell()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write_header(self):
+        header = json.dumps({'columns': self.columns}).encode('utf-8')
+        self._file.write(MAGIC)
+        self._file.write(_HEADER_LENGTH.pack(len(header)))
+        self._file.write(header)
+        self._header_written = True
+
+    def append(self, rows):
+        """Append one block holding ``rows``; return the rows written."""
+        if not rows:
+            return 0
+        if self.columns is None:
+            self.columns = list(rows[0])
+        if not self._header_written:
+            self._write_header()
+        block = np.array(
+            [[row[column] for column in self.columns] for row in rows],
+            dtype=_DTYPE,
+        )
+        self._file.write(_ROW_COUNT.pack(len(rows)))
+        # Column-major, so each column of the block is contiguous.
+        self._file.write(block.tobytes(order='F'))
+        self._file.flush()
+        self.rows_written += len(rows)
+        return len(rows)
+
+    def close(self):
+        if not self._file.closed:
+            if not self._header_written:
+                # An empty result still gets a readable file.
+                self.columns = self.columns or []
+                self._write_header()
+            self._file.close()
+
+
+def _read_header(columnar_file):
+    if columnar_file.read(len(MAGIC)) != MAGIC:
+        raise ValueError('Not a columnar emissions file')
+    (length,) = _HEADER_LENGTH.unpack(
+        columnar_file.read(_HEADER_LENGTH.size))
+    return json.loads(columnar_file.read(length))
+
+
+def iter_columnar_blocks(path):
+    """Yield each block as a dict of column name to float64 array."""
+    with open(path, 'rb') as columnar_file:
+        columns = _read_header(columnar_file)['columns']
+        while True:
+            row_count_bytes = columnar_file.read(_ROW_COUNT.size)
+            if len(row_count_bytes) < _ROW_COUNT.size:
+                return
+            (rows,) = _ROW_COUNT.unpack(row_count_bytes)
+            block_size = rows * len(columns) * _DTYPE.itemsize
+            block = columnar_file.read(block_size)
+            if len(block) < block_size:
+                # A block cut short by an interrupted write is ignored.
+                return
+            values = np.frombuffer(block, dtype=_DTYPE)
+            yield dict(zip(
+                columns, values.reshape(len(columns), rows), strict=True))
+
+
+def iter_columnar_emissions(path):
+    """Yield one emissions dict per building, in the order written."""
+    for block in iter_columnar_blocks(path):
+        columns = {name: values.tolist() for name, values in block.items()}
+        for values in zip(*columns.values(), strict=True):
+            yield dict(zip(columns, values, strict=True))
+
+
+def read_columnar_emissions(path):
+    """Return the file as the list of dicts ``export_emissions`` returns."""
+    return list(iter_columnar_emissions(path))
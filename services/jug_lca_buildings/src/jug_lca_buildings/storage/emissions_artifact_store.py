@@ -1,117 +1,439 @@
-"""Filesystem-backed cache for emissions results and exported reports."""
+"""Cache for emissions results and exported reports."""
 
 from __future__ import annotations
 
 import hashlib
 import json
 import os
+import secrets
+import time
 from datetime import datetime, timezone
 from pathlib import Path
 
+from ..life_cycle_assessment import EMISSION_CODE_VERSION
+from ..life_cycle_assessment.fleet_emission import configured_fleet_catalog
+from . import artifact_codecs
+from .artifact_backends import build_artifact_backend
+from .canonical_json import canonical_dumps, canonical_sha256
+from .redis_artifact_backend import (
+    TieredArtifactBackend,
+    build_shared_artifact_backend,
+)
+
 
 class EmissionsArtifactStore:
-    """Persist emissions results and CSV exports on disk.
+    """Persist emissions results and CSV exports.
 
-    Artifacts are keyed by a deterministic request hash.
+    Persistence is delegated to an artifact backend selected with
+    JUG_LCA_ARTIFACTS_BACKEND (``filesystem`` by default, or ``sqlite``).
+    When JUG_LCA_REDIS_URL is set, a Redis-protocol cache shared between
+    nodes is consulted after the local backend misses.
+    Artifacts are compressed with JUG_LCA_ARTIFACTS_COMPRESSION (``gzip`` by
+    default, ``zstd`` or ``none``).
+    Artifacts are keyed by a deterministic request hash. The hash includes a
+    cache namespace derived from the NRCan catalog files and the emission
+    code version, so a catalog or formula change makes older artifacts
+    unreachable while unchanged ones stay valid across deploys.
+    Request payloads are stored as a manifest of feature digests; each
+    feature is a content-addressed blob shared by every request containing
+    it, so similar cities only add their new features.
     """
 
-    CACHE_NAMESPACE = 'jug_lca_buildings_emissions_v1'
+    CACHE_NAMESPACE_PREFIX = 'jug_lca_buildings_emissions'
+    MANIFEST_VERSION = 1
+    FEATURE_BATCH_SIZE = 1000
+    BLOB_GC_GRACE_SECONDS = 3600
+    MAINTENANCE_CLAIM_TTL_SECONDS = 3600
+    CATALOGS_DIR = Path(__file__).resolve().parent.parent / 'data'
+    CATALOG_FILES = (
+        'nrcan_archetypes.json',
+        'nrcan_constructions_cap_3.json',
+        'nrcan_materials_dictionaries.json',
+        'nrcan_transparent_surfaces_dictionaries.json',
+    )
+
+    _namespaces = {}
 
-    def __init__(self, base_dir=None):
+    def __init__(
+        self,
+        base_dir=None,
+        cache_namespace=None,
+        backend=None,
+        compression=None,
+    ):
         configured_dir = base_dir or os.getenv(
             'JUG_LCA_ARTIFACTS_DIR',
             '.runtime/jug_lca_buildings',
         )
         self.base_dir = Path(configured_dir)
+        if backend is None:
+            backend = os.getenv('JUG_LCA_ARTIFACTS_BACKEND', 'filesystem')
+        if isinstance(backend, str):
+            backend = build_artifact_backend(backend, self.base_dir)
+            redis_url = os.getenv('JUG_LCA_REDIS_URL')
+            if redis_url:
+                ttl_seconds = int(
+                    os.getenv('JUG_LCA_REDIS_TTL_SECONDS', '0') or 0)
+                backend = TieredArtifactBackend(
+                    backend,
+                    build_shared_artifact_backend(
+                        redis_url, ttl_seconds=ttl_seconds or None),
+                )
+        self.backend = backend
+        self.compression = artifact_codecs.resolve_encoding(
+            compression or os.getenv(
+                'JUG_LCA_ARTIFACTS_COMPRESSION', artifact_codecs.GZIP)
+        )
+        self.cache_namespace = (
+            cache_namespace or self.build_cache_namespace()
+        )
+
+    @classmethod
+    def build_cache_namespace(
+        cls,
+        catalogs_dir=None,
+        code_version=EMISSION_CODE_VERSION,
+    ):
+        """Derive the namespace from catalog content and code version.
+
+        The fleet catalog set in LCA_FLEET_CATALOG, if any, is part of the
+        catalogs. The result is memoized per process since catalog files
+        only change with a deploy.
+        """
+        catalogs_dir = Path(catalogs_dir or cls.CATALOGS_DIR)
+        fleet_catalog = configured_fleet_catalog(catalogs_dir)
+        memo_key = (str(catalogs_dir), str(fleet_catalog), code_version)
+        namespace = cls._namespaces.get(memo_key)
+        if namespace is None:
+            digest = hashlib.sha256(
+                f'emission_code_version={code_version}\n'.encode('utf-8')
+            )
+            catalog_paths = [
+                (file_name, catalogs_dir / file_name)
+                for file_name in cls.CATALOG_FILES
+            ]
+            if fleet_catalog is not None:
+                catalog_paths.append(('fleet_catalog', fleet_catalog))
+            for name, path in catalog_paths:
+                file_digest = hashlib.sha256(path.read_bytes()).hexdigest()
+                digest.update(f'{name}={file_digest}\n'.encode('utf-8'))
+            namespace = (
+                f'{cls.CACHE_NAMESPACE_PREFIX}_{digest.hexdigest()[:16]}'
+            )
+            cls._namespaces[memo_key] = namespace
+        return namespace
 
     def build_request_hash(self, request_city):
-        payload = {
-            'cache_namespace': self.CACHE_NAMESPACE,
+        """SHA-256 of the canonical JSON of the namespaced request.
+
+        The canonical text is streamed into the digest, so keys stay
+        identical to hashing the full ``json.dumps(..., sort_keys=True)``.
+        """
+        return canonical_sha256({
+            'cache_namespace': self.cache_namespace,
             'request_city': request_city,
-        }
-        canonical = json.dumps(
-            payload,
-            sort_keys=True,
-            separators=(',', ':'),
-            ensure_ascii=False,
+        })
+
+    def _encode_text(self, text):
+        return artifact_codecs.encode(text.encode('utf-8'), self.compression)
+
+    def _dump_json(self, payload):
+        return self._encode_text(
+            json.dumps(payload, indent=2, ensure_ascii=False, sort_keys=True)
         )
-        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
 
-    def _artifact_dir(self, request_hash):
-        return self.base_dir / request_hash
+    @staticmethod
+    def _load_json(blob):
+        return json.loads(artifact_codecs.decode(blob))
 
-    def _json_path(self, request_hash):
-        return self._artifact_dir(request_hash) / 'emissions.json'
+    def load_emissions_data(self, request_hash):
+        blob = self.backend.read(request_hash, 'emissions')
+        if blob is None:
+            return None
+        return self._load_json(blob)
 
-    def _request_path(self, request_hash):
-        return self._artifact_dir(request_hash) / 'request.json'
+    def load_emissions_data_many(self, request_hashes):
+        """Batch lookup returning ``{request_hash: emissions or None}``."""
+        blobs = self.backend.read_many(list(request_hashes), 'emissions')
+        return {
+            request_hash: None if blob is None else self._load_json(blob)
+            for request_hash, blob in blobs.items()
+        }
 
-    def _csv_path(self, request_hash):
-        return self._artifact_dir(request_hash) / 'emissions_report.csv'
+    def artifact_exists(self, request_hash, artifact):
+        return self.backend.exists(request_hash, artifact)
 
-    def _metadata_path(self, request_hash):
-        return self._artifact_dir(request_hash) / 'metadata.json'
+    def load_encoded_artifact(self, request_hash, artifact, accept_encoding):
+        """Return ``(body, content_encoding)`` for an HTTP response.
 
-    def _ensure_dir(self, request_hash):
-        artifact_dir = self._artifact_dir(request_hash)
-        artifact_dir.mkdir(parents=True, exist_ok=True)
-        return artifact_dir
+        The stored blob is returned untouched when the client accepts its
+        encoding (``accept_encoding`` is a predicate on encoding names);
+        otherwise it is decompressed. ``content_encoding`` is None for an
+        uncompressed body. Returns None when the artifact does not exist.
+        """
+        blob = self.backend.read(request_hash, artifact)
+        if blob is None:
+            return None
+        encoding = artifact_codecs.detect_encoding(blob)
+        if encoding == artifact_codecs.IDENTITY:
+            return blob, None
+        if accept_encoding(encoding):
+            return blob, encoding
+        return artifact_codecs.decode(blob), None
 
-    @staticmethod
-    def _write_text_atomic(path, text):
-        tmp_path = path.with_suffix(path.suffix + '.tmp')
-        tmp_path.write_text(text, encoding='utf-8')
-        tmp_path.replace(path)
-
-    def _write_json_atomic(self, path, payload):
-        self._write_text_atomic(
-            path,
-            json.dumps(payload, indent=2, ensure_ascii=False, sort_keys=True),
-        )
+    @classmethod
+    def is_request_manifest(cls, payload):
+        return isinstance(payload, dict) and 'feature_hashes' in payload
 
-    def load_emissions_data(self, request_hash):
-        path = self._json_path(request_hash)
-        if not path.exists():
+    def _dump_request_manifest(self, request_city):
+        """Store new feature blobs and return the encoded manifest."""
+        features = request_city.get('features') or []
+        feature_hashes = []
+        for start in range(0, len(features), self.FEATURE_BATCH_SIZE):
+            encoded = {}
+            for feature in features[start:start + self.FEATURE_BATCH_SIZE]:
+                text = canonical_dumps(feature).encode('utf-8')
+                digest = hashlib.sha256(text).hexdigest()
+                feature_hashes.append(digest)
+                encoded[digest] = text
+            missing = self.backend.missing_blobs(list(encoded))
+            if missing:
+                self.backend.write_blobs({
+                    digest: artifact_codecs.encode(
+                        encoded[digest], self.compression)
+                    for digest in missing
+                })
+        manifest = {
+            key: value for key, value in request_city.items()
+            if key != 'features'
+        }
+        manifest['manifest_version'] = self.MANIFEST_VERSION
+        manifest['feature_hashes'] = feature_hashes
+        return self._dump_json(manifest)
+
+    def _iter_manifest_features(self, manifest):
+        feature_hashes = manifest['feature_hashes']
+        for start in range(0, len(feature_hashes), self.FEATURE_BATCH_SIZE):
+            batch = feature_hashes[start:start + self.FEATURE_BATCH_SIZE]
+            blobs = self.backend.read_blobs(set(batch))
+            for digest in batch:
+                blob = blobs.get(digest)
+                if blob is None:
+                    raise KeyError(f'Missing feature blob {digest}')
+                yield self._load_json(blob)
+
+    def iter_request_features(self, request_hash):
+        """Return an iterator over the stored request features, or None.
+
+        Features are read through the manifest in batches. Iteration raises
+        KeyError if a feature blob has been removed.
+        """
+        blob = self.backend.read(request_hash, 'request')
+        if blob is None:
             return None
-        return json.loads(path.read_text(encoding='utf-8'))
+        payload = self._load_json(blob)
+        if self.is_request_manifest(payload):
+            return self._iter_manifest_features(payload)
+        # Payloads stored before manifests were introduced.
+        return iter(payload.get('features') or [])
 
     def save_emissions_data(self, request_hash, request_city, emissions_data):
-        self._ensure_dir(request_hash)
-        self._write_json_atomic(self._request_path(request_hash), request_city)
-        self._write_json_atomic(self._json_path(request_hash), emissions_data)
-        self._write_json_atomic(
-            self._metadata_path(request_hash),
+        self.backend.write(
+            request_hash,
+            {
+                'request': self._dump_request_manifest(request_city),
+                'emissions': self._dump_json(emissions_data),
+            },
             {
                 'request_hash': request_hash,
-                'cache_namespace': self.CACHE_NAMESPACE,
+                'cache_namespace': self.cache_namespace,
                 'created_at_utc': datetime.now(timezone.utc).isoformat(),
-                'has_csv_report': self._csv_path(request_hash).exists(),
+                'has_csv_report': self.backend.exists(request_hash, 'csv'),
                 'records': len(emissions_data or []),
+                'request_count': 1,
             },
         )
 
+    def load_metadata(self, request_hash):
+        return self.backend.read_metadata(request_hash)
+
+    def record_cache_hit(self, request_hash):
+        """Count repeat requests so warm-up can favour popular cities."""
+        self.backend.increment_request_count(
+            request_hash,
+            datetime.now(timezone.utc).isoformat(),
+        )
+
+    def load_request_city(self, request_hash):
+        blob = self.backend.read(request_hash, 'request')
+        if blob is None:
+            return None
+        payload = self._load_json(blob)
+        if not self.is_request_manifest(payload):
+            return payload
+        try:
+            features = list(self._iter_manifest_features(payload))
+        except KeyError:
+            return None
+        request_city = {
+            key: value for key, value in payload.items()
+            if key not in ('manifest_version', 'feature_hashes')
+        }
+        request_city['features'] = features
+        return request_city
+
     def load_csv_report(self, request_hash):
-        path = self._csv_path(request_hash)
-        if not path.exists():
+        blob = self.backend.read(request_hash, 'csv')
+        if blob is None:
             return None
-        return path.read_text(encoding='utf-8')
+        return artifact_codecs.decode(blob).decode('utf-8')
 
     def save_csv_report(self, request_hash, csv_text):
-        self._ensure_dir(request_hash)
-        self._write_text_atomic(self._csv_path(request_hash), csv_text)
-
-        metadata_path = self._metadata_path(request_hash)
-        if metadata_path.exists():
-            metadata = json.loads(metadata_path.read_text(encoding='utf-8'))
-        else:
-            metadata = {
+        now = datetime.now(timezone.utc).isoformat()
+        self.backend.write(
+            request_hash,
+            {'csv': self._encode_text(csv_text)},
+            {
+                'has_csv_report': True,
+                'csv_updated_at_utc': now,
+            },
+            defaults={
                 'request_hash': request_hash,
-                'cache_namespace': self.CACHE_NAMESPACE,
-                'created_at_utc': datetime.now(timezone.utc).isoformat(),
-            }
-        metadata['has_csv_report'] = True
-        metadata['csv_updated_at_utc'] = datetime.now(timezone.utc).isoformat()
-        self._write_json_atomic(metadata_path, metadata)
+                'cache_namespace': self.cache_namespace,
+                'created_at_utc': now,
+            },
+        )
+
+    def summarize(self):
+        """Return the artifact count and creation-time bounds."""
+        return self.backend.summarize()
+
+    def iter_stale_artifacts(self):
+        """Yield metadata of artifacts written under another namespace."""
+        yield from self.backend.iter_stale_metadata(self.cache_namespace)
+
+    def delete_artifact(self, request_hash):
+        self.backend.delete(request_hash)
+
+    def sweep_stale_artifacts(self, limit=None):
+        """Remove up to ``limit`` stale artifacts; return how many."""
+        removed = 0
+        for metadata in list(self.iter_stale_artifacts()):
+            if limit is not None and removed >= limit:
+                break
+            self.delete_artifact(metadata['request_hash'])
+            removed += 1
+        return removed
+
+    def collect_orphan_blobs(self):
+        """Remove feature blobs no manifest references; return how many.
+
+        Blobs stored or reused within BLOB_GC_GRACE_SECONDS are kept, since
+        a concurrent save stores or reuses its blobs before writing its
+        manifest.
+        """
+        created_before = time.time() - self.BLOB_GC_GRACE_SECONDS
+        candidates = set(self.backend.iter_blob_digests(created_before))
+        if not candidates:
+            return 0
+        for metadata in self.backend.iter_metadata():
+            blob = self.backend.read(metadata['request_hash'], 'request')
+            if blob is None:
+                continue
+            payload = self._load_json(blob)
+            if self.is_request_manifest(payload):
+                candidates.difference_update(payload['feature_hashes'])
+        # Blobs reused while the manifests were read are stamped again.
+        return self.backend.delete_blobs(candidates, created_before)
+
+    def _maintenance_marker(self):
+        return self.base_dir / f'.maintenance_{self.cache_namespace}'
+
+    @staticmethod
+    def _create_maintenance_marker(marker):
+        try:
+            fd = os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        os.close(fd)
+        return True
+
+    @classmethod
+    def _maintenance_claim_expired(cls, marker):
+        """True for a claim that was neither completed nor renewed in time.
+
+        A completed claim holds ``completed``; a claim in progress is an
+        empty marker renewed by its worker, so one whose worker crashed
+        expires after MAINTENANCE_CLAIM_TTL_SECONDS.
+        """
+        try:
+            if marker.read_text(encoding='utf-8') == 'completed':
+                return False
+            age = time.time() - marker.stat().st_mtime
+        except FileNotFoundError:
+            return False
+        return age > cls.MAINTENANCE_CLAIM_TTL_SECONDS
+
+    def claim_stale_artifact_maintenance(self):
+        """Return True for the first caller per namespace across workers.
+
+        A claim left by a worker that stopped before completing it expires,
+        so the maintenance is retried.
+        """
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        marker = self._maintenance_marker()
+        if not self._create_maintenance_marker(marker):
+            if not self._maintenance_claim_expired(marker):
+                return False
+            # Only one of the workers taking over an expired claim renames
+            # it away; one that took over a claim renewed meanwhile puts it
+            # back, unless another worker has claimed the marker since.
+            expired = marker.with_name(
+                f'{marker.name}.{secrets.token_hex(4)}')
+            try:
+                os.rename(marker, expired)
+            except FileNotFoundError:
+                return False
+            if not self._maintenance_claim_expired(expired):
+                try:
+                    os.link(expired, marker)
+                except (FileExistsError, FileNotFoundError):
+                    pass
+                expired.unlink(missing_ok=True)
+                return False
+            expired.unlink(missing_ok=True)
+            if not self._create_maintenance_marker(marker):
+                return False
+        # Markers of other namespaces are removed; the claims this
+        # namespace's workers are taking over are theirs to remove.
+        taken_over = f'{marker.name}.'
+        for old_marker in self.base_dir.glob('.maintenance_*'):
+            if old_marker != marker and \
+                    not old_marker.name.startswith(taken_over):
+                old_marker.unlink(missing_ok=True)
+        return True
+
+    def renew_stale_artifact_maintenance(self):
+        """Keep a claim in progress from expiring.
+
+        Return False when the marker is gone, taken over by another worker.
+        """
+        try:
+            os.utime(self._maintenance_marker())
+        except FileNotFoundError:
+            return False
+        return True
+
+    def complete_stale_artifact_maintenance(self):
+        self._maintenance_marker().write_text('completed', encoding='utf-8')
+
+    def checkpoint_path(self, request_hash):
+        """Local file holding the partial results of a running request.
+
+        Checkpoints always live under ``base_dir``, whatever the backend,
+        since only the worker computing the request writes them.
+        """
+        return self.base_dir / '.checkpoints' / f'{request_hash}.lcaem'
 
     @staticmethod
     def build_csv_filename(request_hash):
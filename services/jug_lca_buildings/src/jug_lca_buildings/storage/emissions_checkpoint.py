@@ -0,0 +1,171 @@
+"""Resumable checkpoints of long-running emissions calculations."""
+
+from __future__ import annotations
+
+import json
+import os
+from itertools import islice
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from .columnar_emissions import (
+    ColumnarEmissionsWriter,
+    iter_columnar_emissions,
+)
+
+
+class EmissionsCheckpoint:
+    """Completed emission rows of a calculation, committed in batches.
+
+    Rows are appended to a columnar emissions file. After each batch a
+    small progress record (items done, rows and committed file size) next
+    to it is replaced atomically, so the record never points past data
+    that was fully written. On resume the file is cut back to the committed
+    size and the calculation continues after the committed items.
+
+    The fingerprint passed to ``open`` describes how items map to rows
+    (e.g. buildings or fixed-size chunks of features); a checkpoint with
+    another fingerprint is discarded instead of resumed.
+
+    Only one calculation at a time may use a checkpoint: ``acquire`` takes
+    an exclusive lock on a ``.lock`` file next to it, which ``release``
+    (or the end of the process) gives up, and ``discard`` only removes a
+    checkpoint whose lock it holds or can take.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.progress_path = self.path.with_name(f'{self.path.name}.progress')
+        self.lock_path = self.path.with_name(f'{self.path.name}.lock')
+        self.items_done = 0
+        self.rows = 0
+        self._fingerprint = None
+        self._writer = None
+        self._lock_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def locked(self):
+        return self._lock_file is not None
+
+    def acquire(self):
+        """Take the lock without waiting; False if another holds it."""
+        if self.locked:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if fcntl is None:
+            try:
+                descriptor = os.open(
+                    self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                return False
+            self._lock_file = os.fdopen(descriptor, 'w')
+            return True
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # The holder may have discarded the checkpoint, lock file
+            # included, between our open and flock.
+            if os.fstat(lock_file.fileno()).st_ino != \
+                    os.stat(self.lock_path).st_ino:
+                raise BlockingIOError()
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def release(self):
+        if self._lock_file is None:
+            return
+        if fcntl is None:
+            self._lock_file.close()
+            self.lock_path.unlink(missing_ok=True)
+        else:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+        self._lock_file = None
+
+    def _load_progress(self):
+        try:
+            return json.loads(self.progress_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    def open(self, fingerprint=None, resume=True):
+        """Open for appending; return the number of items already done."""
+        self.close()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        progress = self._load_progress() if resume else None
+        if (
+            progress is not None
+            and progress.get('fingerprint') == fingerprint
+            and self.path.exists()
+            and self.path.stat().st_size >= progress['size']
+        ):
+            self._writer = ColumnarEmissionsWriter.resume(
+                self.path, progress['size'])
+            self.items_done = progress['items_done']
+            self.rows = progress['rows']
+        else:
+            self.progress_path.unlink(missing_ok=True)
+            self._writer = ColumnarEmissionsWriter(self.path)
+            self.items_done = 0
+            self.rows = 0
+        self._fingerprint = fingerprint
+        return self.items_done
+
+    def commit(self, rows, items_done):
+        """Append ``rows`` and record ``items_done`` items as completed."""
+        self._writer.append(rows)
+        self.items_done = items_done
+        self.rows += len(rows)
+        progress = {
+            'fingerprint': self._fingerprint,
+            'items_done': self.items_done,
+            'rows': self.rows,
+            'size': self._writer.size,
+        }
+        tmp_path = self.progress_path.with_name(
+            f'{self.progress_path.name}.{os.getpid()}.tmp')
+        tmp_path.write_text(json.dumps(progress), encoding='utf-8')
+        os.replace(tmp_path, self.progress_path)
+
+    def iter_rows(self):
+        """Yield the committed rows, in order.
+
+        Rows appended after the last commit are left out.
+        """
+        if not self.rows:
+            return iter(())
+        return islice(iter_columnar_emissions(self.path), self.rows)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def discard(self):
+        """Close and remove the checkpoint files, lock included.
+
+        Return False, leaving the files, when another calculation holds
+        the lock.
+        """
+        self.close()
+        if not self.acquire():
+            return False
+        self.path.unlink(missing_ok=True)
+        self.progress_path.unlink(missing_ok=True)
+        if fcntl is not None:
+            self.lock_path.unlink(missing_ok=True)
+        self.release()
+        return True
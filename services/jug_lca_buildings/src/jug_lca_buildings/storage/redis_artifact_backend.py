@@ -0,0 +1,381 @@
+"""Shared artifact cache tier spoken over the Redis protocol (RESP)."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import socket
+import threading
+from urllib.parse import unquote, urlparse
+
+from . import artifact_codecs
+from .artifact_backends import ArtifactBackend
+
+logger = logging.getLogger(__name__)
+
+_shared_backends = {}
+_shared_backends_lock = threading.Lock()
+
+
+class RespError(Exception):
+    """Error reply returned by the Redis server."""
+
+
+class RespConnection:
+    """Minimal blocking RESP2 client supporting pipelined commands."""
+
+    def __init__(self, host, port, db=0, password=None, timeout=2.0):
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._sock.makefile('rb')
+        if password:
+            self.execute('AUTH', password)
+        if db:
+            self.execute('SELECT', db)
+
+    @staticmethod
+    def _encode(args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode('utf-8')
+            elif isinstance(arg, int):
+                arg = str(arg).encode('ascii')
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(parts)
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise ConnectionError('Connection closed by Redis server')
+        prefix, payload = line[:1], line[1:-2]
+        if prefix == b'+':
+            return payload.decode('utf-8')
+        if prefix == b'-':
+            return RespError(payload.decode('utf-8'))
+        if prefix == b':':
+            return int(payload)
+        if prefix == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if prefix == b'*':
+            length = int(payload)
+            if length < 0:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise ConnectionError(f'Unexpected RESP reply prefix {prefix!r}')
+
+    def pipeline(self, commands):
+        """Send all commands in one write and return their replies."""
+        if not commands:
+            return []
+        self._sock.sendall(b''.join(self._encode(cmd) for cmd in commands))
+        return [self._read_reply() for _ in commands]
+
+    def execute(self, *args):
+        reply = self.pipeline([args])[0]
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
+
+    def close(self):
+        try:
+            self._reader.close()
+        finally:
+            self._sock.close()
+
+
+class RedisArtifactBackend(ArtifactBackend):
+    """Store compressed artifacts in Redis with a TTL.
+
+    Blobs that are not already compressed are gzip-compressed before they
+    are sent; readers detect the encoding from the blob itself.
+
+    Keys look like ``<prefix>:<request_hash>:<artifact>``; metadata uses the
+    ``metadata`` suffix and shared blobs ``<prefix>:blob:<digest>``. Stale
+    namespaces are never scanned here: entries simply expire after
+    ``ttl_seconds``.
+    """
+
+    DEFAULT_KEY_PREFIX = 'jug_lca_buildings'
+    DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+    def __init__(self, url, ttl_seconds=None, key_prefix=None, timeout=2.0):
+        parsed = urlparse(url)
+        if parsed.scheme not in ('redis', 'tcp'):
+            raise ValueError(f'Unsupported Redis URL scheme in {url!r}')
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.db = int((parsed.path or '/0').lstrip('/') or 0)
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.ttl_seconds = ttl_seconds or self.DEFAULT_TTL_SECONDS
+        self.key_prefix = key_prefix or self.DEFAULT_KEY_PREFIX
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+        connection = RespConnection(
+            self.host, self.port, db=self.db, password=self.password,
+            timeout=self.timeout)
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    def _pipeline(self, commands):
+        try:
+            replies = self._connection().pipeline(commands)
+        except (OSError, ConnectionError):
+            self.close()
+            raise
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            self._local.connection = None
+            connection.close()
+
+    def _key(self, request_hash, artifact):
+        return f'{self.key_prefix}:{request_hash}:{artifact}'
+
+    @staticmethod
+    def _pack(blob):
+        if artifact_codecs.detect_encoding(blob) != artifact_codecs.IDENTITY:
+            return blob
+        return artifact_codecs.encode(blob, artifact_codecs.GZIP)
+
+    def read(self, request_hash, artifact):
+        return self._pipeline(
+            [('GET', self._key(request_hash, artifact))])[0]
+
+    def exists(self, request_hash, artifact):
+        return bool(self._pipeline(
+            [('EXISTS', self._key(request_hash, artifact))])[0])
+
+    def read_many(self, request_hashes, artifact):
+        """Fetch one artifact for many hashes with a single MGET."""
+        if not request_hashes:
+            return {}
+        keys = [self._key(request_hash, artifact)
+                for request_hash in request_hashes]
+        values = self._pipeline([('MGET', *keys)])[0]
+        return dict(zip(request_hashes, values, strict=True))
+
+    def write(self, request_hash, artifacts, metadata, defaults=None):
+        merged = dict(defaults or {})
+        merged.update(self.read_metadata(request_hash) or {})
+        merged.update(metadata)
+        commands = [
+            ('SET', self._key(request_hash, artifact), self._pack(blob),
+             'EX', self.ttl_seconds)
+            for artifact, blob in artifacts.items()
+        ]
+        commands.append(
+            ('SET', self._key(request_hash, 'metadata'),
+             self._pack(json.dumps(merged, sort_keys=True).encode('utf-8')),
+             'EX', self.ttl_seconds)
+        )
+        self._pipeline(commands)
+
+    def read_metadata(self, request_hash):
+        blob = self.read(request_hash, 'metadata')
+        if blob is None:
+            return None
+        return json.loads(artifact_codecs.decode(blob))
+
+    def increment_request_count(self, request_hash, requested_at_utc):
+        metadata = self.read_metadata(request_hash)
+        if metadata is None:
+            return
+        metadata['request_count'] = metadata.get('request_count', 1) + 1
+        metadata['last_requested_at_utc'] = requested_at_utc
+        self.write(request_hash, {}, metadata)
+
+    def iter_metadata(self):
+        return iter(())
+
+    def summarize(self):
+        return {
+            'artifacts': None,
+            'oldest_created_at_utc': None,
+            'newest_created_at_utc': None,
+        }
+
+    def delete(self, request_hash):
+        self._pipeline([(
+            'DEL',
+            *(self._key(request_hash, artifact)
+              for artifact in (*self.ARTIFACT_NAMES, 'metadata')),
+        )])
+
+    def _blob_key(self, digest):
+        return f'{self.key_prefix}:blob:{digest}'
+
+    def missing_blobs(self, digests):
+        """Refresh the TTL of stored blobs and return the missing ones.
+
+        Refreshing keeps blobs alive at least as long as a manifest that is
+        about to reference them.
+        """
+        replies = self._pipeline([
+            ('EXPIRE', self._blob_key(digest), self.ttl_seconds)
+            for digest in digests
+        ])
+        return [
+            digest for digest, found in zip(digests, replies, strict=True)
+            if not found
+        ]
+
+    def write_blobs(self, blobs):
+        self._pipeline([
+            ('SET', self._blob_key(digest), self._pack(blob),
+             'EX', self.ttl_seconds)
+            for digest, blob in blobs.items()
+        ])
+
+    def read_blobs(self, digests):
+        digests = list(digests)
+        if not digests:
+            return {}
+        values = self._pipeline(
+            [('MGET', *(self._blob_key(digest) for digest in digests))])[0]
+        return dict(zip(digests, values, strict=True))
+
+    def iter_blob_digests(self, created_before=None):
+        return iter(())
+
+    def delete_blobs(self, digests, created_before=None):
+        # Unreferenced blobs expire with their TTL.
+        return 0
+
+
+class TieredArtifactBackend(ArtifactBackend):
+    """Local backend first, shared backend as the second-level cache.
+
+    Shared-tier failures are logged and treated as misses so an unreachable
+    Redis never fails a request. Shared hits are copied into the local tier.
+    """
+
+    def __init__(self, local, shared):
+        self.local = local
+        self.shared = shared
+
+    def _shared_call(self, operation, *args, default=None):
+        try:
+            return getattr(self.shared, operation)(*args)
+        except (OSError, ConnectionError, RespError) as e:
+            logger.warning(
+                'shared_artifact_cache_unavailable',
+                extra={'operation': operation, 'error': str(e)},
+            )
+            return default
+
+    def _backfill(self, request_hash, artifacts):
+        metadata = self._shared_call('read_metadata', request_hash) or {}
+        metadata.setdefault('request_hash', request_hash)
+        self.local.write(request_hash, artifacts, metadata)
+
+    def read(self, request_hash, artifact):
+        blob = self.local.read(request_hash, artifact)
+        if blob is not None:
+            return blob
+        blob = self._shared_call('read', request_hash, artifact)
+        if blob is not None:
+            self._backfill(request_hash, {artifact: blob})
+        return blob
+
+    def exists(self, request_hash, artifact):
+        # As read, an artifact another node stored is found in Redis.
+        return self.local.exists(request_hash, artifact) or bool(
+            self._shared_call(
+                'exists', request_hash, artifact, default=False))
+
+    def read_many(self, request_hashes, artifact):
+        found = self.local.read_many(request_hashes, artifact)
+        missing = [h for h, blob in found.items() if blob is None]
+        if missing:
+            shared = self._shared_call(
+                'read_many', missing, artifact, default={})
+            for request_hash, blob in shared.items():
+                if blob is not None:
+                    self._backfill(request_hash, {artifact: blob})
+                    found[request_hash] = blob
+        return found
+
+    def write(self, request_hash, artifacts, metadata, defaults=None):
+        self.local.write(request_hash, artifacts, metadata, defaults)
+        self._shared_call(
+            'write', request_hash, artifacts, metadata, defaults)
+
+    def read_metadata(self, request_hash):
+        metadata = self.local.read_metadata(request_hash)
+        if metadata is None:
+            metadata = self._shared_call('read_metadata', request_hash)
+        return metadata
+
+    def increment_request_count(self, request_hash, requested_at_utc):
+        self.local.increment_request_count(request_hash, requested_at_utc)
+
+    def iter_metadata(self):
+        return self.local.iter_metadata()
+
+    def iter_stale_metadata(self, cache_namespace):
+        return self.local.iter_stale_metadata(cache_namespace)
+
+    def summarize(self):
+        return self.local.summarize()
+
+    def delete(self, request_hash):
+        self.local.delete(request_hash)
+        self._shared_call('delete', request_hash)
+
+    def missing_blobs(self, digests):
+        missing = set(self.local.missing_blobs(digests))
+        missing.update(
+            self._shared_call('missing_blobs', digests, default=()))
+        return [digest for digest in digests if digest in missing]
+
+    def write_blobs(self, blobs):
+        self.local.write_blobs(blobs)
+        self._shared_call('write_blobs', blobs)
+
+    def read_blobs(self, digests):
+        found = self.local.read_blobs(digests)
+        missing = [digest for digest, blob in found.items() if blob is None]
+        if missing:
+            shared = self._shared_call('read_blobs', missing, default={})
+            backfill = {
+                digest: blob for digest, blob in shared.items()
+                if blob is not None
+            }
+            if backfill:
+                self.local.write_blobs(backfill)
+                found.update(backfill)
+        return found
+
+    def iter_blob_digests(self, created_before=None):
+        return self.local.iter_blob_digests(created_before)
+
+    def delete_blobs(self, digests, created_before=None):
+        return self.local.delete_blobs(digests, created_before)
+
+
+def build_shared_artifact_backend(url, ttl_seconds=None):
+    """Return the process-wide RedisArtifactBackend for ``url``."""
+    key = (url, ttl_seconds)
+    with _shared_backends_lock:
+        backend = _shared_backends.get(key)
+        if backend is None:
+            backend = _shared_backends[key] = RedisArtifactBackend(
+                url, ttl_seconds=ttl_seconds)
+    return backend
@@ -0,0 +1,108 @@
+import socketserver
+import threading
+import time
+
+# In-process server speaking enough of the Redis protocol (RESP2) to test
+# the shared artifact cache tier without a live Redis.
+
+
+class _FakeRedisHandler(socketserver.StreamRequestHandler):
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        count = int(line[1:-2])
+        args = []
+        for _ in range(count):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    @staticmethod
+    def _bulk(value):
+        if value is None:
+            return b'$-1\r\n'
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+
+    def handle(self):
+        server = self.server
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            server.commands.append([args[0].upper()] + args[1:])
+            reply = server.dispatch(args[0].upper().decode(), args[1:])
+            self.wfile.write(reply)
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _FakeRedisHandler)
+        self.data = {}
+        self.expires_at = {}
+        self.commands = []
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return f'redis://{host}:{port}/0'
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def _get(self, key):
+        expires_at = self.expires_at.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires_at.pop(key, None)
+        return self.data.get(key)
+
+    def dispatch(self, command, args):
+        with self._lock:
+            if command in ('PING', 'SELECT', 'AUTH'):
+                return b'+OK\r\n'
+            if command == 'GET':
+                return _FakeRedisHandler._bulk(self._get(args[0]))
+            if command == 'EXISTS':
+                return b':%d\r\n' % sum(
+                    self._get(key) is not None for key in args)
+            if command == 'MGET':
+                values = [self._get(key) for key in args]
+                return b'*%d\r\n' % len(values) + b''.join(
+                    _FakeRedisHandler._bulk(value) for value in values)
+            if command == 'SET':
+                key, value = args[0], args[1]
+                self.data[key] = value
+                self.expires_at.pop(key, None)
+                if len(args) >= 4 and args[2].upper() == b'EX':
+                    self.expires_at[key] = time.monotonic() + int(args[3])
+                return b'+OK\r\n'
+            if command == 'TTL':
+                if self._get(args[0]) is None:
+                    return b':-2\r\n'
+                expires_at = self.expires_at.get(args[0])
+                if expires_at is None:
+                    return b':-1\r\n'
+                return b':%d\r\n' % int(expires_at - time.monotonic())
+            if command == 'EXPIRE':
+                if self._get(args[0]) is None:
+                    return b':0\r\n'
+                self.expires_at[args[0]] = time.monotonic() + int(args[1])
+                return b':1\r\n'
+            if command == 'DEL':
+                removed = 0
+                for key in args:
+                    removed += self.data.pop(key, None) is not None
+                    self.expires_at.pop(key, None)
+                return b':%d\r\n' % removed
+            return b'-ERR unknown command\r\n'
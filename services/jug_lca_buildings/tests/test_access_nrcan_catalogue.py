@@ -41,6 +41,23 @@ class TestAccessNRCANCatalog(TestCase):
                     self.catalog.year_to_period_of_construction(year), 
                     expected)
                 
+    def test_year_to_period_matches_period_bounds(self):
+        periods = {}
+        for archetype in self.catalog.archetypes['archetypes']:
+            first, last = archetype['period_of_construction'].split('_')
+            periods[archetype['period_of_construction']] = \
+                (int(first), int(last))
+
+        for year in range(900, 3100):
+            expected = next(
+                (period for period, (first, last) in periods.items()
+                 if first <= year <= last),
+                None)
+            with self.subTest(year=year):
+                self.assertEqual(
+                    self.catalog.year_to_period_of_construction(year),
+                    expected)
+
     def test_layers_outdoors_wall(self):
         result = self.catalog.layers('1000_1900_4', 'OutdoorsWall')
         self.assertEqual(result, {
@@ -0,0 +1,224 @@
+import asyncio
+import io
+import json
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import ANY, patch
+
+from starlette.testclient import TestClient
+
+from src.jug_lca_buildings.asgi import (
+    ComputePool,
+    ComputePoolSaturated,
+    create_asgi_app,
+)
+from tests.test_emissions_api import _build_test_app
+
+WORKFLOW_PATH = (
+    'src.jug_lca_buildings.application.jug_lca_buildings.LCACarbonWorkflow'
+)
+
+
+def _thread_executor(pool):
+    # Mocks do not cross process boundaries, so tests run jobs in threads.
+    return ThreadPoolExecutor(max_workers=pool.max_workers)
+
+
+@patch.object(ComputePool, '_build_executor', _thread_executor)
+class TestAsgiEmissionsApi(unittest.TestCase):
+    def setUp(self):
+        self._artifacts_tmpdir = tempfile.TemporaryDirectory()
+        self._env_patcher = patch.dict(
+            os.environ,
+            {'JUG_LCA_ARTIFACTS_DIR': self._artifacts_tmpdir.name},
+        )
+        self._env_patcher.start()
+        self.flask_client = _build_test_app().test_client()
+        self.pool = ComputePool(max_workers=1, max_pending=1)
+        self.client = TestClient(create_asgi_app(
+            _build_test_app(), compute_pool=self.pool))
+        self.valid_payload = {
+            'type': 'FeatureCollection',
+            'features': [{
+                'type': 'Feature',
+                'id': 1,
+                'geometry': {
+                    'type': 'Polygon',
+                    'coordinates': [[
+                        [-73.57, 45.5], [-73.56, 45.5],
+                        [-73.56, 45.51], [-73.57, 45.5],
+                    ]],
+                },
+                'properties': {
+                    'name': 'Building 1',
+                    'address': '123 Test St',
+                    'function': 'Residential',
+                    'height': 12.5,
+                    'year_of_construction': 1995,
+                },
+            }],
+        }
+        self.workflow_result = [{
+            'opening_embodied_emissions': 1.0,
+            'envelope_embodied_emissions': 2.0,
+            'component_embodied_emissions': 3.0,
+            'opening_end_of_life_emissions': 4.0,
+            'envelope_end_of_life_emissions': 5.0,
+            'component_end_of_life_emissions': 6.0,
+        }]
+
+    def tearDown(self):
+        self.client.close()
+        self.pool.shutdown()
+        self._env_patcher.stop()
+        self._artifacts_tmpdir.cleanup()
+
+    @patch(WORKFLOW_PATH)
+    def test_post_emissions_json_contract(self, workflow_cls_mock):
+        workflow_cls_mock.return_value.export_emissions.return_value = (
+            self.workflow_result
+        )
+
+        response = self.client.post(
+            '/emissions',
+            json=self.valid_payload,
+            headers={'Accept-Encoding': 'identity'},
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), self.workflow_result)
+        request_hash = response.headers['X-Request-Hash']
+        self.assertEqual(response.headers['ETag'], f'W/"{request_hash}"')
+        self.assertIn('X-Request-ID', response.headers)
+        workflow_cls_mock.assert_called_once_with(
+            self.valid_payload,
+            'nrcan_archetypes.json',
+            'nrcan_constructions_cap_3.json',
+            checkpoint=ANY,
+        )
+
+        # Routes not handled natively are served by the Flask app.
+        fetched = self.client.get(f'/emissions/{request_hash}')
+        self.assertEqual(fetched.status_code, 200)
+        self.assertEqual(fetched.json(), self.workflow_result)
+
+    @patch(WORKFLOW_PATH)
+    def test_post_emissions_csv_export_is_compressed(self, workflow_cls_mock):
+        workflow_cls_mock.return_value.export_emissions.return_value = (
+            self.workflow_result
+        )
+
+        response = self.client.post(
+            '/emissions?export=csv',
+            json=self.valid_payload,
+            headers={'Accept-Encoding': 'gzip'},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(
+            response.headers['Content-Type'].startswith('text/csv'))
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn(
+            'attachment; filename=', response.headers['Content-Disposition'])
+        self.assertIn('Building 1', response.text)
+
+    @patch(WORKFLOW_PATH)
+    def test_post_emissions_upload_multipart_contract(
+        self,
+        workflow_cls_mock,
+    ):
+        workflow_cls_mock.return_value.export_emissions.return_value = (
+            self.workflow_result
+        )
+        upload = io.BytesIO(json.dumps(self.valid_payload).encode('utf-8'))
+
+        response = self.client.post(
+            '/emissions/upload',
+            files={'geojson_file': ('city.geojson', upload)},
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), self.workflow_result)
+
+    def test_errors_match_flask_responses(self):
+        cases = [
+            ('/emissions?export=pdf', {'json': self.valid_payload}),
+            ('/emissions', {'json': {'type': 'FeatureCollection'}}),
+            ('/emissions', {
+                'content': b'{bad',
+                'headers': {'Content-Type': 'application/json'},
+            }),
+            ('/emissions/upload', {}),
+            ('/emissions/upload', {
+                'files': {'geojson_file': ('city.geojson', b'{bad')},
+            }),
+            ('/emissions/upload', {
+                'files': {'geojson_file': ('city.geojson', b'{"type": 1}')},
+            }),
+        ]
+        for path, kwargs in cases:
+            with self.subTest(path=path, kwargs=kwargs):
+                response = self.client.post(path, **kwargs)
+                flask_kwargs = dict(kwargs)
+                if 'content' in flask_kwargs:
+                    flask_kwargs['data'] = flask_kwargs.pop('content')
+                if 'files' in flask_kwargs:
+                    flask_kwargs['data'] = {
+                        name: (io.BytesIO(content), filename)
+                        for name, (filename, content)
+                        in flask_kwargs.pop('files').items()
+                    }
+                    flask_kwargs['content_type'] = 'multipart/form-data'
+                expected = self.flask_client.post(path, **flask_kwargs)
+
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.json(), expected.get_json())
+
+    @patch(WORKFLOW_PATH)
+    def test_saturated_pool_answers_503(self, workflow_cls_mock):
+        with patch.object(
+                ComputePool, 'run',
+                side_effect=ComputePoolSaturated('full')):
+            response = self.client.post('/emissions', json=self.valid_payload)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['code'], 503)
+        self.assertIn('Retry-After', response.headers)
+        workflow_cls_mock.assert_not_called()
+
+
+class TestComputePool(unittest.TestCase):
+    @patch.object(ComputePool, '_build_executor', _thread_executor)
+    def test_rejects_work_beyond_workers_and_queue(self):
+        pool = ComputePool(max_workers=1, max_pending=1)
+        release = threading.Event()
+
+        async def scenario():
+            running = [
+                asyncio.ensure_future(pool.run(release.wait))
+                for _ in range(2)
+            ]
+            await asyncio.sleep(0)
+            self.assertEqual(pool.in_flight, 2)
+            with self.assertRaises(ComputePoolSaturated):
+                await pool.run(release.wait)
+            release.set()
+            return await asyncio.gather(*running)
+
+        self.assertEqual(asyncio.run(scenario()), [True, True])
+        self.assertEqual(pool.in_flight, 0)
+        pool.shutdown()
+
+    def test_runs_in_worker_processes(self):
+        pool = ComputePool(max_workers=1)
+        try:
+            self.assertEqual(asyncio.run(pool.run(pow, 2, 10)), 1024)
+        finally:
+            pool.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
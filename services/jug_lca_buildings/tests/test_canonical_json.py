@@ -0,0 +1,84 @@
+import hashlib
+import json
+from unittest import TestCase
+
+from src.jug_lca_buildings.storage.canonical_json import (
+    canonical_sha256,
+    iter_canonical_json,
+)
+
+
+def _reference(obj):
+    return json.dumps(
+        obj,
+        sort_keys=True,
+        separators=(',', ':'),
+        ensure_ascii=False,
+    )
+
+
+class TestCanonicalJson(TestCase):
+    def setUp(self):
+        self.request_city = {
+            'type': 'FeatureCollection',
+            'features': [
+                {
+                    'type': 'Feature',
+                    'id': index,
+                    'geometry': {
+                        'type': 'Polygon',
+                        'coordinates': [[[-73.57 + index, 45.5],
+                                         [-73.56, 45.51e-3],
+                                         [-73.57, 45.5]]],
+                    },
+                    'properties': {
+                        'name': f'Bâtiment «{index}» ☃',
+                        'address': 'Rue "Saint-Denis"\n\t\\',
+                        'function': '1000',
+                        'height': 12.5 if index else 1e21,
+                        'year_of_construction': 1995,
+                        'flags': [True, False, None],
+                        'empty': {},
+                    },
+                }
+                for index in range(5)
+            ],
+        }
+
+    def test_matches_json_dumps(self):
+        cases = [
+            self.request_city,
+            {'cache_namespace': 'ns', 'request_city': self.request_city},
+            {'b': [], 'a': [[], {}], 'c': (1, 2.0, -0.0)},
+            {1: 'int key', 2.5: 'float key'},
+            [float('nan'), float('inf'), -float('inf')],
+            'plain \x00 string',
+            42,
+        ]
+        for obj in cases:
+            for chunk_depth in (0, 1, 3, 10):
+                with self.subTest(obj=obj, chunk_depth=chunk_depth):
+                    self.assertEqual(
+                        ''.join(iter_canonical_json(obj, chunk_depth)),
+                        _reference(obj),
+                    )
+
+    def test_sha256_is_compatible_with_existing_keys(self):
+        payload = {'cache_namespace': 'ns', 'request_city': self.request_city}
+        self.assertEqual(
+            canonical_sha256(payload),
+            hashlib.sha256(_reference(payload).encode('utf-8')).hexdigest(),
+        )
+
+    def test_large_payload_is_streamed_in_feature_batches(self):
+        feature = self.request_city['features'][1]
+        request_city = {
+            'type': 'FeatureCollection',
+            'features': [dict(feature, id=index) for index in range(2000)],
+        }
+        chunks = list(iter_canonical_json(request_city))
+        self.assertEqual(''.join(chunks), _reference(request_city))
+        self.assertLess(
+            max(len(chunk) for chunk in chunks),
+            len(_reference(request_city)) // 4,
+        )
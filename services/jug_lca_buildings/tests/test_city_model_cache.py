@@ -0,0 +1,86 @@
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import Mock
+
+from src.jug_lca_buildings.lca_carbon_workflow import LCACarbonWorkflow
+from src.jug_lca_buildings.storage.city_model_cache import CityModelCache
+
+
+class TestCityModelCache(TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.city_path = os.path.join(self._tmpdir.name, 'city.geojson')
+        with open(self.city_path, 'w', encoding='utf-8') as city_file:
+            city_file.write('{"type": "FeatureCollection", "features": []}')
+        self.building_parameters = ('height', 'year_of_construction',
+                                    'function')
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_put_and_get_round_trip(self):
+        cache = CityModelCache(max_bytes=1024 * 1024)
+        city = {'buildings': [{'name': 'Building 1', 'height': 12.5}]}
+
+        self.assertTrue(cache.put('key', city))
+        restored = cache.get('key')
+
+        self.assertEqual(restored, city)
+        self.assertIsNot(restored, city)
+        self.assertIsNone(cache.get('missing'))
+
+    def test_key_depends_on_content_and_catalog(self):
+        key = CityModelCache.build_key(
+            self.city_path, 'nrcan', self.building_parameters)
+
+        self.assertEqual(
+            key,
+            CityModelCache.build_key(
+                self.city_path, 'nrcan', self.building_parameters))
+        self.assertNotEqual(
+            key,
+            CityModelCache.build_key(
+                self.city_path, 'nrel', self.building_parameters))
+
+        with open(self.city_path, 'a', encoding='utf-8') as city_file:
+            city_file.write(' ')
+        self.assertNotEqual(
+            key,
+            CityModelCache.build_key(
+                self.city_path, 'nrcan', self.building_parameters))
+
+    def test_evicts_least_recently_used_when_full(self):
+        probe = CityModelCache(max_bytes=1024 * 1024)
+        probe.put('probe', list(range(50)))
+        cache = CityModelCache(max_bytes=probe.size_bytes * 2)
+
+        cache.put('first', list(range(50)))
+        cache.put('second', list(range(50, 100)))
+        cache.get('first')
+        cache.put('third', list(range(100, 150)))
+
+        self.assertIn('first', cache)
+        self.assertNotIn('second', cache)
+        self.assertIn('third', cache)
+        self.assertLessEqual(cache.size_bytes, cache.max_bytes)
+
+    def test_disabled_cache_stores_nothing(self):
+        cache = CityModelCache(max_bytes=0)
+
+        self.assertFalse(cache.enabled)
+        self.assertFalse(cache.put('key', {'buildings': []}))
+        self.assertEqual(len(cache), 0)
+
+    def test_workflow_skips_city_build_on_cache_hit(self):
+        test_lca_wf = object.__new__(LCACarbonWorkflow)
+        test_lca_wf.file_path = self.city_path
+        test_lca_wf.handler = 'nrcan'
+        test_lca_wf.city_cache = CityModelCache(max_bytes=1024 * 1024)
+        test_lca_wf._build_city = Mock(return_value={'buildings': []})
+
+        first = test_lca_wf._load_city(self.building_parameters)
+        second = test_lca_wf._load_city(self.building_parameters)
+
+        test_lca_wf._build_city.assert_called_once()
+        self.assertEqual(first, second)
@@ -1,9 +1,10 @@
+import gzip
 import io
 import json
 import os
 import tempfile
 import unittest
-from unittest.mock import patch
+from unittest.mock import ANY, patch
 
 from flask import Flask
 from flask_smorest import Api
@@ -93,8 +94,16 @@ class TestEmissionsApi(unittest.TestCase):
         workflow_cls_mock.assert_called_once_with(
             self.valid_payload,
             'nrcan_archetypes.json',
-            'nrcan_constructions_cap_3.json'
+            'nrcan_constructions_cap_3.json',
+            checkpoint=ANY,
         )
+        # Progress is checkpointed per request and dropped once saved.
+        checkpoint = workflow_cls_mock.call_args.kwargs['checkpoint']
+        self.assertEqual(
+            checkpoint.path.name,
+            f'{response.headers["X-Request-Hash"]}.lcaem',
+        )
+        self.assertFalse(checkpoint.path.exists())
 
     @patch(
         'src.jug_lca_buildings.application.jug_lca_buildings.LCACarbonWorkflow'
@@ -183,7 +192,8 @@ class TestEmissionsApi(unittest.TestCase):
         workflow_cls_mock.assert_called_once_with(
             self.valid_payload,
             'nrcan_archetypes.json',
-            'nrcan_constructions_cap_3.json'
+            'nrcan_constructions_cap_3.json',
+            checkpoint=ANY,
         )
 
     def test_post_emissions_upload_invalid_json_file(self):
@@ -234,3 +244,129 @@ class TestEmissionsApi(unittest.TestCase):
         self.assertEqual(response.status_code, 422)
         self.assertIn('Invalid GeoJSON payload',
                       response.get_data(as_text=True))
+
+    @patch(
+        'src.jug_lca_buildings.application.jug_lca_buildings.LCACarbonWorkflow'
+    )
+    def test_post_emissions_honours_accept_encoding(self, workflow_cls_mock):
+        workflow_cls_mock.return_value.export_emissions.return_value = (
+            self.workflow_result
+        )
+
+        response = self.client.post(
+            '/emissions',
+            json=self.valid_payload,
+            headers={'Accept-Encoding': 'gzip'},
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.headers.get('Content-Encoding'), 'gzip')
+        self.assertIn('Accept-Encoding', response.headers.get('Vary', ''))
+        self.assertEqual(
+            json.loads(gzip.decompress(response.get_data())),
+            self.workflow_result,
+        )
+
+        plain_response = self.client.post(
+            '/emissions',
+            json=self.valid_payload,
+        )
+        self.assertIsNone(plain_response.headers.get('Content-Encoding'))
+        self.assertEqual(plain_response.get_json(), self.workflow_result)
+
+    @patch(
+        'src.jug_lca_buildings.application.jug_lca_buildings.LCACarbonWorkflow'
+    )
+    def test_post_emissions_csv_export_compressed(self, workflow_cls_mock):
+        workflow_cls_mock.return_value.export_emissions.return_value = (
+            self.workflow_result
+        )
+
+        response = self.client.post(
+            '/emissions?export=csv',
+            json=self.valid_payload,
+            headers={'Accept-Encoding': 'br, gzip;q=0.8'},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/csv')
+        self.assertEqual(response.headers.get('Content-Encoding'), 'gzip')
+        csv_body = gzip.decompress(response.get_data()).decode('utf-8')
+        self.assertIn('Building 1', csv_body)
+
+    @patch(
+        'src.jug_lca_buildings.application.jug_lca_buildings.LCACarbonWorkflow'
+    )
+    def test_get_emissions_by_request_hash(self, workflow_cls_mock):
+        workflow_cls_mock.return_value.export_emissions.return_value = (
+            self.workflow_result
+        )
+        post_response = self.client.post('/emissions', json=self.valid_payload)
+        request_hash = post_response.headers['X-Request-Hash']
+        etag = post_response.headers['ETag']
+        self.assertEqual(etag, f'W/"{request_hash}"')
+
+        response = self.client.get(f'/emissions/{request_hash}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), self.workflow_result)
+        self.assertEqual(response.headers['ETag'], etag)
+
+        not_modified = self.client.get(
+            f'/emissions/{request_hash}',
+            headers={'If-None-Match': etag},
+        )
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.get_data(), b'')
+        workflow_cls_mock.assert_called_once()
+
+    @patch(
+        'src.jug_lca_buildings.application.jug_lca_buildings.LCACarbonWorkflow'
+    )
+    def test_get_csv_report_by_request_hash(self, workflow_cls_mock):
+        workflow_cls_mock.return_value.export_emissions.return_value = (
+            self.workflow_result
+        )
+        request_hash = self.client.post(
+            '/emissions', json=self.valid_payload
+        ).headers['X-Request-Hash']
+
+        # The report is built from the cached result on first fetch.
+        response = self.client.get(f'/emissions/{request_hash}/report.csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/csv')
+        self.assertIn(request_hash[:12], response.headers['Content-Disposition'])
+        self.assertIn('Building 1', response.get_data(as_text=True))
+
+        compressed = self.client.get(
+            f'/emissions/{request_hash}/report.csv',
+            headers={'Accept-Encoding': 'gzip'},
+        )
+        self.assertEqual(compressed.headers.get('Content-Encoding'), 'gzip')
+        self.assertEqual(
+            gzip.decompress(compressed.get_data()).decode('utf-8'),
+            response.get_data(as_text=True),
+        )
+
+        not_modified = self.client.get(
+            f'/emissions/{request_hash}/report.csv',
+            headers={'If-None-Match': f'W/"{request_hash}"'},
+        )
+        self.assertEqual(not_modified.status_code, 304)
+        workflow_cls_mock.assert_called_once()
+
+    def test_get_unknown_request_hash(self):
+        for path in ('/emissions/' + 'a' * 64,
+                     '/emissions/' + 'a' * 64 + '/report.csv',
+                     '/emissions/not-a-hash'):
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, 404)
+
+    def test_unknown_request_hash_is_not_revalidated(self):
+        request_hash = 'a' * 64
+        for path in (f'/emissions/{request_hash}',
+                     f'/emissions/{request_hash}/report.csv'):
+            with self.subTest(path=path):
+                response = self.client.get(
+                    path, headers={'If-None-Match': f'W/"{request_hash}"'})
+                self.assertEqual(response.status_code, 404)
@@ -0,0 +1,403 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+from src.jug_lca_buildings.application import EmissionsApplicationService
+from src.jug_lca_buildings.storage import (
+    EmissionsArtifactStore,
+    FilesystemArtifactBackend,
+    SqliteArtifactBackend,
+)
+
+
+class TestEmissionsArtifactStore(TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.base_dir = Path(self._tmpdir.name) / 'artifacts'
+        self.request_city = {
+            'type': 'FeatureCollection',
+            'features': [{'type': 'Feature', 'id': 1}],
+        }
+        self.emissions_data = [{'component_embodied_emissions': 3.0}]
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _copy_catalogs(self):
+        catalogs_dir = Path(self._tmpdir.name) / 'catalogs'
+        shutil.copytree(EmissionsArtifactStore.CATALOGS_DIR, catalogs_dir)
+        return catalogs_dir
+
+    def test_namespace_follows_catalog_content_and_code_version(self):
+        catalogs_dir = self._copy_catalogs()
+        namespace = EmissionsArtifactStore.build_cache_namespace(catalogs_dir)
+
+        self.assertTrue(namespace.startswith(
+            EmissionsArtifactStore.CACHE_NAMESPACE_PREFIX))
+        self.assertEqual(
+            namespace,
+            EmissionsArtifactStore.build_cache_namespace(
+                EmissionsArtifactStore.CATALOGS_DIR),
+        )
+        self.assertNotEqual(
+            namespace,
+            EmissionsArtifactStore.build_cache_namespace(
+                catalogs_dir, code_version='test'),
+        )
+
+        materials = catalogs_dir / 'nrcan_materials_dictionaries.json'
+        materials.write_text(materials.read_text() + '\n')
+        EmissionsArtifactStore._namespaces.clear()
+        self.assertNotEqual(
+            namespace,
+            EmissionsArtifactStore.build_cache_namespace(catalogs_dir),
+        )
+
+    def test_request_hash_changes_with_namespace(self):
+        old_store = EmissionsArtifactStore(
+            self.base_dir, cache_namespace='old')
+        new_store = EmissionsArtifactStore(self.base_dir)
+
+        self.assertNotEqual(
+            old_store.build_request_hash(self.request_city),
+            new_store.build_request_hash(self.request_city),
+        )
+
+    def test_sweep_removes_only_stale_artifacts(self):
+        old_store = EmissionsArtifactStore(
+            self.base_dir, cache_namespace='old')
+        new_store = EmissionsArtifactStore(self.base_dir)
+        old_hash = old_store.build_request_hash(self.request_city)
+        new_hash = new_store.build_request_hash(self.request_city)
+        old_store.save_emissions_data(
+            old_hash, self.request_city, self.emissions_data)
+        new_store.save_emissions_data(
+            new_hash, self.request_city, self.emissions_data)
+
+        stale = list(new_store.iter_stale_artifacts())
+        removed = new_store.sweep_stale_artifacts()
+
+        self.assertEqual([m['request_hash'] for m in stale], [old_hash])
+        self.assertEqual(removed, 1)
+        self.assertFalse((self.base_dir / old_hash).exists())
+        self.assertEqual(
+            new_store.load_emissions_data(new_hash), self.emissions_data)
+
+    def test_maintenance_is_claimed_once_per_namespace(self):
+        store = EmissionsArtifactStore(self.base_dir)
+
+        self.assertTrue(store.claim_stale_artifact_maintenance())
+        self.assertFalse(store.claim_stale_artifact_maintenance())
+        self.assertTrue(
+            EmissionsArtifactStore(
+                self.base_dir, cache_namespace='next'
+            ).claim_stale_artifact_maintenance()
+        )
+
+    def test_maintenance_claim_expires_unless_completed(self):
+        store = EmissionsArtifactStore(self.base_dir)
+        marker = self.base_dir / f'.maintenance_{store.cache_namespace}'
+        self.assertTrue(store.claim_stale_artifact_maintenance())
+        expired = marker.stat().st_mtime - (
+            EmissionsArtifactStore.MAINTENANCE_CLAIM_TTL_SECONDS + 1)
+
+        # A claim whose worker stopped without completing it is retried.
+        os.utime(marker, (expired, expired))
+        self.assertTrue(store.claim_stale_artifact_maintenance())
+        self.assertFalse(store.claim_stale_artifact_maintenance())
+
+        store.complete_stale_artifact_maintenance()
+        os.utime(marker, (expired, expired))
+        self.assertFalse(store.claim_stale_artifact_maintenance())
+
+    def test_interleaved_claimants_keep_one_claim(self):
+        store_a = EmissionsArtifactStore(self.base_dir)
+        store_b = EmissionsArtifactStore(self.base_dir)
+        marker = self.base_dir / f'.maintenance_{store_a.cache_namespace}'
+        self.assertTrue(store_a.claim_stale_artifact_maintenance())
+        expired = marker.stat().st_mtime - (
+            EmissionsArtifactStore.MAINTENANCE_CLAIM_TTL_SECONDS + 1)
+        os.utime(marker, (expired, expired))
+        claim_expired = EmissionsArtifactStore._maintenance_claim_expired
+        claims_of_b = []
+
+        def b_claims_meanwhile(path):
+            if path != marker:
+                # A has renamed the expired claim away; B claims anew and
+                # its worker renews the claim A is holding.
+                claims_of_b.append(
+                    store_b.claim_stale_artifact_maintenance())
+                self.assertTrue(path.exists())
+                os.utime(path)
+            return claim_expired(path)
+
+        with patch.object(
+                EmissionsArtifactStore, '_maintenance_claim_expired',
+                side_effect=b_claims_meanwhile):
+            self.assertFalse(store_a.claim_stale_artifact_maintenance())
+
+        self.assertEqual(claims_of_b, [True])
+        # B's claim is kept, not overwritten by the one A puts back.
+        self.assertEqual(
+            [path.name for path in self.base_dir.glob('.maintenance_*')],
+            [marker.name])
+        self.assertTrue(store_b.renew_stale_artifact_maintenance())
+        marker.unlink()
+        self.assertFalse(store_a.renew_stale_artifact_maintenance())
+
+    @patch(
+        'src.jug_lca_buildings.application.jug_lca_buildings.LCACarbonWorkflow'
+    )
+    def test_refresh_warms_up_most_requested_stale_artifacts(
+            self, workflow_cls_mock):
+        workflow_cls_mock.return_value.export_emissions.return_value = (
+            self.emissions_data
+        )
+        popular_city = dict(self.request_city, name='popular')
+        old_store = EmissionsArtifactStore(
+            self.base_dir, cache_namespace='old')
+        for city in (self.request_city, popular_city):
+            old_store.save_emissions_data(
+                old_store.build_request_hash(city), city, self.emissions_data)
+        old_store.record_cache_hit(old_store.build_request_hash(popular_city))
+
+        with patch.dict(
+                os.environ, {'JUG_LCA_ARTIFACTS_DIR': str(self.base_dir)}):
+            summary = EmissionsApplicationService.refresh_stale_artifacts(
+                warm_up_top=1)
+            new_store = EmissionsArtifactStore()
+
+        self.assertEqual(summary, {'warmed_up': 1, 'swept': 2, 'orphan_blobs': 0})
+        workflow_cls_mock.assert_called_once()
+        self.assertEqual(
+            workflow_cls_mock.call_args.args[0], popular_city)
+        self.assertIsNotNone(new_store.load_emissions_data(
+            new_store.build_request_hash(popular_city)))
+        self.assertIsNone(new_store.load_emissions_data(
+            new_store.build_request_hash(self.request_city)))
+
+
+class TestArtifactBackends(TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.request_city = {
+            'type': 'FeatureCollection',
+            'features': [{'type': 'Feature', 'id': 1}],
+        }
+        self.emissions_data = [{'component_embodied_emissions': 3.0}]
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _stores(self):
+        for backend_cls in (FilesystemArtifactBackend, SqliteArtifactBackend):
+            base_dir = Path(self._tmpdir.name) / backend_cls.__name__
+            yield backend_cls, EmissionsArtifactStore(
+                base_dir, backend=backend_cls(base_dir))
+
+    def test_round_trip_and_metadata(self):
+        for backend_cls, store in self._stores():
+            with self.subTest(backend=backend_cls.__name__):
+                request_hash = store.build_request_hash(self.request_city)
+                self.assertIsNone(store.load_emissions_data(request_hash))
+
+                store.save_emissions_data(
+                    request_hash, self.request_city, self.emissions_data)
+                created_at = store.load_metadata(request_hash)[
+                    'created_at_utc']
+                store.save_csv_report(request_hash, 'a,b\n1,2\n')
+                store.record_cache_hit(request_hash)
+
+                self.assertEqual(
+                    store.load_emissions_data(request_hash),
+                    self.emissions_data)
+                self.assertEqual(
+                    store.load_request_city(request_hash), self.request_city)
+                self.assertEqual(
+                    store.load_csv_report(request_hash), 'a,b\n1,2\n')
+                metadata = store.load_metadata(request_hash)
+                self.assertEqual(metadata['request_hash'], request_hash)
+                self.assertEqual(
+                    metadata['cache_namespace'], store.cache_namespace)
+                self.assertTrue(metadata['has_csv_report'])
+                self.assertEqual(metadata['records'], 1)
+                self.assertEqual(metadata['request_count'], 2)
+                self.assertEqual(metadata['created_at_utc'], created_at)
+                self.assertEqual(store.summarize()['artifacts'], 1)
+
+    def test_csv_report_without_emissions_creates_metadata(self):
+        for backend_cls, store in self._stores():
+            with self.subTest(backend=backend_cls.__name__):
+                store.save_csv_report('abc', 'a\n')
+
+                metadata = store.load_metadata('abc')
+                self.assertTrue(metadata['has_csv_report'])
+                self.assertEqual(
+                    metadata['cache_namespace'], store.cache_namespace)
+
+    def test_stale_sweep(self):
+        for backend_cls, store in self._stores():
+            with self.subTest(backend=backend_cls.__name__):
+                old_store = EmissionsArtifactStore(
+                    store.base_dir, cache_namespace='old',
+                    backend=store.backend)
+                old_hash = old_store.build_request_hash(self.request_city)
+                new_hash = store.build_request_hash(self.request_city)
+                old_store.save_emissions_data(
+                    old_hash, self.request_city, self.emissions_data)
+                store.save_emissions_data(
+                    new_hash, self.request_city, self.emissions_data)
+
+                self.assertEqual(store.sweep_stale_artifacts(), 1)
+                self.assertIsNone(old_store.load_emissions_data(old_hash))
+                self.assertIsNotNone(store.load_emissions_data(new_hash))
+
+    def _city(self, feature_ids):
+        return {
+            'type': 'FeatureCollection',
+            'features': [
+                {'type': 'Feature', 'id': feature_id,
+                 'properties': {'name': f'Building {feature_id}'}}
+                for feature_id in feature_ids
+            ],
+        }
+
+    def test_request_features_are_deduplicated(self):
+        for backend_cls, store in self._stores():
+            with self.subTest(backend=backend_cls.__name__):
+                first_city = self._city(range(10))
+                second_city = self._city(range(5, 15))
+                for city in (first_city, second_city):
+                    store.save_emissions_data(
+                        store.build_request_hash(city),
+                        city,
+                        self.emissions_data,
+                    )
+
+                self.assertEqual(
+                    len(set(store.backend.iter_blob_digests())), 15)
+                second_hash = store.build_request_hash(second_city)
+                self.assertEqual(
+                    store.load_request_city(second_hash), second_city)
+                self.assertEqual(
+                    list(store.iter_request_features(second_hash)),
+                    second_city['features'])
+                self.assertIsNone(store.iter_request_features('missing'))
+
+    def test_legacy_request_payload_is_readable(self):
+        for backend_cls, store in self._stores():
+            with self.subTest(backend=backend_cls.__name__):
+                store.backend.write(
+                    'legacy',
+                    {'request': json.dumps(self.request_city).encode()},
+                    {'request_hash': 'legacy'},
+                )
+
+                self.assertEqual(
+                    store.load_request_city('legacy'), self.request_city)
+                self.assertEqual(
+                    list(store.iter_request_features('legacy')),
+                    self.request_city['features'])
+
+    def test_orphan_blobs_are_collected(self):
+        for backend_cls, store in self._stores():
+            with self.subTest(backend=backend_cls.__name__):
+                kept_city = self._city(range(3))
+                dropped_city = self._city(range(2, 6))
+                for city in (kept_city, dropped_city):
+                    store.save_emissions_data(
+                        store.build_request_hash(city),
+                        city,
+                        self.emissions_data,
+                    )
+                store.delete_artifact(store.build_request_hash(dropped_city))
+
+                self.assertEqual(store.collect_orphan_blobs(), 0)
+                with patch.object(store, 'BLOB_GC_GRACE_SECONDS', -60):
+                    self.assertEqual(store.collect_orphan_blobs(), 3)
+                self.assertEqual(
+                    store.load_request_city(
+                        store.build_request_hash(kept_city)),
+                    kept_city)
+
+    def test_orphan_blobs_reused_during_collection_are_kept(self):
+        for backend_cls, store in self._stores():
+            with self.subTest(backend=backend_cls.__name__):
+                city = self._city(range(10, 13))
+                request_hash = store.build_request_hash(city)
+                store.save_emissions_data(
+                    request_hash, city, self.emissions_data)
+                store.delete_artifact(request_hash)
+                time.sleep(0.01)
+                iter_metadata = store.backend.iter_metadata
+
+                def save_while_collecting():
+                    # The save reuses the orphaned blobs after they were
+                    # listed, before its manifest is written.
+                    entries = list(iter_metadata())
+                    store.backend.missing_blobs(
+                        list(store.backend.iter_blob_digests()))
+                    yield from entries
+
+                with patch.object(store, 'BLOB_GC_GRACE_SECONDS', 0), \
+                        patch.object(store.backend, 'iter_metadata',
+                                     save_while_collecting):
+                    self.assertEqual(store.collect_orphan_blobs(), 0)
+                store.save_emissions_data(
+                    request_hash, city, self.emissions_data)
+                self.assertEqual(store.load_request_city(request_hash), city)
+
+    def test_sqlite_backend_uses_wal_journal(self):
+        backend = SqliteArtifactBackend(Path(self._tmpdir.name) / 'wal')
+
+        journal_mode = backend._connection().execute(
+            'PRAGMA journal_mode').fetchone()[0]
+
+        self.assertEqual(journal_mode, 'wal')
+        backend.close()
+
+    def test_unknown_backend_name_is_rejected(self):
+        with self.assertRaises(ValueError):
+            EmissionsArtifactStore(self._tmpdir.name, backend='tape')
+
+    def test_artifacts_are_compressed_and_legacy_plain_files_readable(self):
+        base_dir = Path(self._tmpdir.name) / 'compressed'
+        store = EmissionsArtifactStore(base_dir, backend='filesystem')
+        request_hash = store.build_request_hash(self.request_city)
+        store.save_emissions_data(
+            request_hash, self.request_city, self.emissions_data)
+
+        emissions_path = base_dir / request_hash / 'emissions.json'
+        self.assertEqual(
+            json.loads(gzip.decompress(emissions_path.read_bytes())),
+            self.emissions_data)
+
+        emissions_path.write_text(json.dumps(self.emissions_data))
+        self.assertEqual(
+            store.load_emissions_data(request_hash), self.emissions_data)
+
+    def test_encoded_artifact_is_served_as_stored(self):
+        store = EmissionsArtifactStore(
+            Path(self._tmpdir.name) / 'encoded', backend='filesystem')
+        store.save_csv_report('abc', 'a,b\n1,2\n')
+        stored = store.backend.read('abc', 'csv')
+
+        body, encoding = store.load_encoded_artifact(
+            'abc', 'csv', lambda name: name == 'gzip')
+        self.assertEqual((body, encoding), (stored, 'gzip'))
+
+        body, encoding = store.load_encoded_artifact(
+            'abc', 'csv', lambda name: False)
+        self.assertEqual((body, encoding), (b'a,b\n1,2\n', None))
+        self.assertIsNone(
+            store.load_encoded_artifact('missing', 'csv', lambda name: True))
+
+    def test_unknown_compression_is_rejected(self):
+        with self.assertRaises(ValueError):
+            EmissionsArtifactStore(self._tmpdir.name, compression='lz4')
@@ -0,0 +1,234 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from src.jug_lca_buildings.application.jug_lca_buildings import \
+    EmissionsApplicationService
+from src.jug_lca_buildings.lca_carbon_workflow import LCACarbonWorkflow
+from src.jug_lca_buildings.lca_chunked_workflow import \
+    ChunkedLCACarbonWorkflow
+from src.jug_lca_buildings.storage.city_model_cache import CityModelCache
+from src.jug_lca_buildings.storage.emissions_artifact_store import \
+    EmissionsArtifactStore
+from src.jug_lca_buildings.storage.emissions_checkpoint import \
+    EmissionsCheckpoint
+from tests.test_lca_chunked_workflow import make_city
+
+
+class Crash(Exception):
+    pass
+
+
+class TestEmissionsCheckpoint(TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmpdir.name, 'ckpt', 'job.lcaem')
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_resume_continues_after_committed_items(self):
+        with EmissionsCheckpoint(self.path) as checkpoint:
+            self.assertEqual(checkpoint.open(fingerprint='a'), 0)
+            checkpoint.commit([{'x': 1.0}, {'x': 2.0}], 2)
+            checkpoint.commit([], 3)
+
+        checkpoint = EmissionsCheckpoint(self.path)
+        self.assertEqual(checkpoint.open(fingerprint='a'), 3)
+        checkpoint.commit([{'x': 3.0}], 4)
+        checkpoint.close()
+
+        self.assertEqual(
+            list(checkpoint.iter_rows()),
+            [{'x': 1.0}, {'x': 2.0}, {'x': 3.0}])
+
+    def test_uncommitted_write_is_cut_on_resume(self):
+        checkpoint = EmissionsCheckpoint(self.path)
+        checkpoint.open()
+        checkpoint.commit([{'x': 1.0}], 1)
+        checkpoint.close()
+        # A block written after the last progress record.
+        with open(self.path, 'ab') as data_file:
+            data_file.write(b'\x05\x00\x00\x00\x00\x00\x00\x00partial')
+
+        self.assertEqual(checkpoint.open(), 1)
+        checkpoint.commit([{'x': 2.0}], 2)
+        checkpoint.close()
+
+        self.assertEqual(list(checkpoint.iter_rows()),
+                         [{'x': 1.0}, {'x': 2.0}])
+
+    def test_other_fingerprint_or_no_resume_starts_over(self):
+        checkpoint = EmissionsCheckpoint(self.path)
+        checkpoint.open(fingerprint='chunk_size=5')
+        checkpoint.commit([{'x': 1.0}], 5)
+        checkpoint.close()
+
+        self.assertEqual(checkpoint.open(fingerprint='chunk_size=10'), 0)
+        checkpoint.close()
+        self.assertEqual(list(checkpoint.iter_rows()), [])
+
+        checkpoint.open(fingerprint='chunk_size=10')
+        checkpoint.commit([{'x': 1.0}], 10)
+        self.assertEqual(
+            checkpoint.open(fingerprint='chunk_size=10', resume=False), 0)
+        checkpoint.discard()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(checkpoint.progress_path.exists())
+
+    def test_rows_past_the_last_commit_are_not_read(self):
+        checkpoint = EmissionsCheckpoint(self.path)
+        checkpoint.open()
+        checkpoint.commit([{'x': 1.0}], 1)
+        # A block appended but not yet committed.
+        checkpoint._writer.append([{'x': 2.0}])
+        checkpoint.close()
+
+        self.assertEqual(list(checkpoint.iter_rows()), [{'x': 1.0}])
+
+    def test_lock_is_exclusive_and_guards_discard(self):
+        owner = EmissionsCheckpoint(self.path)
+        other = EmissionsCheckpoint(self.path)
+        self.assertTrue(owner.acquire())
+        owner.open()
+        owner.commit([{'x': 1.0}], 1)
+        owner.close()
+
+        self.assertFalse(other.acquire())
+        self.assertFalse(other.discard())
+        self.assertTrue(os.path.exists(self.path))
+
+        owner.release()
+        self.assertTrue(other.discard())
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(other.lock_path.exists())
+        self.assertTrue(owner.acquire())
+        owner.release()
+
+
+class TestResumedWorkflows(TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.city_path = os.path.join(self._tmpdir.name, 'city.geojson')
+        with open(self.city_path, 'w', encoding='utf-8') as city_file:
+            json.dump(make_city(12), city_file)
+        self.checkpoint_path = os.path.join(self._tmpdir.name, 'job.lcaem')
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def build_workflow(self, checkpoint=None):
+        workflow = LCACarbonWorkflow(
+            self.city_path,
+            'nrcan_archetypes.json',
+            'nrcan_constructions_cap_3.json',
+            city_cache=CityModelCache(0),
+            checkpoint=checkpoint,
+        )
+        workflow.progress_log_every = 4
+        return workflow
+
+    def test_workflow_resumes_from_last_checkpoint(self):
+        expected = self.build_workflow().export_emissions()
+
+        interrupted = self.build_workflow(
+            EmissionsCheckpoint(self.checkpoint_path))
+        calculate = interrupted.calculate_building_component_emission
+        calls = []
+
+        def crash_at_building_ten(building):
+            calls.append(building)
+            if len(calls) == 10:
+                raise Crash()
+            return calculate(building)
+
+        interrupted.calculate_building_component_emission = \
+            crash_at_building_ten
+        with self.assertRaises(Crash):
+            interrupted.export_emissions()
+
+        resumed = self.build_workflow(
+            EmissionsCheckpoint(self.checkpoint_path))
+        calculate = resumed.calculate_building_component_emission
+        resumed_calls = []
+        resumed.calculate_building_component_emission = \
+            lambda building: resumed_calls.append(building) or \
+            calculate(building)
+        result = resumed.export_emissions()
+
+        # Buildings 1-8 were committed at the progress step of building 8.
+        self.assertEqual(len(resumed_calls), 4)
+        self.assertEqual(json.dumps(result), json.dumps(expected))
+
+    def test_chunked_workflow_resumes_from_last_chunk(self):
+        expected = ChunkedLCACarbonWorkflow(
+            self.city_path,
+            'nrcan_archetypes.json',
+            'nrcan_constructions_cap_3.json',
+            chunk_size=5,
+        ).export_emissions()
+
+        calculate = ChunkedLCACarbonWorkflow._calculate_chunk
+        calculated = []
+
+        def crash_on_third_chunk(workflow, features):
+            calculated.append(len(features))
+            if len(calculated) == 3:
+                raise Crash()
+            return calculate(workflow, features)
+
+        with patch.object(ChunkedLCACarbonWorkflow, '_calculate_chunk',
+                          crash_on_third_chunk):
+            with self.assertRaises(Crash):
+                ChunkedLCACarbonWorkflow(
+                    self.city_path,
+                    'nrcan_archetypes.json',
+                    'nrcan_constructions_cap_3.json',
+                    chunk_size=5,
+                    checkpoint=EmissionsCheckpoint(self.checkpoint_path),
+                ).export_emissions()
+
+        resumed_chunks = []
+
+        def record_chunk(workflow, features):
+            resumed_chunks.append(len(features))
+            return calculate(workflow, features)
+
+        with patch.object(ChunkedLCACarbonWorkflow, '_calculate_chunk',
+                          record_chunk):
+            result = ChunkedLCACarbonWorkflow(
+                self.city_path,
+                'nrcan_archetypes.json',
+                'nrcan_constructions_cap_3.json',
+                chunk_size=5,
+                checkpoint=EmissionsCheckpoint(self.checkpoint_path),
+            ).export_emissions()
+
+        # Only the last chunk (features 11-12) is calculated again.
+        self.assertEqual(resumed_chunks, [2])
+        self.assertEqual(json.dumps(result), json.dumps(expected))
+
+    def test_locked_checkpoint_is_left_to_its_owner(self):
+        with open(self.city_path, encoding='utf-8') as city_file:
+            request_city = json.load(city_file)
+        artifacts_dir = os.path.join(self._tmpdir.name, 'artifacts')
+        with patch.dict(os.environ, {'JUG_LCA_ARTIFACTS_DIR': artifacts_dir}):
+            path = EmissionsArtifactStore().checkpoint_path('job')
+            owner = EmissionsCheckpoint(path)
+            self.assertTrue(owner.acquire())
+            owner.open()
+            owner.commit([{'x': 1.0}], 1)
+            owner.close()
+
+            result = EmissionsApplicationService.run_workflow(
+                request_city, request_hash='job')
+            self.assertEqual(len(result), 12)
+            # The owner's checkpoint is neither resumed nor removed.
+            self.assertEqual(list(owner.iter_rows()), [{'x': 1.0}])
+            owner.release()
+
+            EmissionsApplicationService.run_workflow(
+                request_city, request_hash='job')
+            self.assertFalse(path.exists())
@@ -0,0 +1,55 @@
+import csv
+import io
+from unittest import TestCase
+
+from src.jug_lca_buildings.reporting import EmissionsReportExporter
+
+
+class TestEmissionsReportExporter(TestCase):
+    def setUp(self):
+        self.request_city = {'features': [
+            {'id': 1, 'properties': {'name': 'Building 1'}},
+            {'id': 2, 'properties': {'name': 'Building 2'}},
+        ]}
+        self.emissions_data = [
+            {
+                'opening_embodied_emissions': 1.0,
+                'envelope_embodied_emissions': 2.0,
+                'component_embodied_emissions': 3.0,
+                'opening_end_of_life_emissions': 0.1,
+                'envelope_end_of_life_emissions': 0.2,
+                'component_end_of_life_emissions': 0.3,
+            }
+            for _ in self.request_city['features']
+        ]
+
+    def _rows(self, emissions_data):
+        return list(csv.DictReader(io.StringIO(
+            EmissionsReportExporter.build_csv_text(
+                self.request_city, emissions_data))))
+
+    def test_columns_without_stages(self):
+        rows = self._rows(self.emissions_data)
+
+        self.assertEqual(
+            list(rows[0]), EmissionsReportExporter.CSV_COLUMNS)
+        self.assertEqual(rows[-1]['feature_id'], 'TOTAL')
+        self.assertAlmostEqual(float(rows[0]['total_lca_emissions']), 6.6)
+
+    def test_stage_columns_follow_the_json_results(self):
+        for result in self.emissions_data:
+            result['transport_to_site_emissions'] = 0.5
+            result['construction_installation_emissions'] = 0.25
+
+        rows = self._rows(self.emissions_data)
+
+        self.assertEqual(list(rows[0]), [
+            *EmissionsReportExporter.PROPERTY_COLUMNS,
+            *EmissionsReportExporter.METRIC_FIELDS,
+            'transport_to_site_emissions',
+            'construction_installation_emissions',
+            *EmissionsReportExporter.TOTAL_FIELDS,
+        ])
+        self.assertEqual(float(rows[0]['transport_to_site_emissions']), 0.5)
+        self.assertAlmostEqual(float(rows[0]['total_lca_emissions']), 7.35)
+        self.assertEqual(float(rows[-1]['transport_to_site_emissions']), 1.0)
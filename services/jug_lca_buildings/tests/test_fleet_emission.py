@@ -0,0 +1,88 @@
+from pathlib import Path
+from unittest import TestCase
+
+import numpy as np
+
+from src.jug_lca_buildings.life_cycle_assessment.fleet_emission \
+    import FleetEmission
+from src.jug_lca_buildings.life_cycle_assessment.machine import Machine
+from src.jug_lca_buildings.life_cycle_assessment.vehicle import Vehicle
+
+CATALOG_PATH = (
+    Path(__file__).resolve().parents[1]
+    / 'src' / 'jug_lca_buildings' / 'data' / 'fleet_catalog.example.json'
+)
+
+
+class TestFleetEmission(TestCase):
+    def setUp(self):
+        self.crane = Machine(1, 'Crane', 0.02, 'h/t', 12.0, 'L/h', 2.68,
+                             'kgCO2e/L')
+        self.loader = Machine(2, 'Loader', 0.015, 'h/t', 9.0, 'L/h', 2.68,
+                              'kgCO2e/L')
+        self.truck = Vehicle(1, 'Truck', 0.025, 'L/(t km)', 2.68,
+                             'kgCO2e/L')
+        self.fleet = FleetEmission(
+            [self.crane, self.loader],
+            [self.truck],
+            {
+                'transport_to_site': {
+                    'vehicles': [
+                        {'vehicle_id': 1, 'share': 1.0, 'distance_km': 50.0},
+                    ],
+                },
+                'construction_installation': {
+                    'machines': [
+                        {'machine_id': 1, 'share': 0.5},
+                        {'machine_id': 2, 'share': 1.0},
+                    ],
+                },
+            },
+        )
+
+    def test_stage_factors_combine_fleet_emissions(self):
+        np.testing.assert_allclose(self.fleet.stage_factors, [
+            50.0 * self.truck.total_vehicle_emission(),
+            0.5 * self.crane.total_machine_emssion()
+            + self.loader.total_machine_emssion(),
+        ])
+
+    def test_calculate_emissions_matches_per_building_loop(self):
+        workloads = [0.0, 1500.0, 240000.0]
+
+        result = self.fleet.calculate_emissions(workloads)
+
+        self.assertEqual(
+            list(result),
+            ['transport_to_site', 'construction_installation'])
+        for stage, factor in zip(
+                self.fleet.stages, self.fleet.stage_factors, strict=True):
+            np.testing.assert_allclose(
+                result[stage],
+                [workload / 1000 * factor for workload in workloads])
+
+    def test_calculate_emissions_without_buildings(self):
+        result = self.fleet.calculate_emissions([])
+
+        self.assertEqual(
+            {stage: emissions.shape for stage, emissions in result.items()},
+            {'transport_to_site': (0,), 'construction_installation': (0,)})
+
+    def test_unknown_fleet_member_is_rejected(self):
+        with self.assertRaisesRegex(ValueError, 'unknown machine 9'):
+            FleetEmission([self.crane], [], {
+                'construction_installation': {
+                    'machines': [{'machine_id': 9}],
+                },
+            })
+
+    def test_catalog_is_loaded_once(self):
+        fleet = FleetEmission.from_catalog(CATALOG_PATH)
+
+        self.assertIs(FleetEmission.from_catalog(CATALOG_PATH), fleet)
+        self.assertEqual(
+            fleet.stages,
+            ('transport_to_site',
+             'construction_installation',
+             'end_of_life_transport'))
+        self.assertTrue(np.all(fleet.stage_factors > 0))
@@ -1,5 +1,8 @@
 from unittest import TestCase
 from unittest.mock import Mock, patch, call
+
+import numpy as np
+
 from src.jug_lca_buildings.lca_carbon_workflow import LCACarbonWorkflow
 from tests.fixtures import (
     make_building, make_surface, make_boundary, make_layer, with_openings
@@ -12,6 +15,7 @@ class TestLCACarbonWorkflow(TestCase):
         # test_lca_wf wf is short for workflow. This is the test instance.
         self.test_lca_wf = object.__new__(LCACarbonWorkflow)
         self.test_lca_wf.nrcan_catalogs = Mock()
+        self.test_lca_wf.archetype_codes = {}
 
         # Material catalogs used by both envelope and opening paths
         materials = {
@@ -62,10 +66,8 @@ class TestLCACarbonWorkflow(TestCase):
             lambda window_type, opaque: windows[(window_type, opaque)]
 
     # eol is short for end-of-life
-    @patch('src.jug_lca_buildings.lca_carbon_workflow.EndOfLifeEmission')
     @patch('src.jug_lca_buildings.lca_carbon_workflow.EnvelopeEmission')
-    def test_calculate_envelope_emission(
-            self, envelope_emission_mock, envelope_eol_emission_mock):
+    def test_calculate_envelope_emission(self, envelope_emission_mock):
         # Arrange a boundary using the factory
         boundary = make_boundary(opaque_area=154.1857854127884)
 
@@ -79,30 +81,24 @@ class TestLCACarbonWorkflow(TestCase):
         envelope_emission_mock.side_effect = \
             envelope_emission_mock_constructor
 
-        def envelope_eol_emission_mock_constructor(
-                recycling_ratio,
-                onsite_recycling_ratio,
-                company_recycling_ratio,
-                landfilling_ratio,
-                workload):
-            mock = Mock()
-            mock.calculate_end_of_life_emission.return_value = 100.0 * workload
-            return mock
-        envelope_eol_emission_mock.side_effect = \
-            envelope_eol_emission_mock_constructor
+        # The catalog's precomputed EoL coefficient multiplies the workload
+        self.test_lca_wf.nrcan_catalogs.\
+            material_end_of_life_coefficient.return_value = 100.0
 
         # Test
-        layer_embodied, layer_eol = \
+        layer_embodied, layer_eol, workload = \
             self.test_lca_wf._calculate_envelope_emission(boundary)
 
         # Assert (no-mass skipped; 2 layers used)
         self.assertEqual(len(layer_embodied), 2)
         self.assertEqual(len(layer_eol), 2)
+        self.assertAlmostEqual(sum(layer_eol), 100.0 * workload)
+        self.test_lca_wf.nrcan_catalogs.\
+            material_end_of_life_coefficient.assert_has_calls(
+                [call('Cast Concrete'), call('Timber Flooring')])
 
-    @patch('src.jug_lca_buildings.lca_carbon_workflow.EndOfLifeEmission')
     @patch('src.jug_lca_buildings.lca_carbon_workflow.OpeningEmission')
-    def test_calculate_opening_emission_variants(
-            self, opening_emission_mock, opening_eol_emission_mock):
+    def test_calculate_opening_emission_variants(self, opening_emission_mock):
         # Shared boundary: two openings of 3.0 m² each;
         # boundary thickness drives EoL workload
         boundary = with_openings(
@@ -118,19 +114,9 @@ class TestLCACarbonWorkflow(TestCase):
             return mock
         opening_emission_mock.side_effect = opening_emission_mock_constructor
 
-        # EndOfLifeEmission returns
-        # 10 * workload so we can assert workload correctness
-        def opening_eol_emission_mock_constructor(
-                recycling_ratio,
-                onsite_recycling_ratio,
-                company_recycling_ratio,
-                landfilling_ratio,
-                workload):
-            mock = Mock()
-            mock.calculate_end_of_life_emission.return_value = 10.0 * workload
-            return mock
-        opening_eol_emission_mock.side_effect = \
-            opening_eol_emission_mock_constructor
+        # The EoL coefficient is 10, so we can assert workload correctness
+        self.test_lca_wf.nrcan_catalogs.\
+            transparent_surface_end_of_life_coefficient.return_value = 10.0
 
         cases = [
             # 1: year of construction
@@ -147,7 +133,6 @@ class TestLCACarbonWorkflow(TestCase):
             with self.subTest(year=year, surface_type=s_type):
                 # Reset per-case call histories
                 opening_emission_mock.reset_mock()
-                opening_eol_emission_mock.reset_mock()
                 self.test_lca_wf.nrcan_catalogs.\
                     search_transparent_surfaces.reset_mock()
 
@@ -156,7 +141,7 @@ class TestLCACarbonWorkflow(TestCase):
                                          year_of_construction=year,
                                          function='Residential')
 
-                opening_embodied, opening_eol = \
+                opening_embodied, opening_eol, workload = \
                     self.test_lca_wf._calculate_opening_emission(
                         building,
                         surface,
@@ -173,6 +158,9 @@ class TestLCACarbonWorkflow(TestCase):
                 self.test_lca_wf.nrcan_catalogs.\
                     search_transparent_surfaces.assert_called_with(
                      expected_ttype, opaque_code)
+                self.test_lca_wf.nrcan_catalogs.\
+                    transparent_surface_end_of_life_coefficient.\
+                    assert_called_with(expected_ttype, opaque_code)
 
                 # OpeningEmission called once per opening
                 # with the right factor & area
@@ -184,6 +172,7 @@ class TestLCACarbonWorkflow(TestCase):
                 w = 3.0 * 0.15 * 2579
                 self.assertAlmostEqual(opening_eol[0], 10.0 * w, places=6)
                 self.assertAlmostEqual(opening_eol[1], 10.0 * w, places=6)
+                self.assertAlmostEqual(workload, 2 * w, places=6)
 
     @patch.object(
         LCACarbonWorkflow, '_calculate_opening_emission', autospec=True)
@@ -225,9 +214,10 @@ class TestLCACarbonWorkflow(TestCase):
         # Envelope: lists per boundary (embodied list, eol list)
         def calc_envelope_emission_side_effect(self_obj, boundary):
             if boundary is boundary_with_openings:
-                return [10.0, 20.0], [1.0, 2.0]   # two massive layers
+                # two massive layers
+                return [10.0, 20.0], [1.0, 2.0], 300.0
             if boundary is boundary_without_openings:
-                return [5.0], [0.5]               # one massive layer
+                return [5.0], [0.5], 50.0         # one massive layer
             self.fail('Unexpected boundary')
         calc_envelope_emission_mock.side_effect = \
             calc_envelope_emission_side_effect
@@ -242,13 +232,13 @@ class TestLCACarbonWorkflow(TestCase):
             self.assertIs(boundary_arg, boundary_with_openings)
             self.assertEqual(opaque_code, '2020_3000_6')
             # embodied per opening, eol per opening
-            return [7.0, 8.0], [0.7, 0.8]
+            return [7.0, 8.0], [0.7, 0.8], 70.0
         calc_opening_emission_mock.side_effect = \
             calc_opening_emission_side_effect
 
         # --- Test
         env_sum, open_sum, comp_sum, \
-            env_eol_sum, open_eol_sum, comp_eol_sum = \
+            env_eol_sum, open_eol_sum, comp_eol_sum, workload = \
             self.test_lca_wf.calculate_building_component_emission(building)
 
         # --- assert catalog lookups (once per building)
@@ -281,6 +271,9 @@ class TestLCACarbonWorkflow(TestCase):
         self.assertAlmostEqual(open_eol_sum, 1.5, places=6)
         self.assertAlmostEqual(comp_eol_sum, 5.0, places=6)
 
+        # The material workload is collected from the same helpers
+        self.assertAlmostEqual(workload, 300.0 + 50.0 + 70.0, places=6)
+
     def test__export_emissions_formats_all_keys(self):
         # Arrange
         # Avoid running the real calculation
@@ -293,6 +286,10 @@ class TestLCACarbonWorkflow(TestCase):
         self.test_lca_wf.building_opening_end_of_life_emission = [20.0, 50.0]
         self.test_lca_wf.building_envelope_end_of_life_emission = [10.0, 40.0]
         self.test_lca_wf.building_component_end_of_life_emission = [30.0, 60.0]
+        self.test_lca_wf.building_stage_emissions = {
+            'transport_to_site': [0.5, 0.7],
+            'construction_installation': [0.2, 0.4],
+        }
 
         # Expected mapping from dict keys → source lists
         expected_map = {
@@ -308,6 +305,8 @@ class TestLCACarbonWorkflow(TestCase):
                 self.test_lca_wf.building_envelope_end_of_life_emission,
             'component_end_of_life_emissions':
                 self.test_lca_wf.building_component_end_of_life_emission,
+            'transport_to_site_emissions': [0.5, 0.7],
+            'construction_installation_emissions': [0.2, 0.4],
         }
 
         # Test
@@ -323,3 +322,113 @@ class TestLCACarbonWorkflow(TestCase):
                 self.assertIn(key, feature_dict)
                 # value matches
                 self.assertEqual(feature_dict[key], source_list[index])
+
+    def test_building_material_workload(self):
+        window_boundary = with_openings(
+            make_boundary(opaque_area=50.0), count=2, opening_area=2.5)
+        building = make_building(surfaces=[
+            make_surface([make_boundary(opaque_area=100.0)]),
+            make_surface([window_boundary]),
+        ])
+        catalogs = self.test_lca_wf.nrcan_catalogs
+        catalogs.find_opaque_surface.return_value = '1000_1900_8'
+        catalogs.material_end_of_life_coefficient.return_value = 1.0
+        catalogs.transparent_surface_end_of_life_coefficient.return_value = \
+            1.0
+
+        workload = self.test_lca_wf.calculate_building_component_emission(
+            building)[-1]
+
+        # Cast Concrete and Timber Flooring layers; the no-mass layer
+        # is skipped. Windows weigh 2579 kg/m3 at the wall's thickness.
+        layers_mass_per_m2 = 0.10 * 2000.0 + 0.01 * 650.0
+        expected = (
+            100.0 * layers_mass_per_m2 +
+            50.0 * layers_mass_per_m2 +
+            2 * 2.5 * window_boundary.thickness * 2579)
+        self.assertAlmostEqual(workload, expected)
+
+    def test_calculate_emission_adds_fleet_stages(self):
+        self.test_lca_wf.city = Mock(buildings=[
+            make_building(), make_building()])
+        self.test_lca_wf.progress_log_every = 100
+        self.test_lca_wf.checkpoint = None
+        for attribute in (
+                'building_envelope_emission',
+                'building_opening_emission',
+                'building_component_emission',
+                'building_envelope_end_of_life_emission',
+                'building_opening_end_of_life_emission',
+                'building_component_end_of_life_emission',
+                'building_material_workload'):
+            setattr(self.test_lca_wf, attribute, [])
+        self.test_lca_wf.calculate_building_component_emission = Mock(
+            side_effect=[
+                (1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 1000.0),
+                (1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 3000.0),
+            ])
+        self.test_lca_wf.fleet_emission = Mock()
+        self.test_lca_wf.fleet_emission.calculate_emissions.return_value = {
+            'transport_to_site': np.array([3.0, 9.0]),
+        }
+
+        self.test_lca_wf.calculate_emission()
+
+        self.test_lca_wf.fleet_emission.calculate_emissions\
+            .assert_called_once_with([1000.0, 3000.0])
+        self.assertEqual(
+            self.test_lca_wf.building_stage_emissions,
+            {'transport_to_site': [3.0, 9.0]})
+        self.assertEqual(
+            self.test_lca_wf.building_component_emission, [3.0, 3.0])
+
+    def test_calculate_emission_without_fleet_catalog(self):
+        self.test_lca_wf.city = Mock(buildings=[make_building()])
+        self.test_lca_wf.progress_log_every = 100
+        self.test_lca_wf.checkpoint = None
+        for attribute in (
+                'building_envelope_emission',
+                'building_opening_emission',
+                'building_component_emission',
+                'building_envelope_end_of_life_emission',
+                'building_opening_end_of_life_emission',
+                'building_component_end_of_life_emission',
+                'building_material_workload'):
+            setattr(self.test_lca_wf, attribute, [])
+        self.test_lca_wf.building_stage_emissions = {}
+        self.test_lca_wf.calculate_building_component_emission = Mock(
+            return_value=(1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 1000.0))
+        self.test_lca_wf.fleet_emission = None
+
+        self.test_lca_wf.calculate_emission()
+
+        self.assertEqual(self.test_lca_wf.building_stage_emissions, {})
+        self.assertEqual(
+            self.test_lca_wf.building_material_workload, [1000.0])
+
+    def test_resolve_archetypes_once_per_function_and_year(self):
+        buildings = [
+            make_building(function='residential', year_of_construction=1950),
+            make_building(function='residential', year_of_construction=1950),
+            make_building(function='office', year_of_construction=1950),
+            make_building(function='residential', year_of_construction=2021),
+            make_building(function='office', year_of_construction=1950),
+        ]
+        catalogs = self.test_lca_wf.nrcan_catalogs
+        catalogs.hub_to_nrcan_function.side_effect = str.title
+        catalogs.year_to_period_of_construction.side_effect = str
+        catalogs.find_opaque_surface.side_effect = \
+            lambda function, period, zone: f'{function}_{period}_{zone}'
+
+        distinct = self.test_lca_wf.resolve_archetypes(buildings)
+
+        self.assertEqual(distinct, 3)
+        self.assertEqual(catalogs.find_opaque_surface.call_count, 3)
+        self.assertEqual(self.test_lca_wf.archetype_codes, {
+            ('residential', 1950): 'Residential_1950_6',
+            ('office', 1950): 'Office_1950_6',
+            ('residential', 2021): 'Residential_2021_6',
+        })
+        self.assertEqual(
+            self.test_lca_wf._archetype_code(buildings[4]), 'Office_1950_6')
+        self.assertEqual(catalogs.find_opaque_surface.call_count, 3)
@@ -0,0 +1,213 @@
+import json
+import os
+import tempfile
+import tracemalloc
+from unittest import TestCase
+from unittest.mock import patch
+
+from src.jug_lca_buildings.lca_carbon_workflow import LCACarbonWorkflow
+from src.jug_lca_buildings.lca_chunked_workflow import \
+    ChunkedLCACarbonWorkflow
+from src.jug_lca_buildings.life_cycle_assessment.geojson_feature_stream \
+    import iter_feature_batches
+from src.jug_lca_buildings.storage.city_model_cache import CityModelCache
+from src.jug_lca_buildings.storage.columnar_emissions import (
+    ColumnarEmissionsWriter,
+    read_columnar_emissions,
+)
+
+
+def make_city(buildings):
+    features = []
+    for index in range(buildings):
+        x = -73.6 + (index % 10) * 0.001
+        y = 45.5 + (index // 10) * 0.001
+        ring = [[x, y], [x + 0.0003, y], [x + 0.0003, y + 0.0003],
+                [x, y + 0.0003], [x, y]]
+        features.append({
+            'type': 'Feature',
+            'id': index,
+            'properties': {
+                'height': 6 + index % 7 * 3,
+                'year_of_construction': (1890, 1975, 2005, 2021)[index % 4],
+                'function': ('1000', '5010', '6000')[index % 3],
+            },
+            'geometry': {'type': 'Polygon', 'coordinates': [ring]},
+        })
+    return {
+        'type': 'FeatureCollection',
+        'name': 'test city',
+        'features': features,
+    }
+
+
+class TestGeoJsonFeatureStream(TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.city_path = os.path.join(self._tmpdir.name, 'city.geojson')
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def write_city(self, content):
+        with open(self.city_path, 'w', encoding='utf-8') as city_file:
+            city_file.write(content)
+
+    def test_batches_match_parsed_features(self):
+        city = make_city(23)
+        city['crs'] = {'type': 'name', 'properties': {'name': 'EPSG:4326'}}
+        city['features'][3]['properties']['note'] = 'é ] } " ,'
+        self.write_city(json.dumps(city, indent=2, ensure_ascii=False))
+
+        # A tiny read size makes every value straddle buffer refills.
+        batches = list(iter_feature_batches(self.city_path, 5, read_size=7))
+
+        self.assertEqual([len(batch) for batch in batches], [5, 5, 5, 5, 3])
+        self.assertEqual(
+            [feature for batch in batches for feature in batch],
+            city['features'])
+
+    def test_escapes_straddling_refills(self):
+        city = make_city(3)
+        city['features'][1]['properties']['note'] = 'a\\"b\\\\"]}\\u00e9'
+        self.write_city(json.dumps(city) + '\n')
+
+        for read_size in (1, 2, 3):
+            self.assertEqual(
+                list(iter_feature_batches(
+                    self.city_path, 5, read_size=read_size)),
+                [city['features']])
+
+    def test_dict_source_is_sliced(self):
+        city = make_city(4)
+
+        self.assertEqual(
+            list(iter_feature_batches(city, 3)),
+            [city['features'][:3], city['features'][3:]])
+
+    def test_empty_and_invalid_inputs(self):
+        for content in ('{}', '{"type": "FeatureCollection"}',
+                        '{"features": []}'):
+            self.write_city(content)
+            self.assertEqual(list(iter_feature_batches(self.city_path, 2)),
+                             [])
+        for content in ('[]', '{"features": [{"a": 1}', '{"features": 3}',
+                        '{"features": []} {}', '{} x',
+                        '{"features": [{"a": [1}]}'):
+            self.write_city(content)
+            with self.assertRaises(ValueError):
+                list(iter_feature_batches(self.city_path, 2))
+
+    def test_peak_memory_is_bounded_by_batch(self):
+        city = make_city(10000)
+        self.write_city(json.dumps(city))
+        file_size = os.path.getsize(self.city_path)
+
+        tracemalloc.start()
+        try:
+            count = 0
+            for batch in iter_feature_batches(
+                    self.city_path, 20, read_size=64 * 1024):
+                count += len(batch)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(count, 10000)
+        self.assertLess(peak, file_size / 4)
+
+
+class TestColumnarEmissions(TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmpdir.name, 'emissions.lcaem')
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_round_trip_preserves_rows_and_order(self):
+        rows = [
+            {'opening': 0.1 * index, 'envelope': 1e300 / (index + 1),
+             'component': -0.0}
+            for index in range(7)
+        ]
+        with ColumnarEmissionsWriter(self.path) as writer:
+            writer.append(rows[:3])
+            writer.append([])
+            writer.append(rows[3:])
+
+        self.assertEqual(writer.rows_written, 7)
+        self.assertEqual(json.dumps(read_columnar_emissions(self.path)),
+                         json.dumps(rows))
+
+    def test_empty_output_is_readable(self):
+        with ColumnarEmissionsWriter(self.path):
+            pass
+
+        self.assertEqual(read_columnar_emissions(self.path), [])
+
+    def test_truncated_block_is_ignored(self):
+        rows = [{'a': 1.0, 'b': 2.0}]
+        with ColumnarEmissionsWriter(self.path) as writer:
+            writer.append(rows)
+            writer.append(rows)
+        with open(self.path, 'r+b') as columnar_file:
+            columnar_file.truncate(os.path.getsize(self.path) - 4)
+
+        self.assertEqual(read_columnar_emissions(self.path), rows)
+
+
+class TestChunkedLCACarbonWorkflow(TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.city_path = os.path.join(self._tmpdir.name, 'city.geojson')
+        with open(self.city_path, 'w', encoding='utf-8') as city_file:
+            json.dump(make_city(12), city_file)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_reproduces_export_emissions(self):
+        expected = LCACarbonWorkflow(
+            self.city_path,
+            'nrcan_archetypes.json',
+            'nrcan_constructions_cap_3.json',
+            city_cache=CityModelCache(0),
+        ).export_emissions()
+        output_path = os.path.join(self._tmpdir.name, 'emissions.lcaem')
+
+        chunked = ChunkedLCACarbonWorkflow(
+            self.city_path,
+            'nrcan_archetypes.json',
+            'nrcan_constructions_cap_3.json',
+            output_path=output_path,
+            chunk_size=5,
+        )
+        result = chunked.export_emissions()
+
+        self.assertEqual(chunked.chunks, 3)
+        self.assertEqual(len(result), 12)
+        self.assertEqual(json.dumps(result), json.dumps(expected))
+        # A caller-provided output file is kept.
+        self.assertEqual(read_columnar_emissions(output_path), expected)
+
+    def test_temporary_output_is_removed(self):
+        with patch.object(
+                ChunkedLCACarbonWorkflow,
+                '_calculate_chunk',
+                side_effect=lambda features: [
+                    {'component_embodied_emissions': float(feature['id'])}
+                    for feature in features]):
+            chunked = ChunkedLCACarbonWorkflow(
+                make_city(4),
+                'nrcan_archetypes.json',
+                'nrcan_constructions_cap_3.json',
+                chunk_size=3,
+            )
+            result = chunked.export_emissions()
+
+        self.assertEqual(
+            result,
+            [{'component_embodied_emissions': float(index)}
+             for index in range(4)])
+        self.assertFalse(chunked.output_path.exists())
@@ -1,8 +1,12 @@
+from pathlib import Path
 from unittest import TestCase
 from unittest.mock import MagicMock
 
+from src.jug_lca_buildings.life_cycle_assessment.access_nrcan_catalogue\
+    import AccessNrcanCatalog
 from src.jug_lca_buildings.life_cycle_assessment.lca_end_of_life_carbon\
-    import EndOfLifeEmission
+    import EndOfLifeEmission, end_of_life_coefficient
+from src.jug_lca_buildings.life_cycle_assessment.machine import Machine
 
 
 DEMOLITION = 4.3577325
@@ -52,3 +56,73 @@ class TestLCAEndOfLife(TestCase):
         self.lca_eol.onsite_recycling.assert_called_once()
         self.lca_eol.companies_recycling.assert_called_once()
         self.lca_eol.landfilling.assert_called_once()
+
+
+class TestEndOfLifeCoefficient(TestCase):
+    def setUp(self):
+        self.catalog = AccessNrcanCatalog(
+            Path(__file__).parent.parent / 'src' / 'jug_lca_buildings'
+            / 'data')
+        self.workloads = (0.0, 1.0, 13.0, 2579 * 0.3 * 4.2)
+
+    def _ratios(self, entry):
+        return (
+            entry['recycling_ratio'],
+            entry['onsite_recycling_ratio'],
+            entry['company_recycling_ratio'],
+            entry['landfilling_ratio'],
+        )
+
+    def test_coefficient_matches_class_for_every_catalog_entry(self):
+        entries = [
+            (name, entry, self.catalog.material_end_of_life_coefficient)
+            for name, entry in self.catalog.materials.items()
+            if not entry.get('no_mass')
+        ] + [
+            (name, entry,
+             lambda key: self.catalog.
+             transparent_surface_end_of_life_coefficient(
+                 *key.split('_', 1)))
+            for name, entry in self.catalog.transparent_surfaces.items()
+        ]
+        self.assertGreater(len(entries), 100)
+        for name, entry, coefficient in entries:
+            for workload in self.workloads:
+                with self.subTest(name=name, workload=workload):
+                    expected = EndOfLifeEmission(
+                        *self._ratios(entry), workload
+                    ).calculate_end_of_life_emission()
+                    self.assertAlmostEqual(
+                        coefficient(name) * workload, expected, delta=1e-9 *
+                        max(1.0, abs(expected)))
+
+    def test_machines_override_coefficients(self):
+        demolition = Machine(1, 'Excavator', 2.0, 'm3/h', 5.0, 'kWh',
+                             0.1, 'kgCO2/kWh')
+        landfilling = Machine(2, 'Loader', 1.5, 'm3/h', 4.0, 'kWh',
+                              0.2, 'kgCO2/kWh')
+        material = self.catalog.search_material('Cast Concrete')
+        default = self.catalog.material_end_of_life_coefficient(
+            'Cast Concrete')
+
+        self.catalog.set_end_of_life_machines(
+            demolition=demolition, landfilling=landfilling)
+
+        self.assertEqual(
+            self.catalog.end_of_life_machine_emissions['demolition'],
+            demolition.total_machine_emssion())
+        overridden = self.catalog.material_end_of_life_coefficient(
+            'Cast Concrete')
+        self.assertNotAlmostEqual(overridden, default)
+        expected = EndOfLifeEmission(
+            *self._ratios(material), 13.0,
+            demolition_machine_emission=demolition.total_machine_emssion(),
+            landfilling_machine_emission=landfilling.total_machine_emssion(),
+        ).calculate_end_of_life_emission()
+        self.assertAlmostEqual(overridden * 13.0, expected, places=9)
+        self.assertAlmostEqual(
+            overridden,
+            end_of_life_coefficient(
+                *self._ratios(material),
+                demolition_machine_emission=1.0,
+                landfilling_machine_emission=1.2))
@@ -0,0 +1,154 @@
+import os
+import tempfile
+import gzip
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+from src.jug_lca_buildings.storage import (
+    EmissionsArtifactStore,
+    FilesystemArtifactBackend,
+)
+from src.jug_lca_buildings.storage.redis_artifact_backend import (
+    RedisArtifactBackend,
+    TieredArtifactBackend,
+)
+from tests.fake_redis_server import FakeRedisServer
+
+
+class TestRedisArtifactBackend(TestCase):
+    def setUp(self):
+        self.server = FakeRedisServer().start()
+        self.backend = RedisArtifactBackend(self.server.url, ttl_seconds=60)
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.request_city = {
+            'type': 'FeatureCollection',
+            'features': [{'type': 'Feature', 'id': 1}],
+        }
+        self.emissions_data = [{'component_embodied_emissions': 3.0}]
+
+    def tearDown(self):
+        self.backend.close()
+        self.server.stop()
+        self._tmpdir.cleanup()
+
+    def _local_node(self, name):
+        base_dir = Path(self._tmpdir.name) / name
+        return EmissionsArtifactStore(
+            base_dir,
+            backend=TieredArtifactBackend(
+                FilesystemArtifactBackend(base_dir), self.backend),
+        )
+
+    def test_values_are_compressed_with_ttl(self):
+        csv_blob = b'a,b\n' * 100
+        self.backend.write('abc', {'csv': csv_blob}, {'records': 1})
+
+        stored = self.server.data[b'jug_lca_buildings:abc:csv']
+        self.assertEqual(gzip.decompress(stored), csv_blob)
+        self.assertLess(len(stored), len(csv_blob))
+        self.assertIn(b'jug_lca_buildings:abc:csv', self.server.expires_at)
+        self.assertEqual(self.backend.read_metadata('abc'), {'records': 1})
+
+    def test_precompressed_values_are_stored_as_is(self):
+        blob = gzip.compress(b'[1, 2, 3]')
+        self.backend.write('abc', {'emissions': blob}, {})
+
+        self.assertEqual(self.backend.read('abc', 'emissions'), blob)
+
+    def test_read_many_uses_single_mget(self):
+        one, two = gzip.compress(b'[1]'), gzip.compress(b'[2]')
+        self.backend.write('one', {'emissions': one}, {})
+        self.backend.write('two', {'emissions': two}, {})
+        self.server.commands.clear()
+
+        result = self.backend.read_many(['one', 'missing', 'two'], 'emissions')
+
+        self.assertEqual(
+            result, {'one': one, 'missing': None, 'two': two})
+        self.assertEqual([c[0] for c in self.server.commands], [b'MGET'])
+
+    def test_second_node_is_served_from_shared_tier(self):
+        node_a = self._local_node('node_a')
+        node_b = self._local_node('node_b')
+        request_hash = node_a.build_request_hash(self.request_city)
+
+        node_a.save_emissions_data(
+            request_hash, self.request_city, self.emissions_data)
+
+        self.assertEqual(
+            node_b.load_emissions_data(request_hash), self.emissions_data)
+        # The shared hit is copied into node_b's local tier.
+        self.assertEqual(
+            node_b.backend.local.read(request_hash, 'emissions'),
+            node_a.backend.local.read(request_hash, 'emissions'))
+
+    def test_artifact_stored_by_another_node_exists(self):
+        node_a = self._local_node('node_a')
+        node_b = self._local_node('node_b')
+        request_hash = node_a.build_request_hash(self.request_city)
+        self.assertFalse(node_b.artifact_exists(request_hash, 'emissions'))
+
+        node_a.save_emissions_data(
+            request_hash, self.request_city, self.emissions_data)
+
+        self.assertTrue(node_b.artifact_exists(request_hash, 'emissions'))
+
+    def test_request_features_are_shared_between_nodes(self):
+        node_a = self._local_node('node_a')
+        node_b = self._local_node('node_b')
+        request_hash = node_a.build_request_hash(self.request_city)
+        node_a.save_emissions_data(
+            request_hash, self.request_city, self.emissions_data)
+
+        self.assertEqual(
+            node_b.load_request_city(request_hash), self.request_city)
+        self.assertEqual(
+            list(node_b.backend.local.iter_blob_digests()),
+            list(node_a.backend.local.iter_blob_digests()))
+
+        self.server.commands.clear()
+        node_a.save_emissions_data(
+            request_hash, self.request_city, self.emissions_data)
+        # Stored blobs only get their TTL refreshed, never re-sent.
+        self.assertNotIn(
+            b'jug_lca_buildings:blob:',
+            b' '.join(c[1] for c in self.server.commands if c[0] == b'SET'))
+
+    def test_batch_lookup_through_store(self):
+        node_a = self._local_node('node_a')
+        node_b = self._local_node('node_b')
+        hashes = []
+        for index in range(3):
+            city = dict(self.request_city, name=f'city {index}')
+            request_hash = node_a.build_request_hash(city)
+            node_a.save_emissions_data(
+                request_hash, city, self.emissions_data)
+            hashes.append(request_hash)
+
+        found = node_b.load_emissions_data_many(hashes + ['missing'])
+
+        self.assertEqual(
+            [found[request_hash] for request_hash in hashes],
+            [self.emissions_data] * 3)
+        self.assertIsNone(found['missing'])
+
+    def test_unreachable_shared_tier_is_a_miss(self):
+        self.server.stop()
+        store = self._local_node('node_a')
+        request_hash = store.build_request_hash(self.request_city)
+
+        store.save_emissions_data(
+            request_hash, self.request_city, self.emissions_data)
+
+        self.assertIsNone(store.load_emissions_data('missing'))
+        self.assertEqual(
+            store.load_emissions_data(request_hash), self.emissions_data)
+
+    def test_store_enables_shared_tier_from_environment(self):
+        with patch.dict(os.environ, {
+                'JUG_LCA_ARTIFACTS_DIR': self._tmpdir.name,
+                'JUG_LCA_REDIS_URL': self.server.url}):
+            store = EmissionsArtifactStore()
+
+        self.assertIsInstance(store.backend, TieredArtifactBackend)
@@ -0,0 +1,266 @@
+import asyncio
+import io
+import json
+import os
+import tempfile
+import tracemalloc
+import unittest
+from unittest.mock import patch
+
+from starlette.testclient import TestClient
+
+from src.jug_lca_buildings.application import (
+    UploadLimitExceeded,
+    UploadLimits,
+)
+from src.jug_lca_buildings.application.upload_limits import count_positions
+from src.jug_lca_buildings.asgi import ComputePool, create_asgi_app
+from tests.test_asgi_app import _thread_executor
+from tests.test_emissions_api import _build_test_app
+from tests.test_lca_chunked_workflow import make_city
+
+WORKFLOW_PATH = (
+    'src.jug_lca_buildings.application.jug_lca_buildings.LCACarbonWorkflow'
+)
+ASYNC_JOBS_URL = 'https://lca.example.org/jobs'
+
+
+def make_request_city(buildings):
+    city = make_city(buildings)
+    del city['name']
+    for feature in city['features']:
+        feature['properties'].update(name='', address='')
+    return city
+
+
+def truncated_city_body():
+    """A JSON body cut in its 151st feature, past the first parsed batch."""
+    body = json.dumps(make_request_city(160))
+    return body[:body.index('{"type": "Feature", "id": 150')]
+
+
+class TestUploadLimits(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.city_path = os.path.join(self._tmpdir.name, 'city.geojson')
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_count_positions(self):
+        self.assertEqual(count_positions([1.0, 2.0]), 1)
+        self.assertEqual(count_positions([[[0, 0], [1, 0], [0, 0]]]), 3)
+        self.assertEqual(
+            count_positions([[[[0, 0], [1, 1]]], [[[2, 2]]]]), 3)
+        self.assertEqual(count_positions(None), 0)
+
+    def test_read_geojson_keeps_members(self):
+        city = make_city(3)
+        members = UploadLimits().read_geojson(io.StringIO(json.dumps(city)))
+
+        self.assertEqual(members, city)
+
+    def test_counts_over_limits_raise(self):
+        city = make_city(4)
+        with self.assertRaises(UploadLimitExceeded) as raised:
+            UploadLimits(max_features=3).check_request_city(city)
+        self.assertEqual(raised.exception.status, 422)
+        self.assertEqual(raised.exception.errors,
+                         {'limit': 'features', 'maximum': 3})
+        self.assertIsNone(raised.exception.headers)
+
+        # Every make_city footprint has 5 positions.
+        with self.assertRaises(UploadLimitExceeded) as raised:
+            UploadLimits(
+                max_vertices=12, async_jobs_url=ASYNC_JOBS_URL,
+            ).read_geojson(io.StringIO(json.dumps(city)))
+        self.assertEqual(raised.exception.limit, 'vertices')
+        self.assertEqual(raised.exception.errors['async_job_endpoint'],
+                         ASYNC_JOBS_URL)
+        self.assertEqual(raised.exception.headers,
+                         {'Link': f'<{ASYNC_JOBS_URL}>; rel="async-job"'})
+
+        UploadLimits(max_features=0, max_vertices=0).check_request_city(city)
+
+    def test_oversized_upload_is_rejected_with_bounded_memory(self):
+        with open(self.city_path, 'w', encoding='utf-8') as city_file:
+            json.dump(make_city(20000), city_file)
+        file_size = os.path.getsize(self.city_path)
+
+        tracemalloc.start()
+        try:
+            with open(self.city_path, encoding='utf-8') as city_file:
+                with self.assertRaises(UploadLimitExceeded):
+                    UploadLimits(max_features=200).read_geojson(city_file)
+                position = city_file.tell()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        # Parsing stops at the 201st feature instead of reading the file.
+        self.assertLess(position, file_size / 10)
+        self.assertLess(peak, file_size / 4)
+
+
+class UploadLimitsEnvironment:
+    def setUp(self):
+        self._artifacts_tmpdir = tempfile.TemporaryDirectory()
+        self._env_patcher = patch.dict(os.environ, {
+            'JUG_LCA_ARTIFACTS_DIR': self._artifacts_tmpdir.name,
+            'JUG_LCA_MAX_UPLOAD_BYTES': '20000',
+            'JUG_LCA_MAX_FEATURES': '10',
+            'JUG_LCA_MAX_VERTICES': '0',
+            'JUG_LCA_ASYNC_JOBS_URL': ASYNC_JOBS_URL,
+        })
+        self._env_patcher.start()
+
+    def tearDown(self):
+        self._env_patcher.stop()
+        self._artifacts_tmpdir.cleanup()
+
+    def assert_limit_response(self, response, status, limit, maximum):
+        self.assertEqual(response.status_code, status)
+        self.assertEqual(response.headers['Link'],
+                         f'<{ASYNC_JOBS_URL}>; rel="async-job"')
+        body = response.get_json() if hasattr(response, 'get_json') \
+            else response.json()
+        self.assertEqual(body['code'], status)
+        self.assertEqual(body['errors'], {
+            'limit': limit,
+            'maximum': maximum,
+            'async_job_endpoint': ASYNC_JOBS_URL,
+        })
+
+
+class TestFlaskUploadLimits(UploadLimitsEnvironment, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = _build_test_app().test_client()
+
+    @patch(WORKFLOW_PATH)
+    def test_body_over_byte_limit_answers_413(self, workflow_cls_mock):
+        response = self.client.post('/emissions', json=make_city(200))
+
+        self.assert_limit_response(response, 413, 'bytes', 20000)
+        workflow_cls_mock.assert_not_called()
+
+    @patch(WORKFLOW_PATH)
+    def test_feature_count_over_limit_answers_422(self, workflow_cls_mock):
+        city = make_request_city(11)
+
+        response = self.client.post('/emissions', json=city)
+        self.assert_limit_response(response, 422, 'features', 10)
+
+        response = self.client.post(
+            '/emissions/upload',
+            data={'geojson_file': (
+                io.BytesIO(json.dumps(city).encode('utf-8')),
+                'city.geojson',
+            )},
+            content_type='multipart/form-data',
+        )
+        self.assert_limit_response(response, 422, 'features', 10)
+        workflow_cls_mock.assert_not_called()
+
+    @patch(WORKFLOW_PATH)
+    def test_json_body_is_rejected_once_count_is_crossed(
+            self, workflow_cls_mock):
+        body = truncated_city_body()
+        with patch.dict(os.environ, {'JUG_LCA_MAX_UPLOAD_BYTES': '0'}):
+            response = self.client.post(
+                '/emissions', data=body, content_type='application/json')
+            self.assert_limit_response(response, 422, 'features', 10)
+
+            response = self.client.post(
+                '/emissions', data=body[:200],
+                content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['errors'],
+                         {'json': ['Invalid JSON body.']})
+        workflow_cls_mock.assert_not_called()
+
+
+@patch.object(ComputePool, '_build_executor', _thread_executor)
+class TestAsgiUploadLimits(UploadLimitsEnvironment, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = TestClient(create_asgi_app(
+            _build_test_app(), compute_pool=ComputePool(max_workers=1)))
+
+    @patch(WORKFLOW_PATH)
+    def test_streamed_body_is_cut_off_at_byte_limit(self, workflow_cls_mock):
+        # TestClient sends whole bodies, so the app is driven directly with
+        # a body streamed in chunks, without Content-Length.
+        app = create_asgi_app(
+            _build_test_app(), compute_pool=ComputePool(max_workers=1))
+        scope = {
+            'type': 'http',
+            'http_version': '1.1',
+            'method': 'POST',
+            'scheme': 'http',
+            'path': '/emissions',
+            'raw_path': b'/emissions',
+            'root_path': '',
+            'query_string': b'',
+            'headers': [(b'content-type', b'application/json')],
+            'client': ('127.0.0.1', 1234),
+            'server': ('testserver', 80),
+        }
+        received = []
+        messages = []
+
+        async def receive():
+            received.append(4096)
+            return {'type': 'http.request', 'body': b' ' * 4096,
+                    'more_body': len(received) < 100}
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(app(scope, receive, send))
+
+        start = messages[0]
+        body = json.loads(b''.join(
+            message.get('body', b'') for message in messages[1:]))
+        self.assertEqual(start['status'], 413)
+        self.assertIn((b'link', f'<{ASYNC_JOBS_URL}>; rel="async-job"'
+                       .encode()), start['headers'])
+        self.assertEqual(body['errors']['limit'], 'bytes')
+        self.assertEqual(sum(received), 5 * 4096)
+        workflow_cls_mock.assert_not_called()
+
+    @patch(WORKFLOW_PATH)
+    def test_limits_match_flask_responses(self, workflow_cls_mock):
+        flask_client = _build_test_app().test_client()
+        city = make_request_city(11)
+        upload = json.dumps(city).encode('utf-8')
+
+        for path, kwargs, flask_kwargs in [
+            ('/emissions', {'json': make_city(200)},
+             {'json': make_city(200)}),
+            ('/emissions', {'json': city}, {'json': city}),
+            ('/emissions/upload',
+             {'files': {'geojson_file': ('city.geojson', upload)}},
+             {'data': {'geojson_file': (io.BytesIO(upload), 'city.geojson')},
+              'content_type': 'multipart/form-data'}),
+        ]:
+            with self.subTest(path=path):
+                response = self.client.post(path, **kwargs)
+                expected = flask_client.post(path, **flask_kwargs)
+
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.json(), expected.get_json())
+                self.assertEqual(response.headers['Link'],
+                                 expected.headers['Link'])
+        workflow_cls_mock.assert_not_called()
+
+    @patch(WORKFLOW_PATH)
+    def test_json_body_is_rejected_once_count_is_crossed(
+            self, workflow_cls_mock):
+        body = truncated_city_body()
+        with patch.dict(os.environ, {'JUG_LCA_MAX_UPLOAD_BYTES': '0'}):
+            response = self.client.post(
+                '/emissions', content=body,
+                headers={'content-type': 'application/json'})
+        self.assert_limit_response(response, 422, 'features', 10)
+        workflow_cls_mock.assert_not_called()